@@ -1,11 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from datetime import datetime
 import models.models as models
 import models.schemas as schemas
 from core.auth import get_current_active_user
-from core.database import get_db
+from core.database import get_async_db
 
 router = APIRouter(prefix="/comments", tags=["comments"])
 
@@ -13,12 +14,12 @@ router = APIRouter(prefix="/comments", tags=["comments"])
 async def create_comment(
     comment_data: schemas.CommentCreate,
     current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Tạo comment mới"""
     # Kiểm tra warning tồn tại
-    warning = db.query(models.Warning).filter(models.Warning.id == comment_data.warning_id).first()
-    if not warning or warning.status != models.WarningStatus.APPROVED:
+    warning = await db.get(models.Warning, comment_data.warning_id)
+    if not warning or warning.status != 'approved':
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Warning not found or not approved"
@@ -31,8 +32,8 @@ async def create_comment(
     )
     
     db.add(comment)
-    db.commit()
-    db.refresh(comment)
+    await db.commit()
+    await db.refresh(comment)
     
     return comment
 
@@ -41,12 +42,15 @@ async def get_comments_by_warning(
     warning_id: int,
     skip: int = 0,
     limit: int = 50,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Lấy comments của một warning"""
-    comments = db.query(models.Comment).filter(
-        models.Comment.warning_id == warning_id
-    ).order_by(models.Comment.created_at.desc()).offset(skip).limit(limit).all()
+    result = await db.execute(
+        select(models.Comment).where(
+            models.Comment.warning_id == warning_id
+        ).order_by(models.Comment.created_at.desc()).offset(skip).limit(limit)
+    )
+    comments = result.scalars().all()
     
     return comments
 
@@ -55,10 +59,10 @@ async def update_comment(
     comment_id: int,
     update_data: dict,
     current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Cập nhật comment"""
-    comment = db.query(models.Comment).filter(models.Comment.id == comment_id).first()
+    comment = await db.get(models.Comment, comment_id)
     if not comment:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -66,7 +70,7 @@ async def update_comment(
         )
     
     # Kiểm tra quyền
-    if comment.user_id != current_user.id and current_user.role not in [models.UserRole.ADMIN, models.UserRole.MODERATOR]:
+    if comment.user_id != current_user.id and current_user.role not in [schemas.UserRole.ADMIN, schemas.UserRole.MODERATOR]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to update this comment"
@@ -77,8 +81,8 @@ async def update_comment(
         comment.content = update_data["content"]
     
     comment.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(comment)
+    await db.commit()
+    await db.refresh(comment)
     
     return comment
 
@@ -86,10 +90,10 @@ async def update_comment(
 async def delete_comment(
     comment_id: int,
     current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Xóa comment"""
-    comment = db.query(models.Comment).filter(models.Comment.id == comment_id).first()
+    comment = await db.get(models.Comment, comment_id)
     if not comment:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -97,13 +101,13 @@ async def delete_comment(
         )
     
     # Kiểm tra quyền
-    if comment.user_id != current_user.id and current_user.role not in [models.UserRole.ADMIN, models.UserRole.MODERATOR]:
+    if comment.user_id != current_user.id and current_user.role not in [schemas.UserRole.ADMIN, schemas.UserRole.MODERATOR]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to delete this comment"
         )
     
-    db.delete(comment)
-    db.commit()
+    await db.delete(comment)
+    await db.commit()
     
     return {"message": "Comment deleted successfully"}
\ No newline at end of file
@@ -46,7 +46,7 @@ async def create_scam_report(
     report = models.Report(
         **report_data.dict(),
         evidence_images=evidence_urls,
-        status=models.WarningStatus.PENDING
+        status='pending'
     )
     
     db.add(report)
@@ -89,7 +89,7 @@ async def create_website_report(
     report = models.Report(
         **report_data.dict(),
         evidence_images=evidence_urls,
-        status=models.WarningStatus.PENDING
+        status='pending'
     )
     
     db.add(report)
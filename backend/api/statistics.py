@@ -1,124 +1,159 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
-from typing import Dict, Any
+from sqlalchemy import desc
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timedelta
+import asyncio
+import time
 import models.models as models
 import models.schemas as schemas
 from core.auth import get_current_admin
-from core.database import get_db
-from services.elasticsearch_service import es_service
+from core.database import SessionLocal
+from config import settings
+from services.identifier_index import identifier_index
+from services.identifier_bloom import identifier_bloom
+from services.search_cache import search_cache
+from services.counter_buffer import counter_buffer
+from services.search_log_pipeline import search_log_pipeline
+from services.suggestion_index import suggestion_index
+from services.single_flight import search_single_flight
+from services.es_sync import es_sync
+from services.es_outbox import es_outbox
+from services.topk_sketch import top_searches_sketch, top_scammers_sketch
+from services.stats_rollup import statistics_rollup
+from services.timeseries import timeseries_rollup
+from services.dashboard_cache import dashboard_cache
+import utils.helpers as helpers
 
 router = APIRouter(prefix="/statistics", tags=["statistics"])
 
 @router.get("/dashboard")
 async def get_dashboard_stats(
-    days: int = 7,
-    current_user: models.User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    days: int = Query(7, ge=1, le=settings.DASHBOARD_MAX_DAYS),
+    current_user: models.User = Depends(get_current_admin)
 ):
-    """Lấy thống kê dashboard với Elasticsearch"""
-    
-    # Try Elasticsearch first
-    try:
-        # Get top scammers from ES
-        top_scammers = es_service.get_top_scammers(days=days, limit=10)
-        
-        # Get top searches from ES
-        top_searches = es_service.get_top_searches(days=min(days, 1), limit=10)
-        
-    except Exception as e:
-        print(f"Elasticsearch stats error: {e}")
-        # Fallback to database queries
-        top_scammers = []
-        top_searches = []
-    
-    # Get basic counts from database
-    since_date = datetime.utcnow() - timedelta(days=days)
-    
-    # Tổng số cảnh báo
-    total_warnings = db.query(func.count(models.Warning.id)).filter(
-        models.Warning.created_at >= since_date
-    ).scalar()
-    
-    # Tổng số view
-    total_views = db.query(func.sum(models.Warning.view_count)).filter(
-        models.Warning.created_at >= since_date
-    ).scalar() or 0
-    
-    # Tổng số report
-    total_reports = db.query(func.count(models.Report.id)).filter(
-        models.Report.created_at >= since_date
-    ).scalar()
+    """
+    Thống kê dashboard: các section chạy song song (trong thread), mỗi section cache
+    với TTL riêng và trả về giá trị cũ trong lúc làm mới (stale-while-revalidate)
+    """
+    sections = {
+        "totals": (settings.DASHBOARD_TOTALS_TTL_SECONDS, lambda: _with_session(statistics_rollup.totals, days)),
+        "top_scammers": (settings.DASHBOARD_TOP_TTL_SECONDS, lambda: _with_session(statistics_rollup.top_scammers, days)),
+        "top_searches": (settings.DASHBOARD_TOP_TTL_SECONDS, lambda: _with_session(statistics_rollup.top_searches, min(days, 1))),
+        "recent_warnings": (settings.DASHBOARD_RECENT_TTL_SECONDS, lambda: _with_session(_recent_warnings, days))
+    }
     
-    # Recent warnings from database
-    recent_warnings = db.query(models.Warning).filter(
-        models.Warning.status == models.WarningStatus.APPROVED,
-        models.Warning.created_at >= since_date
-    ).order_by(desc(models.Warning.created_at)).limit(20).all()
+    results = await asyncio.gather(*(
+        _timed_section(name, days, ttl, loader) for name, (ttl, loader) in sections.items()
+    ))
+    values = {name: value for name, value, _ in results}
+    totals = values["totals"] or {}
     
     # Format response
     return {
-        "total_warnings": total_warnings,
-        "total_views": total_views,
-        "total_reports": total_reports,
-        "top_scammers": top_scammers if top_scammers else await _get_fallback_top_scammers(days, db),
-        "top_searches": top_searches if top_searches else await _get_fallback_top_searches(min(days, 1), db),
-        "recent_warnings": [
+        "total_warnings": totals.get("total_warnings", 0),
+        "total_views": totals.get("total_views", 0),
+        "total_reports": totals.get("total_reports", 0),
+        "today": totals.get("today"),
+        "top_scammers": [
             {
-                "id": w.id,
-                "title": w.title,
-                "scammer_name": w.scammer_name,
-                "bank_account": helpers.mask_bank_account(w.bank_account) if w.bank_account else "",
-                "view_count": w.view_count,
-                "search_count": w.search_count,
-                "warning_count": w.warning_count,
-                "created_at": w.created_at.isoformat()
+                "scammer_name": scammer["scammer_name"],
+                "bank_account": helpers.mask_bank_account(scammer["bank_account"]) if scammer["bank_account"] else "",
+                "warning_count": scammer["warning_count"]
             }
-            for w in recent_warnings
-        ]
+            for scammer in values["top_scammers"] or []
+        ],
+        "top_searches": values["top_searches"] or [],
+        "recent_warnings": values["recent_warnings"] or [],
+        "timings": {name: timing for name, _, timing in results}
     }
 
-async def _get_fallback_top_scammers(days: int, db: Session):
-    """Fallback top scammers from database"""
-    since_date = datetime.utcnow() - timedelta(days=days)
+@router.get("/timeseries")
+async def get_timeseries(
+    metric: str = Query(..., pattern="^(warnings|reports|searches)$"),
+    interval: str = Query("day", pattern="^(hour|day)$"),
+    days: int = Query(30, ge=1),
+    group_by: Optional[str] = Query(None, pattern="^(dimension|status)$"),
+    current_user: models.User = Depends(get_current_admin)
+):
+    """
+    Số warning mới (category / status), report (report_type / status) và lượt search
+    (search_type) theo giờ hoặc ngày, đọc từ bảng bucket đã tính sẵn
+    """
+    max_days = settings.TIMESERIES_MAX_HOURLY_DAYS if interval == "hour" else settings.TIMESERIES_MAX_DAILY_DAYS
+    if days > max_days:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"days must be <= {max_days} for interval={interval}"
+        )
     
-    top_scammers = db.query(
-        models.Warning.scammer_name,
-        models.Warning.bank_account,
-        func.count(models.Warning.id).label("warning_count")
-    ).filter(
-        models.Warning.status == models.WarningStatus.APPROVED,
+    started = time.perf_counter()
+    value, cache_status = await dashboard_cache.get(
+        ("timeseries", metric, interval, days, group_by),
+        settings.TIMESERIES_CACHE_TTL_SECONDS,
+        lambda: _with_session(timeseries_rollup.query, metric, interval, days, group_by)
+    )
+    return {
+        **value,
+        "timing": {"ms": round((time.perf_counter() - started) * 1000, 2), "cache": cache_status}
+    }
+
+def _with_session(func, *args):
+    db = SessionLocal()
+    try:
+        return func(db, *args)
+    finally:
+        db.close()
+
+async def _timed_section(name: str, days: int, ttl: float, loader) -> Tuple[str, Any, Dict[str, Any]]:
+    started = time.perf_counter()
+    try:
+        value, cache_status = await dashboard_cache.get((name, days), ttl, loader)
+    except Exception as e:
+        # Một section lỗi không làm hỏng cả dashboard
+        print(f"❌ Dashboard section {name} error: {e}")
+        value, cache_status = None, "error"
+    return name, value, {"ms": round((time.perf_counter() - started) * 1000, 2), "cache": cache_status}
+
+def _recent_warnings(db: Session, days: int) -> List[Dict[str, Any]]:
+    since_date = datetime.utcnow() - timedelta(days=days)
+    recent_warnings = db.query(models.Warning).filter(
+        models.Warning.status == 'approved',
         models.Warning.created_at >= since_date
-    ).group_by(
-        models.Warning.scammer_name,
-        models.Warning.bank_account
-    ).order_by(desc("warning_count")).limit(10).all()
+    ).order_by(desc(models.Warning.created_at)).limit(20).all()
     
     return [
         {
-            "scammer_name": scammer[0],
-            "bank_account": helpers.mask_bank_account(scammer[1]) if scammer[1] else "",
-            "warning_count": scammer[2]
+            "id": w.id,
+            "title": w.title,
+            "scammer_name": w.scammer_name,
+            "bank_account": helpers.mask_bank_account(w.bank_account) if w.bank_account else "",
+            "view_count": w.view_count,
+            "search_count": w.search_count,
+            "warning_count": w.warning_count,
+            "created_at": w.created_at.isoformat()
         }
-        for scammer in top_scammers
+        for w in recent_warnings
     ]
 
-async def _get_fallback_top_searches(days: int, db: Session):
-    """Fallback top searches from database"""
-    since_date = datetime.utcnow() - timedelta(days=days)
-    
-    top_searches = db.query(
-        models.SearchLog.search_query,
-        func.count(models.SearchLog.id).label("search_count")
-    ).filter(
-        models.SearchLog.created_at >= since_date
-    ).group_by(models.SearchLog.search_query).order_by(desc("search_count")).limit(10).all()
-    
-    return [
-        {
-            "query": search[0],
-            "search_count": search[1]
-        }
-        for search in top_searches
-    ]
\ No newline at end of file
+@router.get("/metrics")
+async def get_search_metrics(
+    current_user: models.User = Depends(get_current_admin)
+):
+    """Metrics của các service search (worker hiện tại)"""
+    return {
+        "search_cache": search_cache.stats(),
+        "identifier_index": identifier_index.stats(),
+        "identifier_bloom": identifier_bloom.stats(),
+        "counter_buffer": counter_buffer.stats(),
+        "search_log_pipeline": search_log_pipeline.stats(),
+        "suggestion_index": suggestion_index.stats(),
+        "search_single_flight": search_single_flight.stats(),
+        "es_sync": es_sync.stats(),
+        "es_outbox": es_outbox.stats(),
+        "statistics_rollup": statistics_rollup.stats(),
+        "timeseries_rollup": timeseries_rollup.stats(),
+        "top_searches_sketch": top_searches_sketch.stats(),
+        "top_scammers_sketch": top_scammers_sketch.stats(),
+        "dashboard_cache": dashboard_cache.stats()
+    }
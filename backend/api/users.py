@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 import models.models as models
 import models.schemas as schemas
@@ -7,7 +8,7 @@ from core.auth import (
     get_current_user, get_current_active_user, 
     get_current_admin, get_password_hash, create_access_token
 )
-from core.database import get_db
+from core.database import get_async_db
 from services.ftp_service import ftp_service
 from datetime import datetime, timedelta
 
@@ -17,15 +18,16 @@ router = APIRouter(prefix="/users", tags=["users"])
 @router.post("/register", response_model=schemas.UserResponse)
 async def register(
     user_data: schemas.UserCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Đăng ký tài khoản mới"""
     # Kiểm tra username tồn tại
-    existing_user = db.query(models.User).filter(
+    result = await db.execute(select(models.User).where(
         (models.User.username == user_data.username) |
         (models.User.email == user_data.email) |
         (models.User.phone == user_data.phone)
-    ).first()
+    ))
+    existing_user = result.scalars().first()
     
     if existing_user:
         raise HTTPException(
@@ -45,22 +47,23 @@ async def register(
     )
     
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     
     return db_user
 
 @router.post("/login", response_model=schemas.Token)
 async def login(
     login_data: schemas.UserLogin,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Đăng nhập"""
-    user = db.query(models.User).filter(
+    result = await db.execute(select(models.User).where(
         (models.User.username == login_data.username) |
         (models.User.email == login_data.username) |
         (models.User.phone == login_data.username)
-    ).first()
+    ))
+    user = result.scalars().first()
     
     if not user or not user.verify_password(login_data.password):
         raise HTTPException(
@@ -76,7 +79,7 @@ async def login(
     
     # Cập nhật last login
     user.last_login = datetime.utcnow()
-    db.commit()
+    await db.commit()
     
     # Tạo token
     access_token = create_access_token(
@@ -98,7 +101,7 @@ async def get_me(current_user: models.User = Depends(get_current_active_user)):
 async def update_me(
     update_data: dict,
     current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Cập nhật thông tin user"""
     updatable_fields = ["full_name", "phone", "email", "zalo_contact"]
@@ -108,8 +111,8 @@ async def update_me(
             setattr(current_user, field, update_data[field])
     
     current_user.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(current_user)
     
     return current_user
 
@@ -117,7 +120,7 @@ async def update_me(
 async def upload_avatar(
     file: UploadFile = File(...),
     current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Upload avatar"""
     if not file.content_type.startswith("image/"):
@@ -132,7 +135,7 @@ async def upload_avatar(
     # Cập nhật user
     current_user.avatar_url = avatar_url
     current_user.updated_at = datetime.utcnow()
-    db.commit()
+    await db.commit()
     
     return {"avatar_url": avatar_url}
 
@@ -144,27 +147,28 @@ async def get_users(
     role: Optional[str] = None,
     is_active: Optional[bool] = None,
     current_user: models.User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Lấy danh sách users (Admin only)"""
-    query = db.query(models.User)
+    query = select(models.User)
     
     if role:
-        query = query.filter(models.User.role == role)
+        query = query.where(models.User.role == role)
     if is_active is not None:
-        query = query.filter(models.User.is_active == is_active)
+        query = query.where(models.User.is_active == is_active)
     
-    users = query.offset(skip).limit(limit).all()
+    result = await db.execute(query.offset(skip).limit(limit))
+    users = result.scalars().all()
     return users
 
 @router.get("/{user_id}", response_model=schemas.UserResponse)
 async def get_user(
     user_id: int,
     current_user: models.User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Lấy thông tin user theo ID (Admin only)"""
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    user = await db.get(models.User, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -177,10 +181,10 @@ async def update_user(
     user_id: int,
     update_data: dict,
     current_user: models.User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Cập nhật user (Admin only)"""
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    user = await db.get(models.User, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -194,8 +198,8 @@ async def update_user(
             setattr(user, field, update_data[field])
     
     user.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     
     return user
 
@@ -203,10 +207,10 @@ async def update_user(
 async def delete_user(
     user_id: int,
     current_user: models.User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Xóa user (Admin only)"""
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    user = await db.get(models.User, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -219,7 +223,7 @@ async def delete_user(
             detail="Cannot delete admin user"
         )
     
-    db.delete(user)
-    db.commit()
+    await db.delete(user)
+    await db.commit()
     
     return {"message": "User deleted successfully"}
\ No newline at end of file
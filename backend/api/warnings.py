@@ -1,14 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Request
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, func, or_
+from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Request, BackgroundTasks
+from sqlalchemy import select, desc, func, or_
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.dialects.mysql import match as mysql_match
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime, timedelta
+import asyncio
 import models.models as models
 import models.schemas as schemas
 from core.auth import get_current_user, get_current_active_user, get_current_admin
-from core.database import get_db
+from core.database import get_async_db, AsyncSessionLocal
+from config import settings
 from services.ftp_service import ftp_service
-from services.elasticsearch_service import es_service
+from services.elasticsearch_service import async_es_service
+from services.identifier_index import identifier_index
+from services.identifier_bloom import identifier_bloom
+from services.search_cache import search_cache
+from services.counter_buffer import counter_buffer
+from services.search_log_pipeline import search_log_pipeline
+from services.suggestion_index import suggestion_index
+from services.single_flight import search_single_flight
+from services.es_sync import es_sync
+from services.es_outbox import es_outbox
+from services.topk_sketch import WINDOWS, top_searches_sketch, top_scammers_sketch, scammer_key, split_scammer_key
 import utils.helpers as helpers
 
 router = APIRouter(prefix="/warnings", tags=["warnings"])
@@ -21,8 +35,7 @@ async def search_warnings(
     search_type: Optional[str] = None,  # phone, bank_account, facebook, name
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
-    request: Request = None,
-    db: Session = Depends(get_db)
+    request: Request = None
 ):
     """
     TÌM KIẾM CẢNH BÁO VỚI ELASTICSEARCH
@@ -37,7 +50,8 @@ async def search_warnings(
     - limit: Số kết quả mỗi trang
     """
     
-    # Log search to Elasticsearch
+    # Log search (hàng đợi nền, ghi bulk vào ES + MySQL), gửi sau khi có kết quả để ghi result_count
+    search_log = None
     if request:
         search_log = {
             "search_query": query,
@@ -52,154 +66,348 @@ async def search_warnings(
             search_log["user_id"] = str(current_user.id)
         except:
             pass
-        
-        # Log async (don't wait for it)
-        import asyncio
-        asyncio.create_task(
-            es_service.log_search(search_log)
-        )
     
-    # 1. SEARCH WITH ELASTICSEARCH
-    try:
-        warning_ids, total_hits = es_service.search_warnings(
-            query_string=query,
-            search_type=search_type,
-            page=page,
-            page_size=limit
-        )
-    except Exception as e:
-        print(f"🚨 Elasticsearch error: {str(e)}")
-        # Fallback to database search
-        return await _fallback_search(query, search_type, page, limit, db)
+    def log_search(results: list) -> list:
+        # Không chờ ghi log: pipeline tự batch, bỏ/sampling khi quá tải
+        if search_log is not None:
+            search_log["result_count"] = len(results)
+            search_log_pipeline.submit(search_log)
+        return results
+    
+    # 0. BLOOM FILTER: identifier chưa từng bị cảnh báo -> không có kết quả, không cần tra tiếp.
+    # Chỉ khi search_type chỉ rõ identifier: query không có type vẫn có thể khớp nội dung qua ES
+    if identifier_index.is_exact_search(search_type):
+        identifier = identifier_index.classify_query(query, search_type)
+        if identifier and identifier_bloom.might_contain(*identifier) is False:
+            return log_search([])
+    
+    # 0. QUERY-RESULT CACHE
+    cache_key = search_cache.make_key(query, search_type, page, limit)
+    cached_results = search_cache.get(cache_key)
+    if cached_results is not None:
+        counter_buffer.increment("search_count", [item["id"] for item in cached_results])
+        return log_search(cached_results)
+    
+    # 1-3. Các request giống hệt nhau đang chạy đồng thời chỉ tính một lần
+    results = await search_single_flight.run(
+        cache_key,
+        lambda: _compute_search(query, search_type, page, limit, cache_key)
+    )
     
-    if not warning_ids:
-        return []
+    # 4. UPDATE SEARCH COUNT (write-behind, flush định kỳ) - mỗi request đều được tính
+    counter_buffer.increment("search_count", [item["id"] for item in results])
     
-    # 2. GET DETAILED DATA FROM DATABASE
-    # Convert string IDs to integers
-    ids = [int(id_str) for id_str in warning_ids if id_str.isdigit()]
+    return log_search(results)
+
+async def _compute_search(query: str, search_type: Optional[str], page: int, limit: int, cache_key: tuple) -> List[dict]:
+    """
+    Identifier index -> Elasticsearch -> hydrate từ DB (fallback DB khi ES lỗi).
+
+    Dùng session riêng vì kết quả được chia sẻ cho nhiều request (single-flight)
+    """
+    async with AsyncSessionLocal() as db:
+        # 1. EXACT IDENTIFIER LOOKUP (số tài khoản / SĐT / Facebook) - không cần ES.
+        # Query không có search_type: index chỉ là đường tắt, không khớp thì vẫn tìm qua ES
+        warning_ids = None
+        identifiers = identifier_index.query_identifiers(query, search_type)
+        if identifiers:
+            matched_ids = identifier_index.lookup_any(identifiers)
+            if matched_ids is not None and (matched_ids or identifier_index.is_exact_search(search_type)):
+                start = (page - 1) * limit
+                warning_ids = [str(warning_id) for warning_id in matched_ids[start:start + limit]]
+        
+        # 2. SEARCH WITH ELASTICSEARCH
+        if warning_ids is None:
+            try:
+                warning_ids, total_hits = await async_es_service.search_warnings(
+                    query_string=query,
+                    search_type=search_type,
+                    page=page,
+                    page_size=limit
+                )
+            except Exception as e:
+                print(f"🚨 Elasticsearch error: {str(e)}")
+                # Fallback to database search (không cache kết quả khi ES lỗi)
+                warnings = await _fallback_search(query, search_type, page, limit, db)
+                return [schemas.WarningResponse.model_validate(w).model_dump() for w in warnings]
+        
+        # 3. GET DETAILED DATA FROM DATABASE
+        sorted_warnings = await _load_ordered_warnings(warning_ids, db)
     
+    results = [
+        schemas.WarningResponse.model_validate(warning).model_dump()
+        for warning in sorted_warnings
+    ]
+    search_cache.set(cache_key, results, query, search_type)
+    return results
+
+async def _load_ordered_warnings(warning_ids: List[str], db: AsyncSession) -> List[models.Warning]:
+    """Lấy warning đã duyệt từ DB bằng một query, giữ thứ tự ranking của Elasticsearch"""
+    ids = [int(id_str) for id_str in warning_ids if id_str.isdigit()]
     if not ids:
         return []
     
-    # Get warnings from database in the same order as Elasticsearch results
-    warnings = db.query(models.Warning).filter(
-        models.Warning.id.in_(ids),
-        models.Warning.status == models.WarningStatus.APPROVED
-    ).all()
-    
-    # Sort by Elasticsearch ranking
-    warning_dict = {str(w.id): w for w in warnings}
-    sorted_warnings = [warning_dict[id_str] for id_str in warning_ids if id_str in warning_dict]
+    result = await db.execute(
+        select(models.Warning).where(
+            models.Warning.id.in_(ids),
+            models.Warning.status == 'approved'
+        )
+    )
+    warning_dict = {str(w.id): w for w in result.scalars().all()}
+    return [warning_dict[id_str] for id_str in warning_ids if id_str in warning_dict]
+
+@router.get("/search/cursor/", response_model=schemas.CursorSearchResponse)
+async def search_warnings_cursor(
+    query: str = Query(..., min_length=1),
+    search_type: Optional[str] = None,  # phone, bank_account, facebook, name
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    with_total: bool = False,
+    request: Request = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    TÌM KIẾM CẢNH BÁO - PHÂN TRANG BẰNG CURSOR
     
-    # 3. UPDATE SEARCH COUNT
-    for warning in sorted_warnings:
-        warning.search_count += 1
+    Dùng search_after (sort _score, created_at, id) thay cho from/size nên trang sâu
+    không chậm dần. Gửi lại next_cursor để lấy trang tiếp theo; next_cursor = null là hết.
     
+    Parameters:
+    - cursor: next_cursor của trang trước (bỏ trống cho trang đầu)
+    - with_total: đếm tổng số kết quả (tối đa SEARCH_TOTAL_HITS_CAP, total_relation = gte khi vượt)
+    """
     try:
-        db.commit()
-        
-        # Async update Elasticsearch
-        for warning in sorted_warnings:
-            es_service.update_warning(warning)
-            
+        page = await async_es_service.search_warnings_after(
+            query_string=query,
+            search_type=search_type,
+            page_size=limit,
+            cursor=cursor,
+            track_total_hits=settings.SEARCH_TOTAL_HITS_CAP if with_total else False
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor không hợp lệ"
+        )
     except Exception as e:
-        db.rollback()
-        print(f"Error updating search counts: {e}")
+        print(f"🚨 Elasticsearch error: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Tìm kiếm tạm thời không khả dụng, vui lòng dùng /warnings/search/"
+        )
     
-    return sorted_warnings
+    warnings = await _load_ordered_warnings(page["ids"], db)
+    counter_buffer.increment("search_count", [warning.id for warning in warnings])
+    
+    # Chỉ log lượt tìm ở trang đầu (result_count = tổng nếu có đếm, không thì số kết quả trang đầu)
+    if request and not cursor:
+        search_log_pipeline.submit({
+            "search_query": query,
+            "search_type": search_type,
+            "ip_address": request.client.host if request.client else None,
+            "result_count": page["total"] if page["total"] is not None else len(warnings),
+            "created_at": datetime.utcnow().isoformat()
+        })
+    
+    return {
+        "query": query,
+        "results": warnings,
+        "next_cursor": page["next_cursor"],
+        "total": page["total"],
+        "total_relation": page["total_relation"]
+    }
+
+# False sau khi MySQL báo thiếu index ft_warning_text (worker không thử MATCH lại)
+_fulltext_available = True
 
 async def _fallback_search(
     query: str,
     search_type: str,
     page: int,
     limit: int,
-    db: Session
+    db: AsyncSession
 ):
-    """Fallback search using database when Elasticsearch fails"""
+    """
+    Fallback search using database when Elasticsearch fails
+
+    Identifier và tên tra trên các cột *_norm có index (equality/prefix);
+    text dùng FULLTEXT ngram (MATCH ... AGAINST) xếp theo relevance, MySQL không tạo được
+    index ft_warning_text (migration optional) thì dùng prefix tên / LIKE tiêu đề
+    """
+    global _fulltext_available
     offset = (page - 1) * limit
-    search_query = db.query(models.Warning).filter(
-        models.Warning.status == models.WarningStatus.APPROVED
+    query = query.strip()
+    search_query = select(models.Warning).where(
+        models.Warning.status == 'approved'
     )
     
-    if search_type == "phone":
-        search_query = search_query.filter(models.Warning.bank_account.ilike(f"%{query}%"))
-    elif search_type == "bank_account":
-        search_query = search_query.filter(models.Warning.bank_account.ilike(f"%{query}%"))
+    folded = helpers.fold_text(query)
+    phone = helpers.normalize_phone(query) if search_type == "phone" else ""
+    if phone:
+        # Khớp mọi số điện thoại của warning (không chỉ số chính), cả token nên không khớp một phần số
+        search_query = search_query.where(
+            mysql_match(models.Warning.phones_e164, against=f'"{phone}"').in_boolean_mode()
+        ).order_by(desc(models.Warning.created_at))
+    elif search_type in ("phone", "bank_account"):
+        account = helpers.normalize_account(query)
+        search_query = search_query.where(
+            models.Warning.bank_account_norm.startswith(account, autoescape=True) if account
+            else models.Warning.bank_account == query
+        ).order_by(desc(models.Warning.created_at))
     elif search_type == "facebook":
-        search_query = search_query.filter(models.Warning.facebook_link.ilike(f"%{query}%"))
+        search_query = search_query.where(
+            models.Warning.facebook_link_norm == helpers.normalize_facebook_link(query)
+        ).order_by(desc(models.Warning.created_at))
+    elif search_type == "name" or len(query) < 2:
+        # ngram_token_size mặc định = 2, query 1 ký tự chỉ tra prefix tên
+        search_query = search_query.where(
+            models.Warning.scammer_name_norm.startswith(folded, autoescape=True)
+        ).order_by(desc(models.Warning.created_at))
     else:
-        search_query = search_query.filter(
-            or_(
-                models.Warning.scammer_name.ilike(f"%{query}%"),
-                models.Warning.title.ilike(f"%{query}%"),
-                models.Warning.content.ilike(f"%{query}%")
-            )
-        )
-    
-    total = search_query.count()
-    warnings = search_query.order_by(
-        desc(models.Warning.created_at)
-    ).offset(offset).limit(limit).all()
+        if _fulltext_available:
+            relevance = mysql_match(
+                models.Warning.scammer_name,
+                models.Warning.title,
+                models.Warning.content,
+                against=query
+            ).in_natural_language_mode()
+            try:
+                result = await db.execute(
+                    search_query.where(relevance).order_by(
+                        desc(relevance), desc(models.Warning.created_at)
+                    ).offset(offset).limit(limit)
+                )
+                return result.scalars().all()
+            except DBAPIError as e:
+                # 1191: Can't find FULLTEXT index matching the column list
+                if getattr(e.orig, "args", (None,))[0] != 1191:
+                    raise
+                await db.rollback()
+                _fulltext_available = False
+                print("⚠️ FULLTEXT index ft_warning_text not found, DB search falls back to LIKE")
+        
+        search_query = search_query.where(or_(
+            models.Warning.scammer_name_norm.startswith(folded, autoescape=True),
+            models.Warning.title.contains(query, autoescape=True)
+        )).order_by(desc(models.Warning.created_at))
     
-    # Update search count
-    for warning in warnings:
-        warning.search_count += 1
+    result = await db.execute(search_query.offset(offset).limit(limit))
+    return result.scalars().all()
+
+@router.post("/search/batch", response_model=schemas.BatchLookupResponse)
+async def batch_lookup(
+    lookup_data: schemas.BatchLookupRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    TRA CỨU HÀNG LOẠT (bot đối tác, browser extension)
     
-    try:
-        db.commit()
-    except:
-        db.rollback()
+    Nhận tối đa BATCH_LOOKUP_MAX_IDENTIFIERS identifier (số tài khoản, SĐT, link Facebook, tên).
+    Identifier chính xác được trả lời từ bloom filter (chắc chắn chưa bị cảnh báo) hoặc
+    identifier index, phần còn lại gom vào một ES _msearch.
+    Toàn bộ warning được lấy từ DB bằng một query duy nhất.
+    """
+    items = lookup_data.identifiers
+    if len(items) > settings.BATCH_LOOKUP_MAX_IDENTIFIERS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Tối đa {settings.BATCH_LOOKUP_MAX_IDENTIFIERS} identifier mỗi request"
+        )
     
-    return warnings
+    max_results = settings.BATCH_LOOKUP_MAX_RESULTS
+    item_ids: List[Optional[List[int]]] = [None] * len(items)
+    item_sources = ["unavailable"] * len(items)
+    
+    # 1. BLOOM FILTER + IDENTIFIER INDEX
+    es_queries = {}  # (value, type) -> vị trí các item cần ES
+    for i, item in enumerate(items):
+        exact = identifier_index.is_exact_search(item.type)
+        identifiers = identifier_index.query_identifiers(item.value, item.type)
+        if exact and identifiers and identifier_bloom.might_contain(*identifiers[0]) is False:
+            item_ids[i] = []
+            item_sources[i] = "bloom"
+            continue
+        matched_ids = identifier_index.lookup_any(identifiers) if identifiers else None
+        # Không có type: index không khớp thì vẫn hỏi ES (có thể khớp nội dung / định dạng khác)
+        if matched_ids is not None and (matched_ids or exact):
+            item_ids[i] = matched_ids[:max_results]
+            item_sources[i] = "index"
+        elif item.value.strip():
+            es_queries.setdefault((item.value.strip(), item.type), []).append(i)
+    
+    # 2. ELASTICSEARCH _msearch cho phần còn lại
+    if es_queries:
+        queries = list(es_queries)
+        try:
+            responses = await async_es_service.msearch_warnings(queries, page_size=max_results)
+        except Exception as e:
+            print(f"🚨 Elasticsearch msearch error: {str(e)}")
+            responses = [None] * len(queries)
+        
+        for query_key, hit_ids in zip(queries, responses):
+            if hit_ids is None:
+                continue
+            for i in es_queries[query_key]:
+                item_ids[i] = [int(id_str) for id_str in hit_ids if id_str.isdigit()]
+                item_sources[i] = "elasticsearch"
+    
+    # 3. HYDRATE bằng một query
+    all_ids = {warning_id for ids in item_ids if ids for warning_id in ids}
+    warning_dict = {}
+    if all_ids:
+        result = await db.execute(
+            select(models.Warning).where(
+                models.Warning.id.in_(all_ids),
+                models.Warning.status == 'approved'
+            )
+        )
+        warning_dict = {w.id: w for w in result.scalars().all()}
+    
+    results = []
+    matched = []
+    for item, ids, source in zip(items, item_ids, item_sources):
+        warnings = [warning_dict[warning_id] for warning_id in (ids or []) if warning_id in warning_dict]
+        matched.extend(w.id for w in warnings)
+        results.append({
+            "value": item.value,
+            "type": item.type,
+            "source": source,
+            "is_reported": bool(warnings),
+            "warnings": warnings
+        })
+    
+    counter_buffer.increment("search_count", matched)
+    
+    return {"results": results}
 
 @router.get("/search/suggest/")
 async def search_suggestions(
     query: str = Query(..., min_length=1),
     limit: int = Query(10, ge=1, le=50),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    GỢI Ý TÌM KIẾM VỚI ELASTICSEARCH
+    GỢI Ý TÌM KIẾM (TYPE-AHEAD)
     
-    Returns suggestions for search queries
+    Prefix lookup trong suggestion index (bỏ dấu) trên tên scammer, số tài khoản và tiêu đề.
+    Fallback về DB khi index chưa build xong.
     """
     try:
-        # Use completion suggester
-        suggest_body = {
-            "suggest": {
-                "warning_suggest": {
-                    "prefix": query,
-                    "completion": {
-                        "field": "scammer_name.completion",
-                        "fuzzy": {
-                            "fuzziness": 2
-                        },
-                        "size": limit
-                    }
-                }
-            }
-        }
+        if not suggestion_index.is_ready:
+            raise RuntimeError("Suggestion index not ready")
         
-        response = es_service.es_client.search(
-            index=es_service.WARNING_INDEX,
-            body=suggest_body
-        )
-        
-        suggestions = []
-        if "suggest" in response and "warning_suggest" in response["suggest"]:
-            for option in response["suggest"]["warning_suggest"][0]["options"]:
-                suggestions.append(option["text"])
-        
-        return {"suggestions": suggestions}
+        return {"suggestions": suggestion_index.suggest(query, limit)}
         
     except Exception as e:
         print(f"Suggest error: {e}")
         # Fallback to database
-        warnings = db.query(models.Warning.scammer_name).filter(
-            models.Warning.scammer_name.ilike(f"%{query}%"),
-            models.Warning.status == models.WarningStatus.APPROVED
-        ).distinct().limit(limit).all()
+        result = await db.execute(
+            select(models.Warning.scammer_name).where(
+                models.Warning.scammer_name_norm.startswith(helpers.fold_text(query), autoescape=True),
+                models.Warning.status == 'approved'
+            ).distinct().limit(limit)
+        )
+        warnings = result.all()
         
         return {"suggestions": [w[0] for w in warnings]}
 
@@ -210,7 +418,7 @@ async def create_warning(
     warning_data: schemas.WarningCreate,
     files: Optional[List[UploadFile]] = File(None),
     current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Tạo cảnh báo mới"""
     # Upload evidence images
@@ -225,20 +433,17 @@ async def create_warning(
         reporter_id=current_user.id,
         reporter_name=warning_data.reporter_name or current_user.full_name,
         reporter_zalo=warning_data.reporter_zalo or current_user.zalo_contact,
-        status=models.WarningStatus.PENDING,
+        status=schemas.WarningStatus.PENDING.value,
         warning_count=1  # Initial warning count
     )
     
     db.add(warning)
-    db.commit()
-    db.refresh(warning)
-    
-    # Index to Elasticsearch (async)
-    try:
-        import asyncio
-        asyncio.create_task(es_service.index_warning(warning))
-    except Exception as e:
-        print(f"Async indexing error: {e}")
+    await db.flush()
+    # Outbox ghi cùng transaction, dispatcher nền đẩy sang Elasticsearch
+    db.add(models.WarningOutbox(warning_id=warning.id))
+    await db.commit()
+    await db.refresh(warning)
+    es_outbox.notify()
     
     return warning
 
@@ -246,58 +451,114 @@ async def create_warning(
 async def review_warning(
     warning_id: int,
     review_data: schemas.WarningUpdate,
+    background_tasks: BackgroundTasks,
     current_user: models.User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Duyệt/cập nhật cảnh báo (Admin only)"""
-    warning = db.query(models.Warning).filter(models.Warning.id == warning_id).first()
+    warning = await db.get(models.Warning, warning_id)
     if not warning:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Warning not found"
         )
     
+    # Warning đã có trong ES và vẫn được duyệt: chỉ cần partial update, text không đổi
+    was_approved = warning.status == schemas.WarningStatus.APPROVED.value
+    # approved_at = lần duyệt đầu tiên: duyệt lại (kể cả sau khi bị từ chối) không tính thêm vào top scammers
+    first_approval = warning.approved_at is None
+    
     # Update status
     if review_data.status:
-        warning.status = review_data.status
+        warning.status = review_data.status.value
         warning.reviewer_id = current_user.id
         warning.reviewed_at = datetime.utcnow()
         
-        if review_data.status == models.WarningStatus.APPROVED:
-            warning.approved_at = datetime.utcnow()
+        if review_data.status == schemas.WarningStatus.APPROVED:
+            if first_approval:
+                warning.approved_at = datetime.utcnow()
             # Check if there are similar warnings
-            similar_warnings = db.query(models.Warning).filter(
-                models.Warning.scammer_name == warning.scammer_name,
-                models.Warning.bank_account == warning.bank_account,
-                models.Warning.status == models.WarningStatus.APPROVED
-            ).all()
+            similar_count = await db.scalar(
+                select(func.count(models.Warning.id)).where(
+                    models.Warning.id != warning.id,
+                    models.Warning.scammer_name_norm == warning.scammer_name_norm,
+                    models.Warning.bank_account_norm == warning.bank_account_norm,
+                    models.Warning.status == 'approved'
+                )
+            )
             
-            warning.warning_count = len(similar_warnings) + 1
+            warning.warning_count = similar_count + 1
     
     # Update review note
     if review_data.review_note:
         warning.review_note = review_data.review_note
     
     warning.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(warning)
+    still_approved = warning.status == schemas.WarningStatus.APPROVED.value
+    db.add(models.WarningOutbox(warning_id=warning.id, op="meta" if was_approved and still_approved else "full"))
+    await db.commit()
+    await db.refresh(warning)
+    es_outbox.notify()
     
-    # Update Elasticsearch
-    try:
-        es_service.update_warning(warning)
-    except Exception as e:
-        print(f"Elasticsearch update error: {e}")
+    if still_approved and first_approval:
+        top_scammers_sketch.add(scammer_key(warning.scammer_name, warning.bank_account))
+    
+    # Update bloom filter / identifier index (file I/O dưới flock, chạy trong thread) + invalidate cached searches
+    if review_data.status:
+        # Bloom trước: bloom thiếu identifier vừa duyệt sẽ trả "chắc chắn không có" sai
+        try:
+            await asyncio.to_thread(identifier_bloom.apply_warning, warning)
+        except Exception as e:
+            print(f"Identifier bloom filter update error: {e}")
+            try:
+                await asyncio.to_thread(identifier_bloom.invalidate)
+            except Exception as e:
+                print(f"Identifier bloom filter invalidate error: {e}")
+            background_tasks.add_task(_rebuild_bloom)
+        try:
+            await asyncio.to_thread(identifier_index.apply_warning, warning)
+        except Exception as e:
+            print(f"Identifier index update error: {e}")
+        search_cache.invalidate_warning(warning)
+        suggestion_index.apply_warning(warning)
     
     return warning
 
+@router.post("/admin/reindex", status_code=status.HTTP_202_ACCEPTED)
+async def reindex_warnings(
+    background_tasks: BackgroundTasks,
+    current_user: models.User = Depends(get_current_admin)
+):
+    """
+    Reindex toàn bộ warning sang index version mới rồi swap alias (Admin only).
+    Search vẫn dùng index hiện tại trong lúc build; xem tiến độ ở /statistics/metrics
+    """
+    background_tasks.add_task(_run_reindex)
+    return {"message": "Reindex started"}
+
+def _rebuild_bloom():
+    try:
+        items = identifier_bloom.rebuild()
+        print(f"✅ Identifier bloom filter rebuilt: {items} identifiers")
+    except Exception as e:
+        print(f"❌ Identifier bloom filter rebuild error: {e}")
+
+def _run_reindex():
+    try:
+        stats = es_sync.reindex()
+        if stats is None:
+            print("⚠️ Reindex skipped: another worker holds the sync lock")
+    except Exception as e:
+        print(f"❌ Reindex error: {e}")
+
 @router.delete("/admin/{warning_id}")
 async def delete_warning(
     warning_id: int,
     current_user: models.User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Xóa cảnh báo (Admin only)"""
-    warning = db.query(models.Warning).filter(models.Warning.id == warning_id).first()
+    warning = await db.get(models.Warning, warning_id)
     if not warning:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -305,50 +566,75 @@ async def delete_warning(
         )
     
     # Soft delete
-    warning.status = models.WarningStatus.DELETED
+    warning.status = schemas.WarningStatus.DELETED.value
     warning.updated_at = datetime.utcnow()
-    db.commit()
+    db.add(models.WarningOutbox(warning_id=warning.id))
+    await db.commit()
+    es_outbox.notify()
     
-    # Delete from Elasticsearch
+    # Remove from identifier index + invalidate cached searches
     try:
-        es_service.delete_warning(str(warning_id))
+        await asyncio.to_thread(identifier_index.apply_warning, warning)
     except Exception as e:
-        print(f"Elasticsearch delete error: {e}")
+        print(f"Identifier index update error: {e}")
+    search_cache.invalidate_warning(warning)
+    suggestion_index.apply_warning(warning)
     
     return {"message": "Warning deleted successfully"}
 
 @router.get("/top/scammers", response_model=List[dict])
 async def get_top_scammers(
-    days: int = 7,
-    limit: int = 10,
-    db: Session = Depends(get_db)
+    days: int = Query(7, ge=1, le=365),
+    limit: int = Query(10, ge=1, le=100),
+    window: Optional[str] = Query(None, pattern="^(1h|1d|7d)$"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Lấy top scammers từ Elasticsearch"""
+    """
+    Top scammers (warning được duyệt, theo approved_at) từ top-k sketch trong bộ nhớ
+    (count thật trong [warning_count - max_error, warning_count]; warning bị xóa / từ chối
+    sau khi duyệt hết được tính sau lần rebuild nền kế tiếp). Ngoài cửa sổ 7 ngày dùng Elasticsearch
+    """
+    window_seconds = WINDOWS[window] if window else days * 24 * 3600
+    if top_scammers_sketch.covers(window_seconds):
+        top_scammers = []
+        for key, count, error in top_scammers_sketch.top(window_seconds, limit):
+            scammer_name, bank_account = split_scammer_key(key)
+            top_scammers.append({
+                "scammer_name": scammer_name,
+                "bank_account": bank_account,
+                "warning_count": count,
+                "max_error": error
+            })
+        return top_scammers
+    
     try:
-        top_scammers = es_service.get_top_scammers(days=days, limit=limit)
+        top_scammers = await async_es_service.get_top_scammers(days=days, limit=limit)
         return top_scammers
     except Exception as e:
         print(f"Elasticsearch top scammers error: {e}")
         # Fallback to database
         return await _fallback_top_scammers(days, limit, db)
 
-async def _fallback_top_scammers(days: int, limit: int, db: Session):
+async def _fallback_top_scammers(days: int, limit: int, db: AsyncSession):
     """Fallback top scammers from database"""
     since_date = datetime.utcnow() - timedelta(days=days)
     
-    top_scammers = db.query(
-        models.Warning.scammer_name,
-        models.Warning.bank_account,
-        func.count(models.Warning.id).label("warning_count")
-    ).filter(
-        models.Warning.status == models.WarningStatus.APPROVED,
-        models.Warning.created_at >= since_date
-    ).group_by(
-        models.Warning.scammer_name,
-        models.Warning.bank_account
-    ).order_by(
-        desc("warning_count")
-    ).limit(limit).all()
+    result = await db.execute(
+        select(
+            models.Warning.scammer_name,
+            models.Warning.bank_account,
+            func.count(models.Warning.id).label("warning_count")
+        ).where(
+            models.Warning.status == 'approved',
+            models.Warning.approved_at >= since_date
+        ).group_by(
+            models.Warning.scammer_name,
+            models.Warning.bank_account
+        ).order_by(
+            desc("warning_count")
+        ).limit(limit)
+    )
+    top_scammers = result.all()
     
     return [
         {
@@ -361,33 +647,47 @@ async def _fallback_top_scammers(days: int, limit: int, db: Session):
 
 @router.get("/top/searches", response_model=List[dict])
 async def get_top_searches(
-    days: int = 1,
-    limit: int = 10,
-    db: Session = Depends(get_db)
+    days: int = Query(1, ge=1, le=365),
+    limit: int = Query(10, ge=1, le=100),
+    window: Optional[str] = Query(None, pattern="^(1h|1d|7d)$"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Lấy top tìm kiếm từ Elasticsearch"""
+    """
+    Top tìm kiếm từ top-k sketch trong bộ nhớ (count thật trong [count - max_error, count]).
+    Sketch chưa đủ dữ liệu cho cửa sổ (mới khởi động) hoặc quá 7 ngày: dùng Elasticsearch
+    """
+    window_seconds = WINDOWS[window] if window else days * 24 * 3600
+    if top_searches_sketch.covers(window_seconds):
+        return [
+            {"query": key, "search_count": count, "max_error": error}
+            for key, count, error in top_searches_sketch.top(window_seconds, limit)
+        ]
+    
     try:
-        top_searches = es_service.get_top_searches(days=days, limit=limit)
+        top_searches = await async_es_service.get_top_searches(days=days, limit=limit)
         return top_searches
     except Exception as e:
         print(f"Elasticsearch top searches error: {e}")
         # Fallback to database
         return await _fallback_top_searches(days, limit, db)
 
-async def _fallback_top_searches(days: int, limit: int, db: Session):
+async def _fallback_top_searches(days: int, limit: int, db: AsyncSession):
     """Fallback top searches from database"""
     since_date = datetime.utcnow() - timedelta(days=days)
     
-    top_searches = db.query(
-        models.SearchLog.search_query,
-        func.count(models.SearchLog.id).label("search_count")
-    ).filter(
-        models.SearchLog.created_at >= since_date
-    ).group_by(
-        models.SearchLog.search_query
-    ).order_by(
-        desc("search_count")
-    ).limit(limit).all()
+    result = await db.execute(
+        select(
+            models.SearchLog.search_query,
+            func.count(models.SearchLog.id).label("search_count")
+        ).where(
+            models.SearchLog.created_at >= since_date
+        ).group_by(
+            models.SearchLog.search_query
+        ).order_by(
+            desc("search_count")
+        ).limit(limit)
+    )
+    top_searches = result.all()
     
     return [
         {
@@ -395,4 +695,4 @@ async def _fallback_top_searches(days: int, limit: int, db: Session):
             "search_count": search[1]
         }
         for search in top_searches
-    ]
\ No newline at end of file
+    ]
@@ -14,6 +14,10 @@ class Settings:
     # FIX: URL cần escape ký tự @ trong password
     DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD.replace('@', '%40')}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
     
+    # Async engine pool (mỗi worker)
+    DB_POOL_SIZE = 20
+    DB_MAX_OVERFLOW = 10
+    
     # JWT
     SECRET_KEY = "your-secret-key-change-this-please"
     ALGORITHM = "HS256"
@@ -31,6 +35,98 @@ class Settings:
     ES_HOST = "localhost"
     ES_PORT = 9200
     ES_URL = f"http://{ES_HOST}:{ES_PORT}"
+    ES_CONNECTIONS_PER_NODE = 25  # Connection pool của AsyncElasticsearch (mỗi worker)
+    
+    # Đồng bộ incremental MySQL -> Elasticsearch (chạy nền, một worker giữ lock)
+    ES_SYNC_CHUNK_SIZE = 500
+    ES_SYNC_INTERVAL_SECONDS = 300  # 0 = chỉ chạy một lần lúc startup
+    ES_SYNC_OVERLAP_SECONDS = 10
+    
+    # Bulk index song song (initial load / reindex)
+    ES_BULK_CHUNK_SIZE = 1000  # Số document tối đa mỗi request
+    ES_BULK_MAX_CHUNK_BYTES = 10 * 1024 * 1024
+    ES_BULK_THREADS = 4
+    ES_BULK_MAX_RETRIES = 5  # Gửi lại item bị từ chối 429 (exponential backoff)
+    ES_BULK_INITIAL_BACKOFF = 2.0
+    
+    # Outbox MySQL -> Elasticsearch (dispatcher nền trên mỗi worker, một worker gửi tại một thời điểm nhờ GET_LOCK checkscam_es_outbox)
+    ES_OUTBOX_BATCH_SIZE = 200
+    ES_OUTBOX_POLL_SECONDS = 1.0
+    ES_OUTBOX_RETRY_BASE_SECONDS = 2.0
+    ES_OUTBOX_RETRY_MAX_SECONDS = 300.0
+    
+    # Identifier index (mmap, dùng chung giữa các worker)
+    DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+    IDENTIFIER_INDEX_PATH = os.path.join(DATA_DIR, "identifier_index.bin")
+    IDENTIFIER_INDEX_REFRESH_SECONDS = 1.0
+    IDENTIFIER_INDEX_MERGE_SECONDS = 60  # Gộp file delta vào file chính
+    
+    # Bloom filter cho identifier "sạch" (chưa từng bị cảnh báo)
+    IDENTIFIER_BLOOM_PATH = os.path.join(DATA_DIR, "identifier_bloom.bin")
+    IDENTIFIER_BLOOM_CAPACITY = 1_000_000
+    IDENTIFIER_BLOOM_FP_RATE = 0.01
+    IDENTIFIER_BLOOM_MAX_BYTES = 16 * 1024 * 1024
+    IDENTIFIER_BLOOM_REBUILD_SECONDS = 24 * 3600
+    
+    # Top-k sketch (Space-Saving theo bucket thời gian) cho top searches / top scammers
+    TOPK_SEARCHES_PATH = os.path.join(DATA_DIR, "topk_searches.json")
+    TOPK_SCAMMERS_PATH = os.path.join(DATA_DIR, "topk_scammers.json")
+    TOPK_CAPACITY = 200  # Số counter mỗi bucket, sai số count <= tổng / capacity
+    TOPK_CHECKPOINT_SECONDS = 60
+    TOPK_SCAMMERS_REBUILD_SECONDS = 3600  # Đếm lại top scammers từ MySQL (warning bị xóa / từ chối sau khi duyệt)
+    
+    # Search result cache (LRU + TTL, mỗi worker một cache)
+    SEARCH_CACHE_MAX_ENTRIES = 5000
+    SEARCH_CACHE_MAX_BYTES = 64 * 1024 * 1024
+    SEARCH_CACHE_TTL_SECONDS = 60
+    
+    # Suggestion index (type-ahead), refresh incremental giữa các worker
+    SUGGEST_REFRESH_SECONDS = 60
+    SUGGEST_REFRESH_OVERLAP_SECONDS = 10
+    
+    # Batch identifier lookup (/warnings/search/batch)
+    BATCH_LOOKUP_MAX_IDENTIFIERS = 500
+    BATCH_LOOKUP_MAX_RESULTS = 10  # Số warning tối đa trả về cho mỗi identifier
+    
+    # Write-behind counters (search_count / view_count)
+    COUNTER_FLUSH_INTERVAL_SECONDS = 5
+    COUNTER_FLUSH_BATCH_SIZE = 500
+    
+    # Warning search: đếm tổng số hit chính xác tối đa tới ngưỡng này
+    SEARCH_TOTAL_HITS_CAP = 1000
+    
+    # Backfill cột *_norm của warnings (số dòng mỗi transaction)
+    NORMALIZE_BACKFILL_BATCH_SIZE = 1000
+    
+    # Search log pipeline
+    SEARCH_LOG_QUEUE_SIZE = 10000
+    SEARCH_LOG_BATCH_SIZE = 500
+    SEARCH_LOG_FLUSH_SECONDS = 2
+    SEARCH_LOG_SAMPLE_WATERMARK = 0.8  # Hàng đợi đầy 80% thì bắt đầu sampling
+    SEARCH_LOG_SAMPLE_RATE = 0.1       # Tỉ lệ log được giữ lại khi sampling
+    SEARCH_LOG_DB_DUAL_WRITE = True    # Ghi thêm vào bảng search_logs (fallback top searches)
+    SEARCH_LOG_RETENTION_DAYS = 90     # Index search_logs-YYYY.MM.DD cũ hơn bị xóa, 0 = giữ hết
+    SEARCH_LOG_RETENTION_CHECK_SECONDS = 3600
+    
+    # Rollup thống kê theo ngày vào bảng statistics (dashboard)
+    STATS_ROLLUP_INTERVAL_SECONDS = 3600
+    STATS_ROLLUP_TOP_N = 50         # Top-N lưu cho mỗi ngày
+    STATS_ROLLUP_REFRESH_DAYS = 7   # Tính lại N ngày gần nhất mỗi lượt (view / duyệt còn thay đổi)
+    STATS_ROLLUP_BACKFILL_DAYS = 365
+    
+    # Dashboard: cache theo section (stale-while-revalidate)
+    DASHBOARD_TOTALS_TTL_SECONDS = 60
+    DASHBOARD_TOP_TTL_SECONDS = 300
+    DASHBOARD_RECENT_TTL_SECONDS = 30
+    DASHBOARD_MAX_DAYS = 365       # Giới hạn tham số days (ngày chưa rollup được tính từng ngày một)
+    DASHBOARD_STALE_SECONDS = 600  # Quá TTL bao lâu vẫn trả giá trị cũ trong lúc làm mới
+    
+    # Time-series theo giờ / ngày (bảng timeseries_buckets)
+    TIMESERIES_INTERVAL_SECONDS = 60     # Tính lại giờ hiện tại + các giờ có thay đổi
+    TIMESERIES_BACKFILL_DAYS = 365
+    TIMESERIES_MAX_HOURLY_DAYS = 31      # Khoảng tối đa khi lấy theo giờ
+    TIMESERIES_MAX_DAILY_DAYS = 366
+    TIMESERIES_CACHE_TTL_SECONDS = 60
     
     # App
     APP_NAME = "CheckScam API with Elasticsearch"
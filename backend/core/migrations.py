@@ -0,0 +1,502 @@
+"""
+Migration schema theo version.
+
+Mỗi migration là (version, mô tả, các step). migrate() chạy các version chưa có trong
+bảng schema_migrations theo thứ tự, dưới MySQL GET_LOCK để nhiều worker khởi động cùng
+lúc không chạy trùng. DDL của MySQL tự commit nên mỗi step phải chạy lại được: tạo bảng
+dùng IF NOT EXISTS, thêm / xóa cột và index kiểm tra information_schema trước. Một
+migration lỗi giữa chừng sẽ được chạy lại từ đầu ở lần khởi động sau.
+
+Thay đổi schema mới: thêm một version vào cuối MIGRATIONS, không sửa version đã phát hành.
+"""
+from typing import Any, Callable, Dict, List, Tuple
+
+from sqlalchemy import text
+
+LOCK_NAME = "checkscam_migrations"
+LOCK_TIMEOUT_SECONDS = 60
+
+Step = Callable[[Any], None]
+
+
+def _column_exists(conn, table: str, column_name: str) -> bool:
+    return bool(conn.execute(
+        text(
+            "SELECT COUNT(*) FROM information_schema.columns "
+            "WHERE table_schema = DATABASE() AND table_name = :table AND column_name = :column_name"
+        ),
+        {"table": table, "column_name": column_name}
+    ).scalar())
+
+
+def _index_exists(conn, table: str, index_name: str) -> bool:
+    return bool(conn.execute(
+        text(
+            "SELECT COUNT(*) FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = :table AND index_name = :index_name"
+        ),
+        {"table": table, "index_name": index_name}
+    ).scalar())
+
+
+def sql(statement: str) -> Step:
+    def step(conn):
+        conn.execute(text(statement))
+    return step
+
+
+def add_column(table: str, column_name: str, ddl: str) -> Step:
+    def step(conn):
+        if not _column_exists(conn, table, column_name):
+            print(f"🔄 Adding column {column_name} to {table}...")
+            conn.execute(text(ddl))
+    return step
+
+
+def add_index(table: str, index_name: str, ddl: str, optional: bool = False) -> Step:
+    """optional: index MySQL cũ có thể không hỗ trợ (functional / ngram), lỗi thì bỏ qua"""
+    def step(conn):
+        if _index_exists(conn, table, index_name):
+            return
+        print(f"🔄 Creating index {index_name} on {table}...")
+        try:
+            conn.execute(text(ddl))
+        except Exception as e:
+            if not optional:
+                raise
+            print(f"⚠️ Could not create index {index_name}: {e}")
+    return step
+
+
+def drop_index(table: str, index_name: str) -> Step:
+    def step(conn):
+        if _index_exists(conn, table, index_name):
+            print(f"🔄 Dropping index {index_name} on {table}...")
+            conn.execute(text(f"DROP INDEX {index_name} ON {table}"))
+    return step
+
+
+# Schema ban đầu (trước khi có migration theo version), giữ nguyên như bản đã phát hành
+BASELINE_TABLES = [
+    # users table
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        username VARCHAR(100) UNIQUE NOT NULL,
+        email VARCHAR(255) UNIQUE,
+        phone VARCHAR(20) UNIQUE,
+        password_hash VARCHAR(255) NOT NULL,
+        role VARCHAR(20) DEFAULT 'user',
+        full_name VARCHAR(255),
+        avatar_url VARCHAR(500),
+        zalo_contact VARCHAR(50),
+        is_active BOOLEAN DEFAULT TRUE,
+        is_verified BOOLEAN DEFAULT FALSE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP NULL ON UPDATE CURRENT_TIMESTAMP,
+        last_login TIMESTAMP NULL,
+        INDEX idx_username (username),
+        INDEX idx_email (email),
+        INDEX idx_phone (phone)
+    ) ENGINE=InnoDB
+    """,
+    
+    # warnings table
+    """
+    CREATE TABLE IF NOT EXISTS warnings (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        title VARCHAR(500) NOT NULL,
+        scammer_name VARCHAR(255) NOT NULL,
+        bank_account VARCHAR(100),
+        bank_name VARCHAR(100),
+        facebook_link VARCHAR(500),
+        content TEXT NOT NULL,
+        category VARCHAR(50) DEFAULT 'other',
+        evidence_images JSON,
+        status VARCHAR(20) DEFAULT 'pending',
+        view_count INT DEFAULT 0,
+        search_count INT DEFAULT 0,
+        warning_count INT DEFAULT 1,
+        
+        reporter_id INT,
+        reporter_name VARCHAR(255),
+        reporter_zalo VARCHAR(50),
+        is_anonymous BOOLEAN DEFAULT FALSE,
+        reporter_nickname VARCHAR(100),
+        
+        reviewer_id INT,
+        reviewed_at TIMESTAMP NULL,
+        review_note TEXT,
+        
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP NULL ON UPDATE CURRENT_TIMESTAMP,
+        approved_at TIMESTAMP NULL,
+        
+        FOREIGN KEY (reporter_id) REFERENCES users(id),
+        FOREIGN KEY (reviewer_id) REFERENCES users(id),
+        INDEX idx_scammer_name (scammer_name),
+        INDEX idx_bank_account (bank_account),
+        INDEX idx_status (status)
+    ) ENGINE=InnoDB
+    """,
+    
+    # reports table
+    """
+    CREATE TABLE IF NOT EXISTS reports (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        report_type VARCHAR(50),
+        
+        scammer_name VARCHAR(255),
+        bank_account VARCHAR(100),
+        bank_name VARCHAR(100),
+        facebook_link VARCHAR(500),
+        
+        website_url VARCHAR(500),
+        website_category VARCHAR(100),
+        
+        content TEXT NOT NULL,
+        evidence_images JSON,
+        category VARCHAR(50) DEFAULT 'other',
+        status VARCHAR(20) DEFAULT 'pending',
+        
+        reporter_id INT,
+        reporter_name VARCHAR(255),
+        reporter_zalo VARCHAR(50),
+        reporter_email VARCHAR(255),
+        agree_terms BOOLEAN DEFAULT FALSE,
+        
+        reviewer_id INT,
+        reviewed_at TIMESTAMP NULL,
+        
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        
+        FOREIGN KEY (reporter_id) REFERENCES users(id),
+        FOREIGN KEY (reviewer_id) REFERENCES users(id)
+    ) ENGINE=InnoDB
+    """,
+    
+    # comments table
+    """
+    CREATE TABLE IF NOT EXISTS comments (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        warning_id INT NOT NULL,
+        user_id INT NOT NULL,
+        content TEXT NOT NULL,
+        is_verified_victim BOOLEAN DEFAULT FALSE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP NULL ON UPDATE CURRENT_TIMESTAMP,
+        
+        FOREIGN KEY (warning_id) REFERENCES warnings(id),
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    ) ENGINE=InnoDB
+    """,
+    
+    # admin_profiles table
+    """
+    CREATE TABLE IF NOT EXISTS admin_profiles (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT UNIQUE,
+        admin_number INT UNIQUE,
+        facebook_main VARCHAR(500),
+        facebook_backup VARCHAR(500),
+        zalo VARCHAR(50),
+        website VARCHAR(500),
+        services JSON,
+        bank_accounts JSON,
+        insurance_fund FLOAT DEFAULT 0,
+        is_public BOOLEAN DEFAULT TRUE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    ) ENGINE=InnoDB
+    """,
+    
+    # search_logs table
+    """
+    CREATE TABLE IF NOT EXISTS search_logs (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        search_query VARCHAR(500) NOT NULL,
+        search_type VARCHAR(50),
+        user_id INT,
+        ip_address VARCHAR(50),
+        result_count INT DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    ) ENGINE=InnoDB
+    """,
+    
+    # statistics table
+    """
+    CREATE TABLE IF NOT EXISTS statistics (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        total_warnings INT DEFAULT 0,
+        total_views INT DEFAULT 0,
+        total_reports INT DEFAULT 0,
+        top_scammers JSON,
+        top_searches JSON,
+        recent_warnings JSON
+    ) ENGINE=InnoDB
+    """
+]
+
+# Bảng thêm ở version 2 (database cũ có thể đã có sẵn từ create_tables trước đây)
+SYNC_TABLES = [
+    # sync_state table (watermark của các job đồng bộ, vd MySQL -> Elasticsearch)
+    """
+    CREATE TABLE IF NOT EXISTS sync_state (
+        name VARCHAR(100) PRIMARY KEY,
+        watermark_at TIMESTAMP NULL,
+        watermark_id INT DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB
+    """,
+    
+    # warning_outbox table (thay đổi warning chờ đẩy sang Elasticsearch)
+    """
+    CREATE TABLE IF NOT EXISTS warning_outbox (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        warning_id INT NOT NULL,
+        op VARCHAR(10) DEFAULT 'full',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        attempts INT DEFAULT 0,
+        next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_error VARCHAR(500),
+        INDEX idx_next_attempt (next_attempt_at, id),
+        INDEX idx_warning_id (warning_id)
+    ) ENGINE=InnoDB
+    """,
+    
+    # timeseries_buckets table (đếm theo giờ / ngày cho API time-series)
+    """
+    CREATE TABLE IF NOT EXISTS timeseries_buckets (
+        metric VARCHAR(20) NOT NULL,
+        bucket_size VARCHAR(5) NOT NULL,
+        bucket_start DATETIME NOT NULL,
+        dimension VARCHAR(100) NOT NULL DEFAULT '',
+        status VARCHAR(20) NOT NULL DEFAULT '',
+        count INT DEFAULT 0,
+        PRIMARY KEY (metric, bucket_size, bucket_start, dimension, status)
+    ) ENGINE=InnoDB
+    """
+]
+
+MIGRATIONS: List[Tuple[int, str, List[Step]]] = [
+    (1, "baseline tables", [sql(statement) for statement in BASELINE_TABLES]),
+    (2, "normalized identifier columns, sync / outbox / time-series tables, sync / rollup indexes", [
+        *(sql(statement) for statement in SYNC_TABLES),
+        add_column("warnings", "scammer_name_norm", "ALTER TABLE warnings ADD COLUMN scammer_name_norm VARCHAR(255)"),
+        add_column("warnings", "bank_account_norm", "ALTER TABLE warnings ADD COLUMN bank_account_norm VARCHAR(100)"),
+        add_column("warnings", "facebook_link_norm", "ALTER TABLE warnings ADD COLUMN facebook_link_norm VARCHAR(500)"),
+        add_column("warnings", "phone_e164", "ALTER TABLE warnings ADD COLUMN phone_e164 VARCHAR(20)"),
+        add_column("warning_outbox", "op", "ALTER TABLE warning_outbox ADD COLUMN op VARCHAR(10) DEFAULT 'full' AFTER warning_id"),
+        add_index("warnings", "idx_facebook_link", "CREATE INDEX idx_facebook_link ON warnings (facebook_link(191))"),
+        add_index(
+            "warnings", "ft_warning_text",
+            "CREATE FULLTEXT INDEX ft_warning_text ON warnings (scammer_name, title, content) WITH PARSER ngram",
+            optional=True
+        ),
+        add_index("warnings", "idx_scammer_name_norm", "CREATE INDEX idx_scammer_name_norm ON warnings (scammer_name_norm)"),
+        add_index("warnings", "idx_bank_account_norm", "CREATE INDEX idx_bank_account_norm ON warnings (bank_account_norm)"),
+        add_index("warnings", "idx_facebook_link_norm", "CREATE INDEX idx_facebook_link_norm ON warnings (facebook_link_norm(191))"),
+        add_index("warnings", "idx_phone_e164", "CREATE INDEX idx_phone_e164 ON warnings (phone_e164)"),
+        # Functional index (MySQL 8.0.13+) cho watermark của ES sync
+        add_index(
+            "warnings", "idx_sync_watermark",
+            "CREATE INDEX idx_sync_watermark ON warnings ((COALESCE(updated_at, created_at)), id)",
+            optional=True
+        ),
+        # Range theo ngày cho statistics rollup / time-series
+        add_index("warnings", "idx_warnings_created_at", "CREATE INDEX idx_warnings_created_at ON warnings (created_at)"),
+        add_index("reports", "idx_reports_created_at", "CREATE INDEX idx_reports_created_at ON reports (created_at)"),
+        add_index("search_logs", "idx_search_logs_created_at", "CREATE INDEX idx_search_logs_created_at ON search_logs (created_at)"),
+        add_index("statistics", "uq_statistics_date", "CREATE UNIQUE INDEX uq_statistics_date ON statistics (date)"),
+        # Report được duyệt từ lần rollup time-series trước (warning dùng idx_sync_watermark)
+        add_index("reports", "idx_reports_reviewed_at", "CREATE INDEX idx_reports_reviewed_at ON reports (reviewed_at)"),
+    ]),
+    (3, "composite indexes for hot query shapes", [
+        # Danh sách / top scammers: status = ? AND created_at range / ORDER BY created_at;
+        # scammer_name, bank_account ở cuối để GROUP BY top scammers chỉ đọc index
+        add_index(
+            "warnings", "idx_warnings_status_created",
+            "CREATE INDEX idx_warnings_status_created ON warnings (status, created_at, scammer_name, bank_account)"
+        ),
+        drop_index("warnings", "idx_status"),
+        # Comment của một warning, mới nhất trước
+        add_index(
+            "comments", "idx_comments_warning_created",
+            "CREATE INDEX idx_comments_warning_created ON comments (warning_id, created_at)"
+        ),
+        # Admin list report: lọc report_type + status hoặc chỉ status, ORDER BY created_at DESC
+        add_index(
+            "reports", "idx_reports_type_status_created",
+            "CREATE INDEX idx_reports_type_status_created ON reports (report_type, status, created_at)"
+        ),
+        add_index(
+            "reports", "idx_reports_status_created",
+            "CREATE INDEX idx_reports_status_created ON reports (status, created_at)"
+        ),
+        # Top searches từ MySQL: range created_at, GROUP BY search_query chỉ đọc index
+        add_index(
+            "search_logs", "idx_search_logs_created_query",
+            "CREATE INDEX idx_search_logs_created_query ON search_logs (created_at, search_query)"
+        ),
+        drop_index("search_logs", "idx_search_logs_created_at"),
+    ]),
+    (4, "all phone numbers of a warning", [
+        # Số E.164 cách nhau bởi dấu cách; parser mặc định tách token ở dấu cách / '+'
+        add_column("warnings", "phones_e164", "ALTER TABLE warnings ADD COLUMN phones_e164 TEXT"),
+        add_index("warnings", "ft_phones_e164", "CREATE FULLTEXT INDEX ft_phones_e164 ON warnings (phones_e164)"),
+    ]),
+    (5, "approved_at index for top scammers", [
+        # Top scammers (MySQL fallback / rebuild top-k sketch): status = 'approved' AND approved_at range
+        add_index(
+            "warnings", "idx_warnings_status_approved",
+            "CREATE INDEX idx_warnings_status_approved ON warnings (status, approved_at, scammer_name, bank_account)"
+        ),
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def applied_versions(conn) -> List[int]:
+    return [row[0] for row in conn.execute(text("SELECT version FROM schema_migrations ORDER BY version"))]
+
+
+def migrate(engine) -> List[int]:
+    """Chạy các migration chưa áp dụng. Trả về các version vừa chạy."""
+    applied_now: List[int] = []
+    with engine.connect() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INT PRIMARY KEY, "
+            "description VARCHAR(255), "
+            "applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP"
+            ") ENGINE=InnoDB"
+        ))
+        conn.commit()
+
+        # Worker khác đang migrate thì chờ nó xong rồi kiểm tra lại
+        acquired = conn.execute(
+            text("SELECT GET_LOCK(:name, :timeout)"), {"name": LOCK_NAME, "timeout": LOCK_TIMEOUT_SECONDS}
+        ).scalar()
+        conn.commit()
+        if not acquired:
+            raise RuntimeError(f"Timed out waiting for migration lock {LOCK_NAME}")
+
+        try:
+            done = set(applied_versions(conn))
+            for version, description, steps in MIGRATIONS:
+                if version in done:
+                    continue
+                print(f"🔄 Migration {version}: {description}...")
+                for step in steps:
+                    step(conn)
+                conn.execute(
+                    text("INSERT INTO schema_migrations (version, description) VALUES (:version, :description)"),
+                    {"version": version, "description": description}
+                )
+                conn.commit()
+                applied_now.append(version)
+        finally:
+            conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": LOCK_NAME})
+            conn.commit()
+
+    return applied_now
+
+
+# ===== HOT QUERIES =====
+
+# (tên, index mong đợi, query) theo đúng shape các route / job đang chạy
+HOT_QUERIES: List[Tuple[str, str, str]] = [
+    (
+        "recent approved warnings",
+        "idx_warnings_status_created",
+        "SELECT id, title, scammer_name FROM warnings WHERE status = 'approved' "
+        "AND created_at >= NOW() - INTERVAL 7 DAY ORDER BY created_at DESC LIMIT 10"
+    ),
+    (
+        "top scammers of a day (statistics rollup)",
+        "idx_warnings_status_created",
+        "SELECT scammer_name, bank_account, COUNT(id) FROM warnings WHERE status = 'approved' "
+        "AND created_at >= CURDATE() AND created_at < CURDATE() + INTERVAL 1 DAY GROUP BY scammer_name, bank_account"
+    ),
+    (
+        "top scammers (MySQL fallback)",
+        "idx_warnings_status_approved",
+        "SELECT scammer_name, bank_account, COUNT(id) FROM warnings WHERE status = 'approved' "
+        "AND approved_at >= NOW() - INTERVAL 7 DAY GROUP BY scammer_name, bank_account"
+    ),
+    (
+        "approvals to rebuild the top scammers sketch",
+        "idx_warnings_status_approved",
+        "SELECT scammer_name, bank_account, approved_at FROM warnings WHERE status = 'approved' "
+        "AND approved_at >= NOW() - INTERVAL 7 DAY AND approved_at < NOW() - INTERVAL 3 MINUTE"
+    ),
+    (
+        # Trước v3 dùng idx_status: status là cột đầu của index composite
+        "warnings by status only",
+        "idx_warnings_status_created",
+        "SELECT COUNT(*) FROM warnings WHERE status = 'pending'"
+    ),
+    (
+        "comments of a warning",
+        "idx_comments_warning_created",
+        "SELECT * FROM comments WHERE warning_id = 1 ORDER BY created_at DESC LIMIT 50"
+    ),
+    (
+        "admin reports by type and status",
+        "idx_reports_type_status_created",
+        "SELECT * FROM reports WHERE report_type = 'scam' AND status = 'pending' "
+        "ORDER BY created_at DESC LIMIT 50"
+    ),
+    (
+        "admin reports by status",
+        "idx_reports_status_created",
+        "SELECT * FROM reports WHERE status = 'pending' ORDER BY created_at DESC LIMIT 50"
+    ),
+    (
+        "warnings by phone (DB search fallback)",
+        "ft_phones_e164",
+        "SELECT id FROM warnings WHERE status = 'approved' "
+        "AND MATCH (phones_e164) AGAINST ('\"+84912345678\"' IN BOOLEAN MODE) ORDER BY created_at DESC LIMIT 20"
+    ),
+    (
+        "top searches (MySQL fallback / rollup)",
+        "idx_search_logs_created_query",
+        "SELECT search_query, COUNT(*) FROM search_logs "
+        "WHERE created_at >= NOW() - INTERVAL 1 DAY GROUP BY search_query"
+    ),
+    (
+        # Trước v3 dùng idx_search_logs_created_at: created_at là cột đầu của index composite
+        "search volume by hour (time-series MySQL fallback)",
+        "idx_search_logs_created_query",
+        "SELECT HOUR(created_at), search_type, COUNT(id) FROM search_logs "
+        "WHERE created_at >= NOW() - INTERVAL 1 HOUR AND created_at < NOW() GROUP BY HOUR(created_at), search_type"
+    ),
+]
+
+
+def explain_hot_queries(conn) -> List[Dict[str, Any]]:
+    """
+    EXPLAIN từng hot query. ok = không full scan (type ALL) và có dùng index;
+    expected_index = dùng đúng index trong HOT_QUERIES.
+    """
+    results = []
+    for name, expected, query in HOT_QUERIES:
+        plan = conn.execute(text(f"EXPLAIN {query}")).mappings().first()
+        key = plan.get("key")
+        results.append({
+            "name": name,
+            "table": plan.get("table"),
+            "type": plan.get("type"),
+            "key": key,
+            "expected_key": expected,
+            "rows": plan.get("rows"),
+            "extra": plan.get("Extra"),
+            "ok": bool(key) and plan.get("type") != "ALL",
+            "expected_index": key == expected
+        })
+    return results
@@ -4,15 +4,26 @@ from sqlalchemy import text
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+import asyncio
 from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 import uvicorn
 from datetime import datetime
 
-from core.database import create_tables, engine, get_db
-from models.models import Warning  # CHỈ import Warning, không import WarningStatus
-from services.elasticsearch_service import es_service
+from core.database import create_tables, backfill_normalized_columns, engine, get_db, SessionLocal
+from config import settings
+from services.elasticsearch_service import es_service, async_es_service
+from services.identifier_index import identifier_index
+from services.identifier_bloom import identifier_bloom
+from services.counter_buffer import counter_buffer
+from services.search_log_pipeline import search_log_pipeline
+from services.suggestion_index import suggestion_index
+from services.es_sync import es_sync
+from services.es_outbox import es_outbox
+from services.stats_rollup import statistics_rollup
+from services.timeseries import timeseries_rollup
+from services.topk_sketch import top_searches_sketch, top_scammers_sketch, load_or_seed_scammers
 
 from api.users import router as users_router
 from api.warnings import router as warnings_router
@@ -37,6 +48,11 @@ try:
     db_initialized = True
     print("✅ Database tables created successfully!")
     
+    try:
+        backfill_normalized_columns(settings.NORMALIZE_BACKFILL_BATCH_SIZE)
+    except Exception as e:
+        print(f"⚠️ Normalized columns backfill error: {e}")
+    
 except Exception as e:
     print(f"❌ DATABASE INITIALIZATION FAILED: {e}")
     print("⚠️ Server will start in LIMITED mode")
@@ -69,7 +85,7 @@ app.include_router(statistics_router)
 
 @app.get("/")
 async def root():
-    es_health = es_service.health_check()
+    es_health = await async_es_service.health_check()
     return {
         "message": "CheckScam API",
         "version": "2.0.0",
@@ -83,7 +99,7 @@ async def root():
 async def health_check(db: Session = Depends(get_db)):
     try:
         db_status = "connected" if db_initialized else "not_connected"
-        es_health = es_service.health_check()
+        es_health = await async_es_service.health_check()
         
         return {
             "status": "healthy" if db_initialized and es_health else "degraded",
@@ -94,6 +110,52 @@ async def health_check(db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Health check error: {str(e)}")
 
+warm_up_task = None
+
+def _build_with_db(build):
+    db = SessionLocal()
+    try:
+        return build(db)
+    finally:
+        db.close()
+
+async def warm_up():
+    """Nạp / build các cấu trúc trong bộ nhớ bằng thread, không chặn event loop"""
+    if db_initialized:
+        try:
+            entries = await asyncio.to_thread(_build_with_db, identifier_index.build_from_db)
+            print(f"✅ Identifier index: {entries} entries")
+            # Merge delta chỉ chạy khi đã có file chính hợp lệ
+            identifier_index.start()
+        except Exception as e:
+            print(f"⚠️ Identifier index build error: {e}")
+        
+        try:
+            items = await asyncio.to_thread(_build_with_db, identifier_bloom.load_or_build)
+            print(f"✅ Identifier bloom filter: {items} identifiers")
+        except Exception as e:
+            print(f"⚠️ Identifier bloom filter build error: {e}")
+        
+        try:
+            suggestions = await asyncio.to_thread(_build_with_db, suggestion_index.build_from_db)
+            print(f"✅ Suggestion index: {suggestions} warnings")
+        except Exception as e:
+            print(f"⚠️ Suggestion index build error: {e}")
+        
+        try:
+            seeded = await asyncio.to_thread(_build_with_db, load_or_seed_scammers)
+            print(f"✅ Top scammers sketch: {'seeded ' + str(seeded) + ' approvals' if seeded else 'loaded'}")
+        except Exception as e:
+            print(f"⚠️ Top scammers sketch error: {e}")
+    
+    # Top searches chỉ có dữ liệu từ lúc chạy, chưa đủ cửa sổ thì endpoint dùng Elasticsearch
+    await asyncio.to_thread(top_searches_sketch.load)
+    
+    # Checkpoint sau khi đã nạp / seed: checkpoint sớm hơn sẽ tạo file làm worker bỏ qua bước seed
+    top_searches_sketch.start()
+    top_scammers_sketch.start()
+    print("✅ Warm-up finished")
+
 @app.on_event("startup")
 async def startup_event():
     print("=" * 60)
@@ -105,28 +167,50 @@ async def startup_event():
     else:
         print("❌ Database: NOT READY")
     
+    # Build index / sketch chạy nền: worker nhận request ngay, trong lúc build các endpoint
+    # dùng Elasticsearch (identifier index / bloom trả None, suggestion index chưa is_ready)
+    global warm_up_task
+    warm_up_task = asyncio.get_running_loop().create_task(warm_up())
+    
     if es_service.health_check():
         print("✅ Elasticsearch: CONNECTED")
-        if db_initialized:
-            try:
-                db = next(get_db())
-                warnings_list = db.query(Warning).filter(
-                    Warning.status == 'approved'  # SỬA: dùng string 'approved' thay vì WarningStatus.APPROVED
-                ).all()
-                
-                if warnings_list:
-                    es_service.bulk_index_warnings(warnings_list)
-                    print(f"✅ Indexed {len(warnings_list)} warnings to Elasticsearch")
-                else:
-                    print("ℹ️ No warnings to index")
-            except Exception as e:
-                print(f"⚠️ Warning indexing error: {e}")
     else:
         print("⚠️ Elasticsearch: NOT CONNECTED")
     
+    # Đồng bộ MySQL -> ES chạy nền sau khi app sẵn sàng (chỉ phần thay đổi từ watermark)
+    if db_initialized:
+        es_sync.start()
+        es_outbox.start()
+        statistics_rollup.start()
+        timeseries_rollup.start()
+    
+    counter_buffer.start()
+    search_log_pipeline.start()
+    suggestion_index.start()
+    
     print("📊 API READY!")
     print("=" * 60)
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    if warm_up_task is not None and not warm_up_task.done():
+        warm_up_task.cancel()
+    
+    # Flush counter / search log còn trong buffer để không mất dữ liệu
+    await timeseries_rollup.stop()
+    await statistics_rollup.stop()
+    await es_outbox.stop()
+    await es_sync.stop()
+    await suggestion_index.stop()
+    await identifier_index.stop()
+    await counter_buffer.stop()
+    await search_log_pipeline.stop()
+    await top_searches_sketch.stop()
+    await top_scammers_sketch.stop()
+    print("✅ Counters and search logs flushed")
+    
+    await async_es_service.close()
+
 @app.post("/test/register")
 async def test_register():
     if not db_initialized:
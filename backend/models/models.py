@@ -1,7 +1,8 @@
 from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, JSON, Float, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, validates
 from datetime import datetime
+from utils.normalization import fold_text, normalize_digits, normalize_facebook_link, extract_phones
 
 Base = declarative_base()
 
@@ -113,6 +114,41 @@ class Warning(Base):
     updated_at = Column(DateTime, onupdate=datetime.utcnow)
     approved_at = Column(DateTime, nullable=True)
     
+    # Cột chuẩn hóa (bỏ dấu / chỉ giữ số / link chuẩn), tự cập nhật khi gán cột gốc
+    scammer_name_norm = Column(String(255), index=True)
+    bank_account_norm = Column(String(100), index=True)
+    facebook_link_norm = Column(String(500))
+    # Số điện thoại chính (E.164) trích từ bank_account, rồi tới content; "" = không có
+    phone_e164 = Column(String(20), index=True)
+    # Mọi số điện thoại (E.164) của warning, cách nhau bởi dấu cách, tra bằng FULLTEXT
+    phones_e164 = Column(Text)
+    
+    def _set_phones(self, bank_account, content):
+        phones = extract_phones(bank_account, content)
+        self.phone_e164 = phones[0] if phones else ""
+        self.phones_e164 = " ".join(phones)
+    
+    @validates("scammer_name")
+    def _set_scammer_name_norm(self, key, value):
+        self.scammer_name_norm = fold_text(value)
+        return value
+    
+    @validates("bank_account")
+    def _set_bank_account_norm(self, key, value):
+        self.bank_account_norm = normalize_digits(value) or None
+        self._set_phones(value, self.content)
+        return value
+    
+    @validates("content")
+    def _set_content_phone(self, key, value):
+        self._set_phones(self.bank_account, value)
+        return value
+    
+    @validates("facebook_link")
+    def _set_facebook_link_norm(self, key, value):
+        self.facebook_link_norm = normalize_facebook_link(value) or None
+        return value
+    
     def to_dict(self):
         return {
             "id": self.id,
@@ -199,6 +235,9 @@ class Comment(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, onupdate=datetime.utcnow)
     
+    # CommentResponse trả kèm user; joined để load cùng query (AsyncSession không lazy load được)
+    user = relationship("User", lazy="joined")
+    
     def to_dict(self):
         return {
             "id": self.id,
@@ -222,6 +261,37 @@ class Statistics(Base):
     top_searches = Column(JSON)
     recent_warnings = Column(JSON)
 
+class SyncState(Base):
+    __tablename__ = "sync_state"
+    
+    name = Column(String(100), primary_key=True)
+    watermark_at = Column(DateTime, nullable=True)
+    watermark_id = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class WarningOutbox(Base):
+    """Thay đổi của warning chờ đẩy sang Elasticsearch (ghi cùng transaction với warning)"""
+    __tablename__ = "warning_outbox"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    warning_id = Column(Integer, nullable=False, index=True)
+    op = Column(String(10), default='full')  # 'full' = gửi lại cả document, 'meta' = chỉ status/moderation fields
+    created_at = Column(DateTime, default=datetime.utcnow)
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, index=True)
+    last_error = Column(String(500))
+
+class TimeSeriesBucket(Base):
+    """Số lượng theo giờ / ngày của warning (category, status), report (report_type, status) và search (search_type)"""
+    __tablename__ = "timeseries_buckets"
+    
+    metric = Column(String(20), primary_key=True)       # 'warnings' | 'reports' | 'searches'
+    bucket_size = Column(String(5), primary_key=True)   # 'hour' | 'day'
+    bucket_start = Column(DateTime, primary_key=True)
+    dimension = Column(String(100), primary_key=True, default='')
+    status = Column(String(20), primary_key=True, default='')
+    count = Column(Integer, default=0)
+
 class SearchLog(Base):
     __tablename__ = "search_logs"
     
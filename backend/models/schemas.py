@@ -194,4 +194,28 @@ class SearchRequest(BaseModel):
 class SearchResponse(BaseModel):
     query: str
     results: List[WarningResponse]
-    total: int
\ No newline at end of file
+    total: int
+
+class CursorSearchResponse(BaseModel):
+    query: str
+    results: List[WarningResponse]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+    total_relation: Optional[str] = None  # eq | gte (khi vượt ngưỡng đếm)
+
+class BatchLookupItem(BaseModel):
+    value: str
+    type: Optional[str] = None  # phone, bank_account, facebook, name
+
+class BatchLookupRequest(BaseModel):
+    identifiers: List[BatchLookupItem]
+
+class BatchLookupResult(BaseModel):
+    value: str
+    type: Optional[str] = None
+    source: str  # bloom, index, elasticsearch, unavailable
+    is_reported: bool
+    warnings: List[WarningResponse]
+
+class BatchLookupResponse(BaseModel):
+    results: List[BatchLookupResult]
\ No newline at end of file
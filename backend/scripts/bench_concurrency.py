@@ -0,0 +1,94 @@
+"""
+Benchmark throughput của API dưới tải đồng thời.
+
+Chạy với server đang chạy (1 worker để so sánh công bằng), trước và sau khi đổi code:
+
+    python scripts/bench_concurrency.py --url http://localhost:8000 --concurrency 1,10,50,100
+
+Mỗi mức concurrency gửi liên tục request trong --duration giây rồi in ra
+req/s, p50/p95/p99 latency và số lỗi.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from typing import List, Tuple
+
+import aiohttp
+
+DEFAULT_PATHS = [
+    "/warnings/search/?query={account}&search_type=bank_account",
+    "/warnings/search/?query=nguyen%20van&search_type=name",
+    "/warnings/top/scammers?days=7&limit=10",
+    "/comments/warning/1",
+    "/health",
+]
+
+
+def _make_path(template: str) -> str:
+    return template.format(account="".join(random.choice("0123456789") for _ in range(10)))
+
+
+async def _worker(session: aiohttp.ClientSession, base_url: str, paths: List[str], deadline: float,
+                  latencies: List[float], errors: List[int]):
+    while time.perf_counter() < deadline:
+        url = base_url + _make_path(random.choice(paths))
+        started = time.perf_counter()
+        try:
+            async with session.get(url) as response:
+                await response.read()
+                if response.status >= 500:
+                    errors.append(response.status)
+        except Exception:
+            errors.append(0)
+        latencies.append(time.perf_counter() - started)
+
+
+async def run_level(base_url: str, paths: List[str], concurrency: int, duration: float) -> Tuple[float, List[float], int]:
+    latencies: List[float] = []
+    errors: List[int] = []
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*[
+            _worker(session, base_url, paths, deadline, latencies, errors)
+            for _ in range(concurrency)
+        ])
+
+    return len(latencies) / duration, latencies, len(errors)
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="CheckScam API concurrency benchmark")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", default="1,10,50,100")
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--path", action="append", help="Path template (có thể lặp lại), {account} = số ngẫu nhiên")
+    args = parser.parse_args()
+
+    paths = args.path or DEFAULT_PATHS
+    print(f"{'concurrency':>12} {'req/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'mean ms':>10} {'errors':>8}")
+
+    for level in [int(c) for c in args.concurrency.split(",")]:
+        rps, latencies, errors = await run_level(args.url.rstrip("/"), paths, level, args.duration)
+        print(
+            f"{level:>12} {rps:>10.1f} "
+            f"{_percentile(latencies, 0.50) * 1000:>10.1f} "
+            f"{_percentile(latencies, 0.95) * 1000:>10.1f} "
+            f"{_percentile(latencies, 0.99) * 1000:>10.1f} "
+            f"{(statistics.mean(latencies) if latencies else 0) * 1000:>10.1f} "
+            f"{errors:>8}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,55 @@
+"""
+Kiểm tra các hot query (core/migrations.py HOT_QUERIES) có dùng index bằng EXPLAIN.
+
+Chạy trên database đã migrate (cấu hình DB_* như server), nên có dữ liệu gần với
+production vì với bảng quá nhỏ MySQL có thể chọn full scan:
+
+    python scripts/check_query_plans.py
+    python scripts/check_query_plans.py --strict   # bắt buộc dùng đúng index mong đợi
+
+Exit code 1 nếu có query full scan / không dùng index (hoặc sai index khi --strict).
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.database import engine  # noqa: E402
+from core.migrations import LATEST_VERSION, applied_versions, explain_hot_queries, migrate  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN hot queries and check index usage")
+    parser.add_argument("--strict", action="store_true", help="Require the expected index, not just any index")
+    parser.add_argument("--migrate", action="store_true", help="Apply pending migrations first")
+    args = parser.parse_args()
+
+    if args.migrate:
+        migrate(engine)
+
+    with engine.connect() as conn:
+        versions = applied_versions(conn)
+        if LATEST_VERSION not in versions:
+            print(f"⚠️ Schema not at version {LATEST_VERSION} (applied: {versions}), run with --migrate")
+        results = explain_hot_queries(conn)
+
+    failed = 0
+    print(f"{'query':<42} {'type':<8} {'key':<34} {'rows':>8}  extra")
+    for result in results:
+        passed = result["ok"] and (result["expected_index"] or not args.strict)
+        failed += not passed
+        mark = "✅" if passed else "❌"
+        print(
+            f"{mark} {result['name']:<40} {str(result['type']):<8} {str(result['key']):<34} "
+            f"{str(result['rows']):>8}  {result['extra'] or ''}"
+        )
+        if result["ok"] and not result["expected_index"]:
+            print(f"   ⚠️ expected {result['expected_key']}")
+
+    print(f"\n{len(results) - failed}/{len(results)} hot queries use an index")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import asyncio
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List
+
+from elasticsearch.helpers import bulk
+from sqlalchemy import text
+
+from config import settings
+from core.database import engine
+from services.elasticsearch_service import es_service
+
+COUNTER_FIELDS = ("search_count", "view_count")
+
+# Cộng dồn các counter trong params.deltas vào document
+ES_INCREMENT_SCRIPT = """
+for (entry in params.deltas.entrySet()) {
+    def current = ctx._source[entry.getKey()];
+    ctx._source[entry.getKey()] = (current == null ? 0 : current) + entry.getValue();
+}
+"""
+
+
+def _merge(target: Dict[int, Dict[str, int]], source: Dict[int, Dict[str, int]]):
+    for warning_id, deltas in source.items():
+        for field, n in deltas.items():
+            target[warning_id][field] += n
+
+
+class CounterBuffer:
+    """
+    Gom các lượt tăng search_count / view_count trong bộ nhớ và ghi định kỳ:
+    một câu UPDATE ... CASE cho MySQL và một bulk scripted update cho ES.
+
+    Counter flush không đổi updated_at nên ES sync theo watermark không đẩy lại các warning
+    này; update ES lỗi không retry được thì ghi outbox để gửi lại cả document từ MySQL.
+    """
+
+    def __init__(self, flush_interval: float = 5.0, batch_size: int = 500):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: Dict[int, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._es_pending: Dict[int, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._task = None
+
+        self.increments = 0
+        self.flushes = 0
+        self.rows_flushed = 0
+        self.db_errors = 0
+        self.es_errors = 0
+        self.es_dropped = 0
+        self.es_resyncs = 0
+
+    def increment(self, field: str, warning_ids: Iterable[int], n: int = 1):
+        if field not in COUNTER_FIELDS:
+            raise ValueError(f"Unknown counter field: {field}")
+
+        with self._lock:
+            for warning_id in warning_ids:
+                self._pending[int(warning_id)][field] += n
+                self.increments += 1
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending) + len(self._es_pending)
+
+    def _flush_db(self, batch: Dict[int, Dict[str, int]]):
+        params = {}
+        set_clauses = []
+        for field in COUNTER_FIELDS:
+            cases = []
+            for i, (warning_id, deltas) in enumerate(batch.items()):
+                if deltas.get(field):
+                    cases.append(f"WHEN :id_{i} THEN :{field}_{i}")
+                    params[f"{field}_{i}"] = deltas[field]
+            if cases:
+                set_clauses.append(f"{field} = {field} + CASE id {' '.join(cases)} ELSE 0 END")
+
+        if not set_clauses:
+            return
+
+        id_params = []
+        for i, warning_id in enumerate(batch):
+            params[f"id_{i}"] = warning_id
+            id_params.append(f":id_{i}")
+
+        # Giữ nguyên updated_at (cột ON UPDATE CURRENT_TIMESTAMP): lượt xem / tìm kiếm không phải là
+        # sửa warning, không được kích hoạt ES sync, time-series hay suggestion refresh theo updated_at
+        set_clauses.append("updated_at = updated_at")
+        sql = f"UPDATE warnings SET {', '.join(set_clauses)} WHERE id IN ({', '.join(id_params)})"
+        with engine.begin() as conn:
+            conn.execute(text(sql), params)
+
+    def _flush_es(self, batch: Dict[int, Dict[str, int]]) -> Dict[int, Dict[str, int]]:
+        """Gửi counter sang ES, trả về các counter cần gửi lại (429 / lỗi server)"""
+        actions = [
+            {
+                "_op_type": "update",
+                "_index": es_service.WARNING_INDEX,
+                "_id": str(warning_id),
+                "script": {
+                    "source": ES_INCREMENT_SCRIPT,
+                    "lang": "painless",
+                    "params": {"deltas": dict(deltas)}
+                }
+            }
+            for warning_id, deltas in batch.items()
+        ]
+        _, errors = bulk(es_service.es_client, actions, raise_on_error=False, raise_on_exception=True)
+
+        retry: Dict[int, Dict[str, int]] = {}
+        resync: List[int] = []
+        for item in errors:
+            result = next(iter(item.values()))
+            status = result.get("status")
+            # Warning chưa được index (404) không cần retry
+            if status == 404:
+                continue
+            warning_id = int(result.get("_id"))
+            if status == 429 or (status or 0) >= 500:
+                retry[warning_id] = batch[warning_id]
+            else:
+                self.es_dropped += 1
+                resync.append(warning_id)
+            print(f"❌ Counter flush (Elasticsearch) warning {warning_id}: {status} {result.get('error')}")
+
+        if resync:
+            self._resync_es(resync)
+        return retry
+
+    def _resync_es(self, warning_ids: List[int]):
+        """Ghi outbox 'full' để dispatcher index lại document với counter hiện tại trong MySQL"""
+        try:
+            with engine.begin() as conn:
+                conn.execute(
+                    text("INSERT INTO warning_outbox (warning_id, op) VALUES (:warning_id, 'full')"),
+                    [{"warning_id": warning_id} for warning_id in warning_ids]
+                )
+            self.es_resyncs += len(warning_ids)
+        except Exception as e:
+            print(f"❌ Counter resync (outbox) error: {e}")
+
+    def flush(self) -> int:
+        """Ghi toàn bộ counter đang chờ. Counter ghi lỗi được giữ lại cho lần flush sau."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, defaultdict(lambda: defaultdict(int))
+                es_batch, self._es_pending = self._es_pending, defaultdict(lambda: defaultdict(int))
+
+            items = list(batch.items())
+            for start in range(0, len(items), self.batch_size):
+                chunk = dict(items[start:start + self.batch_size])
+                try:
+                    self._flush_db(chunk)
+                    self.rows_flushed += len(chunk)
+                    _merge(es_batch, chunk)
+                except Exception as e:
+                    self.db_errors += 1
+                    print(f"❌ Counter flush (MySQL) error: {e}")
+                    with self._lock:
+                        _merge(self._pending, chunk)
+
+            items = list(es_batch.items())
+            for start in range(0, len(items), self.batch_size):
+                chunk = dict(items[start:start + self.batch_size])
+                try:
+                    retry = self._flush_es(chunk)
+                    if retry:
+                        self.es_errors += 1
+                        with self._lock:
+                            _merge(self._es_pending, retry)
+                except Exception as e:
+                    self.es_errors += 1
+                    print(f"❌ Counter flush (Elasticsearch) error: {e}")
+                    with self._lock:
+                        _merge(self._es_pending, chunk)
+
+            self.flushes += 1
+            return len(batch)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                print(f"❌ Counter flush error: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+    def stats(self) -> dict:
+        return {
+            "pending_warnings": self.pending_count(),
+            "increments": self.increments,
+            "flushes": self.flushes,
+            "rows_flushed": self.rows_flushed,
+            "db_errors": self.db_errors,
+            "es_errors": self.es_errors,
+            "es_dropped": self.es_dropped,
+            "es_resyncs": self.es_resyncs,
+            "flush_interval": self.flush_interval
+        }
+
+
+# Global instance
+counter_buffer = CounterBuffer(
+    flush_interval=settings.COUNTER_FLUSH_INTERVAL_SECONDS,
+    batch_size=settings.COUNTER_FLUSH_BATCH_SIZE
+)
@@ -0,0 +1,93 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from config import settings
+from services.single_flight import SingleFlight
+
+STATUS_HIT = "hit"
+STATUS_STALE = "stale"
+STATUS_MISS = "miss"
+
+
+class DashboardCache:
+    """
+    Cache theo section cho dashboard, mỗi section một TTL.
+
+    Entry còn hạn: trả về ngay. Hết hạn nhưng chưa quá stale_seconds: trả về giá trị
+    cũ và làm mới ở nền (stale-while-revalidate). Quá hạn hẳn / chưa có: tính đồng bộ.
+    Loader là hàm sync (query DB / ES) nên chạy trong thread; các request cùng section
+    được gộp bằng SingleFlight nên mỗi lúc chỉ có một lần tính cho mỗi key.
+    """
+
+    def __init__(self, stale_seconds: float = 600.0):
+        self.stale_seconds = stale_seconds
+
+        self._entries: Dict[Hashable, Tuple[Any, float]] = {}
+        self._flight = SingleFlight()
+        self._refreshing: set = set()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refresh_errors = 0
+
+    async def _load(self, key: Hashable, ttl: float, loader: Callable[[], Any]) -> Any:
+        value = await asyncio.to_thread(loader)
+        self._entries[key] = (value, time.monotonic() + ttl)
+        return value
+
+    def _revalidate(self, key: Hashable, ttl: float, loader: Callable[[], Any]):
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+
+        def done(task: asyncio.Task):
+            self._refreshing.discard(key)
+            if not task.cancelled() and task.exception() is not None:
+                self.refresh_errors += 1
+                print(f"❌ Dashboard section {key} refresh error: {task.exception()}")
+
+        task = asyncio.get_running_loop().create_task(
+            self._flight.run(key, lambda: self._load(key, ttl, loader))
+        )
+        task.add_done_callback(done)
+
+    async def get(self, key: Hashable, ttl: float, loader: Callable[[], Any]) -> Tuple[Any, str]:
+        """Trả về (value, trạng thái cache: hit / stale / miss)"""
+        entry = self._entries.get(key)
+        now = time.monotonic()
+
+        if entry is not None:
+            value, expires_at = entry
+            if now < expires_at:
+                self.hits += 1
+                return value, STATUS_HIT
+            if now < expires_at + self.stale_seconds:
+                self.stale_hits += 1
+                self._revalidate(key, ttl, loader)
+                return value, STATUS_STALE
+
+        self.misses += 1
+        value = await self._flight.run(key, lambda: self._load(key, ttl, loader))
+        return value, STATUS_MISS
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.stale_hits) / total, 4) if total else 0.0,
+            "refreshing": len(self._refreshing),
+            "refresh_errors": self.refresh_errors,
+            "single_flight": self._flight.stats()
+        }
+
+
+# Global instance
+dashboard_cache = DashboardCache(stale_seconds=settings.DASHBOARD_STALE_SECONDS)
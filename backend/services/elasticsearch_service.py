@@ -1,24 +1,25 @@
-from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk
-from typing import List, Dict, Any, Tuple
-from datetime import datetime
+from elasticsearch import Elasticsearch, AsyncElasticsearch
+from typing import List, Dict, Any, Iterable, Optional, Tuple, Union
+from datetime import datetime, timedelta
+import base64
+import copy
+import hashlib
+import json
+import re
 from config import settings
+import utils.helpers as helpers
 
-class ElasticsearchService:
+class BaseElasticsearchService:
+    """Index, mapping và query body dùng chung cho client sync và async"""
+    
     def __init__(self):
         self.es_host = settings.ES_HOST
         self.es_port = settings.ES_PORT
         
-        self.es_client = Elasticsearch(
-            [f"http://{self.es_host}:{self.es_port}"],
-            max_retries=3,
-            retry_on_timeout=True,
-            request_timeout=30,
-            verify_certs=False
-        )
-        
         self.WARNING_INDEX = "warnings"
         self.SEARCH_LOG_INDEX = "search_logs"
+        # Cửa sổ dài hơn thì dùng wildcard thay vì liệt kê từng index ngày (URL quá dài)
+        self.SEARCH_LOG_INDEX_LIST_MAX_DAYS = 31
         
         # FIXED: ĐÃ XÓA "boost": 2 KHỎI TITLE
         self.WARNING_MAPPING = {
@@ -48,6 +49,7 @@ class ElasticsearchService:
                     },
                     "bank_name": {"type": "keyword"},
                     "facebook_link": {"type": "keyword"},
+                    "phone_numbers": {"type": "keyword"},  # E.164, trích từ bank_account + content
                     "title": {"type": "text", "analyzer": "vi_analyzer"},  # ĐÃ XÓA "boost": 2
                     "content": {"type": "text", "analyzer": "vi_analyzer"},
                     "category": {"type": "keyword"},
@@ -65,32 +67,31 @@ class ElasticsearchService:
             }
         }
         
-        self.SEARCH_LOG_MAPPING = {
-            "mappings": {
-                "properties": {
-                    "search_query": {"type": "text"},
-                    "search_type": {"type": "keyword"},
-                    "user_id": {"type": "keyword"},
-                    "ip_address": {"type": "keyword"},
-                    "result_count": {"type": "integer"},
-                    "created_at": {"type": "date"}
+        # Search log ghi vào index theo ngày (search_logs-YYYY.MM.DD), mapping lấy từ index template
+        self.SEARCH_LOG_TEMPLATE = {
+            "index_patterns": [f"{self.SEARCH_LOG_INDEX}-*"],
+            "template": {
+                "settings": {
+                    "number_of_shards": 1,
+                    "number_of_replicas": 1,
+                    "refresh_interval": "5s"
+                },
+                "mappings": {
+                    "dynamic": False,
+                    "properties": {
+                        "search_query": {
+                            "type": "text",
+                            "fields": {"keyword": {"type": "keyword", "ignore_above": 256}}
+                        },
+                        "search_type": {"type": "keyword"},
+                        "user_id": {"type": "keyword"},
+                        "ip_address": {"type": "keyword"},
+                        "result_count": {"type": "integer"},
+                        "created_at": {"type": "date"}
+                    }
                 }
             }
         }
-        
-        self._create_indices()
-    
-    def _create_indices(self):
-        try:
-            if not self.es_client.indices.exists(index=self.WARNING_INDEX):
-                self.es_client.indices.create(index=self.WARNING_INDEX, body=self.WARNING_MAPPING)
-                print(f"✅ Created index: {self.WARNING_INDEX}")
-            
-            if not self.es_client.indices.exists(index=self.SEARCH_LOG_INDEX):
-                self.es_client.indices.create(index=self.SEARCH_LOG_INDEX, body=self.SEARCH_LOG_MAPPING)
-                print(f"✅ Created index: {self.SEARCH_LOG_INDEX}")
-        except Exception as e:
-            print(f"❌ Error creating indices: {e}")
     
     def warning_to_doc(self, warning: Any) -> Dict[str, Any]:
         search_combined = " ".join([
@@ -107,6 +108,7 @@ class ElasticsearchService:
             "bank_account": warning.bank_account,
             "bank_name": warning.bank_name,
             "facebook_link": warning.facebook_link,
+            "phone_numbers": helpers.extract_phones(warning.bank_account, warning.content),
             "title": warning.title,
             "content": warning.content,
             "category": warning.category.value if hasattr(warning.category, 'value') else warning.category,
@@ -122,6 +124,276 @@ class ElasticsearchService:
             "approved_at": warning.approved_at.isoformat() if warning.approved_at else None
         }
     
+    def warning_partial_doc(self, warning: Any, fields: Iterable[str]) -> Dict[str, Any]:
+        """Chỉ các field cần cập nhật, tránh gửi lại (và phân tích lại) search_combined/content"""
+        doc = {}
+        for field in fields:
+            value = getattr(warning, field)
+            if hasattr(value, 'value'):
+                value = value.value
+            elif isinstance(value, datetime):
+                value = value.isoformat()
+            doc[field] = value
+        return doc
+    
+    def _search_warnings_body(
+        self,
+        query_string: str,
+        search_type: str,
+        page: int,
+        page_size: int,
+        search_after: Optional[List[Any]] = None,
+        track_total_hits: Union[bool, int] = None
+    ) -> Dict[str, Any]:
+        phone = helpers.normalize_phone(query_string) if search_type == "phone" else ""
+        if phone:
+            query = {"term": {"phone_numbers": phone}}
+        elif search_type == "phone" or search_type == "bank_account":
+            query = {"match": {"bank_account": {"query": query_string}}}
+        elif search_type == "facebook":
+            query = {"match": {"facebook_link": {"query": query_string}}}
+        else:
+            query = {
+                "multi_match": {
+                    "query": query_string,
+                    "fields": ["scammer_name^10", "bank_account^8", "search_combined^5", "title^3", "content^1"],
+                    "type": "best_fields",
+                    "fuzziness": "AUTO",
+                    "operator": "and"
+                }
+            }
+        
+        body = {
+            # Mặc định chỉ đếm chính xác tới SEARCH_TOTAL_HITS_CAP, False = không đếm
+            "track_total_hits": settings.SEARCH_TOTAL_HITS_CAP if track_total_hits is None else track_total_hits,
+            "query": {"bool": {"must": query, "filter": [{"term": {"status": "approved"}}]}},
+            # id làm tiebreaker để thứ tự ổn định cho search_after
+            "sort": [{"_score": {"order": "desc"}}, {"created_at": {"order": "desc"}}, {"id": {"order": "desc"}}],
+            "size": page_size,
+            "_source": ["id"]
+        }
+        
+        if search_after is not None:
+            body["search_after"] = search_after
+        else:
+            body["from"] = (page - 1) * page_size
+        return body
+    
+    @staticmethod
+    def encode_cursor(sort_values: List[Any]) -> str:
+        """Sort values của hit cuối -> cursor opaque (base64url JSON)"""
+        raw = json.dumps(sort_values, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+    
+    @staticmethod
+    def decode_cursor(cursor: str) -> List[Any]:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            sort_values = json.loads(raw)
+        except Exception:
+            raise ValueError("Invalid cursor")
+        if not isinstance(sort_values, list) or len(sort_values) != 3:
+            raise ValueError("Invalid cursor")
+        return sort_values
+    
+    @staticmethod
+    def _parse_total(response: Dict[str, Any]) -> Tuple[Optional[int], Optional[str]]:
+        total = response["hits"].get("total")
+        if not total:
+            return None, None
+        return total["value"], total["relation"]
+    
+    def search_log_index(self, created_at: Union[datetime, str, None] = None) -> str:
+        """Index theo ngày (UTC) của search log"""
+        if isinstance(created_at, str):
+            created_at = datetime.fromisoformat(created_at)
+        return f"{self.SEARCH_LOG_INDEX}-{(created_at or datetime.utcnow()):%Y.%m.%d}"
+    
+    def search_log_indices(self, days: int) -> str:
+        """
+        Các index theo ngày phủ khoảng now-{days}d/d .. now (không quét index cũ hơn).
+        days bị giới hạn bởi retention (index cũ hơn đã bị xóa); cửa sổ dài dùng wildcard,
+        query đã lọc range created_at nên shard ngoài khoảng bị bỏ qua ở bước can_match.
+        """
+        if settings.SEARCH_LOG_RETENTION_DAYS > 0:
+            days = min(days, settings.SEARCH_LOG_RETENTION_DAYS)
+        if days > self.SEARCH_LOG_INDEX_LIST_MAX_DAYS:
+            return f"{self.SEARCH_LOG_INDEX}-*"
+        today = datetime.utcnow()
+        return ",".join(self.search_log_index(today - timedelta(days=i)) for i in range(max(days, 0) + 1))
+    
+    def _top_searches_body(self, days: int, limit: int) -> Dict[str, Any]:
+        return {
+            "size": 0,
+            "query": {"range": {"created_at": {"gte": f"now-{days}d/d", "lte": "now/d"}}},
+            "aggs": {
+                "top_searches": {
+                    "terms": {"field": "search_query.keyword", "size": limit, "order": {"_count": "desc"}}
+                }
+            }
+        }
+    
+    def _parse_top_searches(self, response: Dict[str, Any]) -> List[Dict[str, Any]]:
+        buckets = response["aggregations"]["top_searches"]["buckets"]
+        return [{"query": bucket["key"], "search_count": bucket["doc_count"]} for bucket in buckets]
+    
+    def _top_scammers_body(self, days: int, limit: int) -> Dict[str, Any]:
+        return {
+            "size": 0,
+            "query": {
+                "bool": {
+                    "must": [
+                        {"term": {"status": "approved"}},
+                        # Cùng mốc thời gian với top-k sketch (cộng khi duyệt)
+                        {"range": {"approved_at": {"gte": f"now-{days}d/d", "lte": "now/d"}}}
+                    ]
+                }
+            },
+            "aggs": {
+                "top_scammers": {
+                    "terms": {"field": "scammer_name.keyword", "size": limit, "order": {"_count": "desc"}},
+                    "aggs": {
+                        "bank_accounts": {"terms": {"field": "bank_account.keyword", "size": 1}}
+                    }
+                }
+            }
+        }
+    
+    def _parse_top_scammers(self, response: Dict[str, Any]) -> List[Dict[str, Any]]:
+        buckets = response["aggregations"]["top_scammers"]["buckets"]
+        result = []
+        
+        for bucket in buckets:
+            bank_account = ""
+            if bucket["bank_accounts"]["buckets"]:
+                bank_account = bucket["bank_accounts"]["buckets"][0]["key"]
+            result.append({
+                "scammer_name": bucket["key"],
+                "bank_account": bank_account,
+                "warning_count": bucket["doc_count"]
+            })
+        return result
+
+class ElasticsearchService(BaseElasticsearchService):
+    def __init__(self):
+        super().__init__()
+        
+        self.es_client = Elasticsearch(
+            [f"http://{self.es_host}:{self.es_port}"],
+            max_retries=3,
+            retry_on_timeout=True,
+            request_timeout=30,
+            verify_certs=False
+        )
+        
+        self._create_indices()
+    
+    def _create_indices(self):
+        try:
+            if not self.es_client.indices.exists(index=self.WARNING_INDEX):
+                # WARNING_INDEX là alias trỏ tới index có version (warnings_v1, warnings_v2, ...)
+                index_name = self.create_warning_index_version(loading=False)
+                self.es_client.indices.put_alias(index=index_name, name=self.WARNING_INDEX)
+                print(f"✅ Created index: {index_name} (alias {self.WARNING_INDEX})")
+            else:
+                # Thêm field mới vào index đã có (vd phone_numbers), field cũ không đổi.
+                # Thay đổi không tương thích sẽ lỗi ở đây và được xử lý bằng reindex (mapping_outdated)
+                try:
+                    self.es_client.indices.put_mapping(
+                        index=self.WARNING_INDEX,
+                        properties=self.WARNING_MAPPING["mappings"]["properties"]
+                    )
+                except Exception as e:
+                    print(f"⚠️ Warning mapping changed incompatibly, reindex required: {e}")
+            
+            # Index search log theo ngày được tạo tự động khi ghi, mapping lấy từ template
+            self.es_client.indices.put_index_template(name=self.SEARCH_LOG_INDEX, **self.SEARCH_LOG_TEMPLATE)
+        except Exception as e:
+            print(f"❌ Error creating indices: {e}")
+    
+    # ===== VERSIONED WARNING INDICES (zero-downtime reindex) =====
+    
+    def mapping_hash(self) -> str:
+        raw = json.dumps(self.WARNING_MAPPING, sort_keys=True).encode()
+        return hashlib.sha1(raw).hexdigest()[:16]
+    
+    def warning_index_versions(self) -> List[int]:
+        indices = self.es_client.indices.get(index=f"{self.WARNING_INDEX}_v*", ignore_unavailable=True, allow_no_indices=True)
+        versions = []
+        for name in indices:
+            match = re.fullmatch(rf"{self.WARNING_INDEX}_v(\d+)", name)
+            if match:
+                versions.append(int(match.group(1)))
+        return sorted(versions)
+    
+    def warning_alias_targets(self) -> List[str]:
+        """Các index thật đang đứng sau WARNING_INDEX (index cũ không có alias: chính nó)"""
+        if self.es_client.indices.exists_alias(name=self.WARNING_INDEX):
+            return list(self.es_client.indices.get_alias(name=self.WARNING_INDEX).keys())
+        if self.es_client.indices.exists(index=self.WARNING_INDEX):
+            return [self.WARNING_INDEX]
+        return []
+    
+    def mapping_outdated(self) -> bool:
+        """True nếu index hiện tại không phải index có version hoặc build bằng mapping cũ"""
+        targets = self.warning_alias_targets()
+        if len(targets) != 1 or targets[0] == self.WARNING_INDEX:
+            return True
+        
+        mappings = self.es_client.indices.get_mapping(index=targets[0])[targets[0]]["mappings"]
+        return mappings.get("_meta", {}).get("mapping_hash") != self.mapping_hash()
+    
+    def create_warning_index_version(self, loading: bool = True) -> str:
+        """
+        Tạo warnings_v{N+1} với mapping hiện tại. loading=True: tắt refresh và replica
+        cho lúc bulk load, gọi finish_warning_index_load() khi xong.
+        """
+        versions = self.warning_index_versions()
+        index_name = f"{self.WARNING_INDEX}_v{(versions[-1] if versions else 0) + 1}"
+        
+        body = copy.deepcopy(self.WARNING_MAPPING)
+        body["mappings"]["_meta"] = {"mapping_hash": self.mapping_hash()}
+        if loading:
+            body["settings"]["refresh_interval"] = "-1"
+            body["settings"]["number_of_replicas"] = 0
+        
+        self.es_client.indices.create(index=index_name, body=body)
+        return index_name
+    
+    def finish_warning_index_load(self, index_name: str):
+        self.es_client.indices.put_settings(
+            index=index_name,
+            settings={
+                "index": {
+                    "refresh_interval": None,  # về mặc định
+                    "number_of_replicas": self.WARNING_MAPPING["settings"]["number_of_replicas"]
+                }
+            }
+        )
+        self.es_client.indices.refresh(index=index_name)
+    
+    def swap_warning_alias(self, index_name: str) -> List[str]:
+        """Chuyển alias sang index_name trong một thao tác atomic. Trả về các index cũ."""
+        old_indices = [name for name in self.warning_alias_targets() if name != index_name]
+        actions = []
+        for name in old_indices:
+            if name == self.WARNING_INDEX:
+                # Index cũ không có alias trùng tên alias: phải xóa trong cùng thao tác
+                actions.append({"remove_index": {"index": name}})
+            else:
+                actions.append({"remove": {"index": name, "alias": self.WARNING_INDEX}})
+        actions.append({"add": {"index": index_name, "alias": self.WARNING_INDEX}})
+        
+        self.es_client.indices.update_aliases(actions=actions)
+        return [name for name in old_indices if name != self.WARNING_INDEX]
+    
+    def delete_old_warning_indices(self, keep: str):
+        for version in self.warning_index_versions():
+            name = f"{self.WARNING_INDEX}_v{version}"
+            if name != keep and name not in self.warning_alias_targets():
+                self.es_client.indices.delete(index=name, ignore_unavailable=True)
+                print(f"🗑️ Deleted old index: {name}")
+    
     def index_warning(self, warning: Any):
         try:
             doc = self.warning_to_doc(warning)
@@ -129,33 +401,30 @@ class ElasticsearchService:
         except Exception as e:
             print(f"❌ Error indexing warning {warning.id}: {e}")
     
-    def bulk_index_warnings(self, warnings: List[Any]):
-        if not warnings:
-            return
+    def bulk_index_warnings(self, warnings: Iterable[Any], index_name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Bulk index song song từ iterable/generator warning (vd query.yield_per),
+        trả về report docs/s và latency từng chunk
+        """
+        from services.es_bulk import bulk_indexer
         
-        actions = []
-        for warning in warnings:
-            try:
-                doc = self.warning_to_doc(warning)
-                actions.append({
-                    "_index": self.WARNING_INDEX,
-                    "_id": doc["id"],
-                    "_source": doc
-                })
-            except Exception as e:
-                print(f"❌ Error preparing warning {warning.id}: {e}")
+        index_name = index_name or self.WARNING_INDEX
+        
+        def actions():
+            for warning in warnings:
+                try:
+                    doc = self.warning_to_doc(warning)
+                except Exception as e:
+                    print(f"❌ Error preparing warning {warning.id}: {e}")
+                    continue
+                yield {"_index": index_name, "_id": doc["id"], "_source": doc}
         
-        if actions:
-            try:
-                success, failed = bulk(self.es_client, actions)
-                print(f"✅ Bulk indexed: {success} successful, {len(failed)} failed")
-            except Exception as e:
-                print(f"❌ Bulk indexing error: {e}")
-    
-    def update_warning(self, warning: Any):
+        return bulk_indexer(self.es_client).run(actions())
+    
+    def update_warning(self, warning: Any, fields: Optional[Iterable[str]] = None):
         try:
-            doc = self.warning_to_doc(warning)
-            self.es_client.update(index=self.WARNING_INDEX, id=doc["id"], doc=doc)
+            doc = self.warning_partial_doc(warning, fields) if fields else self.warning_to_doc(warning)
+            self.es_client.update(index=self.WARNING_INDEX, id=str(warning.id), doc=doc)
         except Exception as e:
             print(f"❌ Error updating warning {warning.id}: {e}")
     
@@ -166,123 +435,222 @@ class ElasticsearchService:
             pass
     
     def search_warnings(self, query_string: str, search_type: str = None, page: int = 1, page_size: int = 20) -> Tuple[List[str], int]:
-        start_from = (page - 1) * page_size
-        
-        if search_type == "phone" or search_type == "bank_account":
-            query = {"match": {"bank_account": {"query": query_string}}}
-        elif search_type == "facebook":
-            query = {"match": {"facebook_link": {"query": query_string}}}
-        else:
-            query = {
-                "multi_match": {
-                    "query": query_string,
-                    "fields": ["scammer_name^10", "bank_account^8", "search_combined^5", "title^3", "content^1"],
-                    "type": "best_fields",
-                    "fuzziness": "AUTO",
-                    "operator": "and"
-                }
-            }
-        
-        search_body = {
-            "track_total_hits": True,
-            "query": {"bool": {"must": query, "filter": [{"term": {"status": "approved"}}]}},
-            "sort": [{"_score": {"order": "desc"}}, {"created_at": {"order": "desc"}}],
-            "from": start_from,
-            "size": page_size,
-            "_source": ["id"]
-        }
+        search_body = self._search_warnings_body(query_string, search_type, page, page_size)
         
         try:
             response = self.es_client.search(index=self.WARNING_INDEX, body=search_body)
-            total_hits = response["hits"]["total"]["value"]
+            total_hits = self._parse_total(response)[0] or 0
             warning_ids = [hit["_id"] for hit in response["hits"]["hits"]]
             return warning_ids, total_hits
         except Exception as e:
             print(f"❌ Elasticsearch search error: {e}")
             return [], 0
     
+    def delete_expired_search_log_indices(self, retention_days: int) -> List[str]:
+        """Xóa các index search log theo ngày cũ hơn retention_days"""
+        cutoff = (datetime.utcnow() - timedelta(days=retention_days)).date()
+        indices = self.es_client.indices.get(
+            index=f"{self.SEARCH_LOG_INDEX}-*", ignore_unavailable=True, allow_no_indices=True
+        )
+        
+        deleted = []
+        for name in indices:
+            match = re.fullmatch(rf"{self.SEARCH_LOG_INDEX}-(\d{{4}}\.\d{{2}}\.\d{{2}})", name)
+            if match and datetime.strptime(match.group(1), "%Y.%m.%d").date() < cutoff:
+                self.es_client.indices.delete(index=name, ignore_unavailable=True)
+                deleted.append(name)
+                print(f"🗑️ Deleted expired search log index: {name}")
+        return deleted
+    
     def log_search(self, search_data: Dict[str, Any]):
         try:
-            self.es_client.index(index=self.SEARCH_LOG_INDEX, document=search_data)
+            self.es_client.index(index=self.search_log_index(search_data.get("created_at")), document=search_data)
         except Exception as e:
             print(f"❌ Error logging search: {e}")
     
     def get_top_searches(self, days: int = 1, limit: int = 10) -> List[Dict[str, Any]]:
         try:
-            query = {
-                "size": 0,
-                "query": {"range": {"created_at": {"gte": f"now-{days}d/d", "lte": "now/d"}}},
-                "aggs": {
-                    "top_searches": {
-                        "terms": {"field": "search_query.keyword", "size": limit, "order": {"_count": "desc"}}
-                    }
-                }
-            }
-            
-            response = self.es_client.search(index=self.SEARCH_LOG_INDEX, body=query)
-            buckets = response["aggregations"]["top_searches"]["buckets"]
-            return [{"query": bucket["key"], "search_count": bucket["doc_count"]} for bucket in buckets]
+            query = self._top_searches_body(days, limit)
+            response = self.es_client.search(
+                index=self.search_log_indices(days), body=query,
+                ignore_unavailable=True, allow_no_indices=True
+            )
+            return self._parse_top_searches(response)
         except Exception as e:
             print(f"❌ Error getting top searches: {e}")
             return []
     
-    def get_top_scammers(self, days: int = 7, limit: int = 10) -> List[Dict[str, Any]]:
-        try:
-            query = {
-                "size": 0,
-                "query": {
-                    "bool": {
-                        "must": [
-                            {"term": {"status": "approved"}},
-                            {"range": {"created_at": {"gte": f"now-{days}d/d", "lte": "now/d"}}}
-                        ]
-                    }
-                },
-                "aggs": {
-                    "top_scammers": {
-                        "terms": {"field": "scammer_name.keyword", "size": limit, "order": {"_count": "desc"}},
-                        "aggs": {
-                            "bank_accounts": {"terms": {"field": "bank_account.keyword", "size": 1}}
-                        }
+    def get_top_searches_between(self, start: datetime, end: datetime, limit: int = 10) -> List[Dict[str, Any]]:
+        """Top search trong [start, end) của một ngày (chỉ đọc index của ngày đó). Lỗi được raise lên."""
+        body = {
+            "size": 0,
+            "query": {"range": {"created_at": {"gte": start.isoformat(), "lt": end.isoformat()}}},
+            "aggs": {
+                "top_searches": {
+                    "terms": {"field": "search_query.keyword", "size": limit, "order": {"_count": "desc"}}
+                }
+            }
+        }
+        response = self.es_client.search(
+            index=self.search_log_index(start), body=body,
+            ignore_unavailable=True, allow_no_indices=True
+        )
+        return self._parse_top_searches(response)
+
+    def get_search_volume_between(self, start: datetime, end: datetime) -> List[Tuple[datetime, str, int]]:
+        """Số search theo giờ và search_type trong [start, end) của một ngày. Lỗi được raise lên."""
+        body = {
+            "size": 0,
+            "query": {"range": {"created_at": {"gte": start.isoformat(), "lt": end.isoformat()}}},
+            "aggs": {
+                "per_hour": {
+                    "date_histogram": {"field": "created_at", "fixed_interval": "1h", "min_doc_count": 1},
+                    "aggs": {
+                        "types": {"terms": {"field": "search_type", "size": 50, "missing": ""}}
                     }
                 }
             }
-            
+        }
+        response = self.es_client.search(
+            index=self.search_log_index(start), body=body,
+            ignore_unavailable=True, allow_no_indices=True
+        )
+        return [
+            (datetime.utcfromtimestamp(hour["key"] / 1000), bucket["key"], bucket["doc_count"])
+            for hour in response.get("aggregations", {}).get("per_hour", {}).get("buckets", [])
+            for bucket in hour["types"]["buckets"]
+        ]
+
+    def get_top_scammers(self, days: int = 7, limit: int = 10) -> List[Dict[str, Any]]:
+        try:
+            query = self._top_scammers_body(days, limit)
             response = self.es_client.search(index=self.WARNING_INDEX, body=query)
-            buckets = response["aggregations"]["top_scammers"]["buckets"]
-            result = []
-            
-            for bucket in buckets:
-                bank_account = ""
-                if bucket["bank_accounts"]["buckets"]:
-                    bank_account = bucket["bank_accounts"]["buckets"][0]["key"]
-                result.append({
-                    "scammer_name": bucket["key"],
-                    "bank_account": bank_account,
-                    "warning_count": bucket["doc_count"]
-                })
-            return result
+            return self._parse_top_scammers(response)
         except Exception as e:
             print(f"❌ Error getting top scammers: {e}")
             return []
     
-    def reindex_all_warnings(self, warnings: List[Any]):
-        print("🔄 Starting reindex of all warnings...")
+    def health_check(self) -> bool:
+        try:
+            return self.es_client.ping()
+        except:
+            return False
+
+class AsyncElasticsearchService(BaseElasticsearchService):
+    """
+    Client AsyncElasticsearch cho các route async: không block event loop.
+    Một instance dùng chung connection pool cho cả worker.
+    Lỗi được raise lên để route tự fallback sang DB.
+    """
+    
+    def __init__(self):
+        super().__init__()
+        
+        self.es_client = AsyncElasticsearch(
+            [f"http://{self.es_host}:{self.es_port}"],
+            max_retries=3,
+            retry_on_timeout=True,
+            request_timeout=30,
+            connections_per_node=settings.ES_CONNECTIONS_PER_NODE,
+            verify_certs=False
+        )
+    
+    async def index_warning(self, warning: Any):
+        try:
+            doc = self.warning_to_doc(warning)
+            await self.es_client.index(index=self.WARNING_INDEX, id=doc["id"], document=doc)
+        except Exception as e:
+            print(f"❌ Error indexing warning {warning.id}: {e}")
+    
+    async def update_warning(self, warning: Any, fields: Optional[Iterable[str]] = None):
+        try:
+            doc = self.warning_partial_doc(warning, fields) if fields else self.warning_to_doc(warning)
+            await self.es_client.update(index=self.WARNING_INDEX, id=str(warning.id), doc=doc)
+        except Exception as e:
+            print(f"❌ Error updating warning {warning.id}: {e}")
+    
+    async def delete_warning(self, warning_id: str):
         try:
-            if self.es_client.indices.exists(index=self.WARNING_INDEX):
-                self.es_client.indices.delete(index=self.WARNING_INDEX)
+            await self.es_client.delete(index=self.WARNING_INDEX, id=str(warning_id))
         except:
             pass
+    
+    async def search_warnings(self, query_string: str, search_type: str = None, page: int = 1, page_size: int = 20) -> Tuple[List[str], int]:
+        search_body = self._search_warnings_body(query_string, search_type, page, page_size)
+        response = await self.es_client.search(index=self.WARNING_INDEX, body=search_body)
+        total_hits = self._parse_total(response)[0] or 0
+        warning_ids = [hit["_id"] for hit in response["hits"]["hits"]]
+        return warning_ids, total_hits
+    
+    async def search_warnings_after(
+        self,
+        query_string: str,
+        search_type: str = None,
+        page_size: int = 20,
+        cursor: Optional[str] = None,
+        track_total_hits: Union[bool, int] = False
+    ) -> Dict[str, Any]:
+        """
+        Phân trang bằng search_after: trang N tốn như trang 1.
+        Raise ValueError nếu cursor không hợp lệ.
+        """
+        search_after = self.decode_cursor(cursor) if cursor else None
+        search_body = self._search_warnings_body(
+            query_string, search_type, 1, page_size,
+            search_after=search_after, track_total_hits=track_total_hits
+        )
+        response = await self.es_client.search(index=self.WARNING_INDEX, body=search_body)
         
-        self._create_indices()
-        self.bulk_index_warnings(warnings)
-        print(f"✅ Reindex completed: {len(warnings)} warnings indexed")
+        hits = response["hits"]["hits"]
+        total, relation = self._parse_total(response)
+        return {
+            "ids": [hit["_id"] for hit in hits],
+            "next_cursor": self.encode_cursor(hits[-1]["sort"]) if len(hits) == page_size else None,
+            "total": total,
+            "total_relation": relation
+        }
     
-    def health_check(self) -> bool:
+    async def msearch_warnings(self, queries: List[Tuple[str, str]], page_size: int = 10) -> List[Optional[List[str]]]:
+        """Nhiều search trong một request _msearch. Phần tử None = search đó lỗi."""
+        if not queries:
+            return []
+        
+        searches = []
+        for query_string, search_type in queries:
+            body = self._search_warnings_body(query_string, search_type, 1, page_size, track_total_hits=False)
+            searches.append({"index": self.WARNING_INDEX})
+            searches.append(body)
+        
+        response = await self.es_client.msearch(searches=searches)
+        results = []
+        for item in response["responses"]:
+            if "error" in item:
+                print(f"❌ Elasticsearch msearch item error: {item['error']}")
+                results.append(None)
+            else:
+                results.append([hit["_id"] for hit in item["hits"]["hits"]])
+        return results
+    
+    async def get_top_searches(self, days: int = 1, limit: int = 10) -> List[Dict[str, Any]]:
+        response = await self.es_client.search(
+            index=self.search_log_indices(days), body=self._top_searches_body(days, limit),
+            ignore_unavailable=True, allow_no_indices=True
+        )
+        return self._parse_top_searches(response)
+    
+    async def get_top_scammers(self, days: int = 7, limit: int = 10) -> List[Dict[str, Any]]:
+        response = await self.es_client.search(index=self.WARNING_INDEX, body=self._top_scammers_body(days, limit))
+        return self._parse_top_scammers(response)
+    
+    async def health_check(self) -> bool:
         try:
-            return self.es_client.ping()
+            return await self.es_client.ping()
         except:
             return False
+    
+    async def close(self):
+        await self.es_client.close()
 
-# Global instance
-es_service = ElasticsearchService()
\ No newline at end of file
+# Global instances
+es_service = ElasticsearchService()
+async_es_service = AsyncElasticsearchService()
\ No newline at end of file
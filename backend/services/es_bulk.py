@@ -0,0 +1,152 @@
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+from elasticsearch.helpers import streaming_bulk
+
+from config import settings
+
+# Ước lượng kích thước dòng action metadata ({"index": {"_index": ..., "_id": ...}}) trong body bulk
+ACTION_OVERHEAD_BYTES = 100
+
+
+class BulkIndexer:
+    """
+    Bulk index nhiều thread cho initial load / reindex.
+
+    Đọc actions từ generator (không giữ cả dataset trong RAM), cắt chunk theo số
+    document và số byte, gửi song song bằng thread_count thread. Mỗi chunk đi qua
+    streaming_bulk nên các item bị từ chối 429 được gửi lại với exponential backoff.
+    Generator chỉ được đọc ở thread gọi run() nên có thể stream thẳng từ Session.
+
+    Kết quả không giữ thứ tự actions, không dùng cho sync cần watermark.
+    """
+
+    def __init__(
+        self,
+        client,
+        chunk_size: int = 500,
+        max_chunk_bytes: int = 10 * 1024 * 1024,
+        thread_count: int = 4,
+        max_retries: int = 5,
+        initial_backoff: float = 2.0
+    ):
+        self.client = client
+        self.chunk_size = chunk_size
+        self.max_chunk_bytes = max_chunk_bytes
+        self.thread_count = max(1, thread_count)
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+
+    def _chunks(self, actions: Iterable[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+        chunk: List[Dict[str, Any]] = []
+        chunk_bytes = 0
+        for action in actions:
+            size = ACTION_OVERHEAD_BYTES + len(json.dumps(action.get("_source") or {}, default=str))
+            if chunk and (len(chunk) >= self.chunk_size or chunk_bytes + size > self.max_chunk_bytes):
+                yield chunk
+                chunk, chunk_bytes = [], 0
+            chunk.append(action)
+            chunk_bytes += size
+        if chunk:
+            yield chunk
+
+    def _send(self, chunk: List[Dict[str, Any]]) -> Tuple[int, List[Dict[str, Any]], float]:
+        started = time.monotonic()
+        ok = 0
+        errors: List[Dict[str, Any]] = []
+        try:
+            for success, item in streaming_bulk(
+                self.client,
+                chunk,
+                # Chunk đã được cắt sẵn: một request, chỉ gửi lại phần bị 429
+                chunk_size=len(chunk),
+                max_chunk_bytes=self.max_chunk_bytes * 2,
+                max_retries=self.max_retries,
+                initial_backoff=self.initial_backoff,
+                raise_on_error=False,
+                raise_on_exception=False
+            ):
+                if success:
+                    ok += 1
+                else:
+                    errors.append(item)
+        except Exception as e:
+            errors = [{"error": str(e)}] * (len(chunk) - ok)
+        return ok, errors, time.monotonic() - started
+
+    def run(self, actions: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        started = time.monotonic()
+        indexed = 0
+        error_count = 0
+        sample_errors: List[Dict[str, Any]] = []
+        latencies: List[float] = []
+
+        def collect(result: Tuple[int, List[Dict[str, Any]], float]):
+            nonlocal indexed, error_count
+            ok, errors, latency = result
+            indexed += ok
+            error_count += len(errors)
+            sample_errors.extend(errors[:5 - len(sample_errors)])
+            latencies.append(latency)
+
+        if self.thread_count == 1:
+            for chunk in self._chunks(actions):
+                collect(self._send(chunk))
+        else:
+            with ThreadPoolExecutor(max_workers=self.thread_count) as executor:
+                pending = set()
+                for chunk in self._chunks(actions):
+                    # Giới hạn số chunk đang chờ để không đọc trước cả generator vào RAM
+                    if len(pending) >= self.thread_count * 2:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            collect(future.result())
+                    pending.add(executor.submit(self._send, chunk))
+                for future in pending:
+                    collect(future.result())
+
+        seconds = time.monotonic() - started
+        latencies.sort()
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 1)
+
+        report = {
+            "indexed": indexed,
+            "errors": error_count,
+            "sample_errors": sample_errors,
+            "chunks": len(latencies),
+            "seconds": round(seconds, 3),
+            "docs_per_second": round(indexed / seconds, 1) if seconds else 0.0,
+            "chunk_latency_ms": {
+                "avg": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0.0,
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": percentile(1.0)
+            },
+            "thread_count": self.thread_count,
+            "chunk_size": self.chunk_size,
+            "max_chunk_bytes": self.max_chunk_bytes
+        }
+        print(
+            f"✅ Bulk indexed {indexed} docs ({error_count} errors) in {report['seconds']}s: "
+            f"{report['docs_per_second']} docs/s, {report['chunks']} chunks, "
+            f"chunk p50 {report['chunk_latency_ms']['p50']}ms / p95 {report['chunk_latency_ms']['p95']}ms"
+        )
+        return report
+
+
+def bulk_indexer(client) -> BulkIndexer:
+    """BulkIndexer với cấu hình từ settings"""
+    return BulkIndexer(
+        client,
+        chunk_size=settings.ES_BULK_CHUNK_SIZE,
+        max_chunk_bytes=settings.ES_BULK_MAX_CHUNK_BYTES,
+        thread_count=settings.ES_BULK_THREADS,
+        max_retries=settings.ES_BULK_MAX_RETRIES,
+        initial_backoff=settings.ES_BULK_INITIAL_BACKOFF
+    )
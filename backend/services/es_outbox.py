@@ -0,0 +1,317 @@
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+
+from elasticsearch.helpers import streaming_bulk
+from sqlalchemy import bindparam, case, func, select, text
+
+from config import settings
+from core.database import engine, SessionLocal
+from services.elasticsearch_service import es_service
+from services.search_cache import search_cache
+
+LOCK_NAME = "checkscam_es_outbox"
+
+OP_FULL = "full"
+OP_META = "meta"
+
+# Các field thay đổi khi duyệt lại warning đã duyệt (không có text cần phân tích lại)
+META_FIELDS = ("status", "warning_count", "updated_at", "approved_at")
+
+
+class WarningOutboxDispatcher:
+    """
+    Đẩy các thay đổi trong bảng warning_outbox sang Elasticsearch.
+
+    Route ghi một dòng outbox trong cùng transaction với thay đổi của warning, nên
+    thay đổi đã commit thì chắc chắn sẽ tới ES. Dispatcher lấy từng batch theo id,
+    đọc trạng thái hiện tại của warning (đã duyệt -> index, còn lại -> delete), gửi
+    một bulk request rồi xóa các dòng thành công. Dòng op='meta' (chỉ đổi trạng thái
+    duyệt) được gửi dưới dạng partial update thay vì cả document. Dòng lỗi được thử lại với
+    exponential backoff (next_attempt_at).
+
+    MySQL lock riêng (một worker dispatch tại một thời điểm), không chờ ES sync / reindex.
+    Nếu sync ghi đè document bằng bản đọc trước thay đổi, warning đó có updated_at mới hơn
+    watermark nên được sync đẩy lại ở lượt sau; thay đổi trong lúc reindex được catch-up
+    theo watermark sau khi swap alias.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 200,
+        poll_interval: float = 1.0,
+        retry_base_seconds: float = 2.0,
+        retry_max_seconds: float = 300.0
+    ):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+
+        self._task = None
+        self._wake: asyncio.Event = None
+
+        self.batches = 0
+        self.dispatched = 0
+        self.failed_attempts = 0
+        self.full_writes = 0
+        self.partial_updates = 0
+        self.skipped_locked = 0
+        self.last_batch_seconds = 0.0
+        self.last_delivery_lag_seconds = 0.0
+        self.max_delivery_lag_seconds = 0.0
+
+        self.backlog = 0
+        self.retrying = 0
+        self._oldest_created_at = None
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.retry_base_seconds * (2 ** attempts), self.retry_max_seconds)
+        # Jitter để các dòng lỗi cùng lúc không dồn lại một thời điểm
+        return delay * random.uniform(0.5, 1.0)
+
+    # ===== DISPATCH =====
+
+    def _action(self, warning_id: int, warning: Any, op: str) -> Dict[str, Any]:
+        if warning is None or warning.status != 'approved':
+            return {
+                "_op_type": "delete",
+                "_index": es_service.WARNING_INDEX,
+                "_id": str(warning_id)
+            }
+        if op == OP_META:
+            return {
+                "_op_type": "update",
+                "_index": es_service.WARNING_INDEX,
+                "_id": str(warning_id),
+                "doc": es_service.warning_partial_doc(warning, META_FIELDS)
+            }
+        return {
+            "_op_type": "index",
+            "_index": es_service.WARNING_INDEX,
+            "_id": str(warning_id),
+            "_source": es_service.warning_to_doc(warning)
+        }
+
+    def _bulk(self, actions: List[Dict[str, Any]]) -> Tuple[Dict[int, str], List[int]]:
+        """Gửi actions, trả về (lỗi theo warning_id, các warning chưa có document để partial update)"""
+        errors: Dict[int, str] = {}
+        missing: List[int] = []
+        for ok, item in streaming_bulk(
+            es_service.es_client,
+            actions,
+            chunk_size=self.batch_size,
+            raise_on_error=False,
+            raise_on_exception=False
+        ):
+            op, result = next(iter(item.items()))
+            if ok or (op == "delete" and result.get("status") == 404):
+                continue
+            if op == "update" and result.get("status") == 404:
+                missing.append(int(result.get("_id")))
+            else:
+                errors[int(result.get("_id"))] = str(result.get("error") or result.get("status"))
+        return errors, missing
+
+    def _dispatch_batch(self) -> Tuple[int, bool]:
+        from models.models import Warning, WarningOutbox
+
+        started = time.monotonic()
+        now = datetime.utcnow()
+
+        db = SessionLocal()
+        try:
+            rows = db.query(
+                WarningOutbox.id, WarningOutbox.warning_id, WarningOutbox.op,
+                WarningOutbox.attempts, WarningOutbox.created_at
+            ).filter(
+                WarningOutbox.next_attempt_at <= now
+            ).order_by(WarningOutbox.id).limit(self.batch_size).all()
+            if not rows:
+                return 0, False
+
+            # Nhiều thay đổi của cùng một warning chỉ cần một action (trạng thái mới nhất);
+            # chỉ partial update khi mọi thay đổi đều không đụng tới text được search
+            ops: Dict[int, str] = {}
+            for row in rows:
+                if ops.get(row.warning_id) != OP_FULL:
+                    ops[row.warning_id] = OP_META if row.op == OP_META else OP_FULL
+
+            warnings = {
+                w.id: w for w in db.query(Warning).filter(Warning.id.in_(list(ops)))
+            }
+
+            actions = {
+                warning_id: self._action(warning_id, warnings.get(warning_id), op) for warning_id, op in ops.items()
+            }
+            try:
+                errors, missing = self._bulk(list(actions.values()))
+                if missing:
+                    # Document chưa có trong index (vd index mới đang build): gửi cả document
+                    for warning_id in missing:
+                        actions[warning_id] = self._action(warning_id, warnings.get(warning_id), OP_FULL)
+                    retry_errors, _ = self._bulk([actions[warning_id] for warning_id in missing])
+                    errors.update(retry_errors)
+            except Exception as e:
+                errors = {warning_id: str(e) for warning_id in ops}
+
+            # Đếm theo action cuối cùng đã ghi thành công của mỗi warning
+            for warning_id, action in actions.items():
+                if warning_id in errors:
+                    continue
+                if action["_op_type"] == "index":
+                    self.full_writes += 1
+                elif action["_op_type"] == "update":
+                    self.partial_updates += 1
+
+            done_ids = [row.id for row in rows if row.warning_id not in errors]
+            if done_ids:
+                db.execute(
+                    text("DELETE FROM warning_outbox WHERE id IN :ids").bindparams(
+                        bindparam("ids", expanding=True)
+                    ),
+                    {"ids": done_ids}
+                )
+
+            for row in rows:
+                if row.warning_id in errors:
+                    db.execute(
+                        text(
+                            "UPDATE warning_outbox SET attempts = attempts + 1, "
+                            "next_attempt_at = :next_at, last_error = :error WHERE id = :id"
+                        ),
+                        {
+                            "id": row.id,
+                            "next_at": now + timedelta(seconds=self._backoff(row.attempts)),
+                            "error": errors[row.warning_id][:500]
+                        }
+                    )
+
+            # Search cache của worker này có thể đã cache kết quả ES cũ trong lúc chờ dispatch
+            for warning in warnings.values():
+                if warning.id not in errors:
+                    search_cache.invalidate_warning(warning)
+            db.commit()
+        finally:
+            db.close()
+
+        if errors:
+            self.failed_attempts += len(rows) - len(done_ids)
+            print(f"❌ ES outbox: {len(errors)} warnings failed, retrying later ({next(iter(errors.values()))})")
+
+        self.batches += 1
+        self.dispatched += len(done_ids)
+        self.last_batch_seconds = round(time.monotonic() - started, 4)
+        delivered = [row.created_at for row in rows if row.warning_id not in errors and row.created_at]
+        if delivered:
+            lag = (datetime.utcnow() - min(delivered)).total_seconds()
+            self.last_delivery_lag_seconds = round(lag, 3)
+            self.max_delivery_lag_seconds = max(self.max_delivery_lag_seconds, self.last_delivery_lag_seconds)
+
+        return len(rows), bool(errors)
+
+    def _refresh_backlog(self):
+        from models.models import WarningOutbox
+
+        with engine.connect() as conn:
+            row = conn.execute(
+                select(
+                    func.count(WarningOutbox.id),
+                    func.min(WarningOutbox.created_at),
+                    func.sum(case((WarningOutbox.attempts > 0, 1), else_=0))
+                )
+            ).first()
+        self.backlog = row[0] or 0
+        self._oldest_created_at = row[1]
+        self.retrying = int(row[2] or 0)
+
+    def dispatch_once(self) -> int:
+        """Xử lý outbox tới khi không còn dòng đến hạn. Trả về số dòng đã xử lý."""
+        processed = 0
+        with engine.connect() as lock_conn:
+            acquired = lock_conn.execute(
+                text("SELECT GET_LOCK(:name, 0)"), {"name": LOCK_NAME}
+            ).scalar()
+            lock_conn.commit()
+            if not acquired:
+                # Worker khác đang dispatch, lượt sau làm tiếp
+                self.skipped_locked += 1
+            else:
+                try:
+                    while True:
+                        count, failed = self._dispatch_batch()
+                        processed += count
+                        # ES lỗi thì dừng, không đánh dấu retry cho toàn bộ backlog trong một lượt
+                        if failed or count < self.batch_size:
+                            break
+                finally:
+                    lock_conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": LOCK_NAME})
+                    lock_conn.commit()
+
+        self._refresh_backlog()
+        return processed
+
+    def notify(self):
+        """Đánh thức dispatcher ngay sau khi route commit một thay đổi"""
+        if self._wake is not None:
+            self._wake.set()
+
+    # ===== BACKGROUND =====
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.dispatch_once)
+            except Exception as e:
+                print(f"❌ ES outbox dispatch error: {e}")
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def start(self):
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wake = None
+
+    def stats(self) -> Dict[str, Any]:
+        oldest_age = 0.0
+        if self.backlog and self._oldest_created_at is not None:
+            oldest_age = max(0.0, (datetime.utcnow() - self._oldest_created_at).total_seconds())
+        return {
+            "backlog": self.backlog,
+            "retrying": self.retrying,
+            "lag_seconds": round(oldest_age, 3),
+            "dispatched": self.dispatched,
+            "failed_attempts": self.failed_attempts,
+            "full_writes": self.full_writes,
+            "partial_updates": self.partial_updates,
+            "batches": self.batches,
+            "skipped_locked": self.skipped_locked,
+            "last_batch_seconds": self.last_batch_seconds,
+            "last_delivery_lag_seconds": self.last_delivery_lag_seconds,
+            "max_delivery_lag_seconds": self.max_delivery_lag_seconds
+        }
+
+
+# Global instance
+es_outbox = WarningOutboxDispatcher(
+    batch_size=settings.ES_OUTBOX_BATCH_SIZE,
+    poll_interval=settings.ES_OUTBOX_POLL_SECONDS,
+    retry_base_seconds=settings.ES_OUTBOX_RETRY_BASE_SECONDS,
+    retry_max_seconds=settings.ES_OUTBOX_RETRY_MAX_SECONDS
+)
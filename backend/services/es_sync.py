@@ -0,0 +1,328 @@
+import asyncio
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from elasticsearch.helpers import streaming_bulk
+from sqlalchemy import func, text
+
+from config import settings
+from core.database import engine, SessionLocal
+from services.elasticsearch_service import es_service
+from services.es_bulk import bulk_indexer
+
+SYNC_NAME = "es_warnings"
+LOCK_NAME = "checkscam_es_sync"
+
+
+class WarningSyncEngine:
+    """
+    Đồng bộ incremental MySQL -> Elasticsearch cho bảng warnings.
+
+    Stream các warning thay đổi theo watermark (COALESCE(updated_at, created_at), id)
+    bằng yield_per, đẩy vào ES bằng streaming_bulk theo chunk. Warning đã duyệt được
+    index, các trạng thái khác bị xóa khỏi ES. Watermark lưu trong bảng sync_state sau
+    mỗi chunk thành công nên restart chỉ đẩy phần thay đổi. Counter flush (view / search
+    count) giữ nguyên updated_at nên không làm warning bị đẩy lại; counter tới ES qua
+    scripted update của counter_buffer.
+
+    Khi index hiện tại chưa có version hoặc mapping đã đổi, lượt chạy sẽ reindex sang
+    warnings_v{N+1} rồi swap alias (zero-downtime). MySQL GET_LOCK đảm bảo chỉ một
+    worker chạy sync/reindex tại một thời điểm.
+    """
+
+    def __init__(self, chunk_size: int = 500, interval: float = 300.0, overlap_seconds: float = 10.0):
+        self.chunk_size = chunk_size
+        self.interval = interval
+        # Quét lùi một khoảng để không bỏ sót transaction commit trễ hơn timestamp của nó
+        self.overlap_seconds = overlap_seconds
+
+        self._task = None
+        self.runs = 0
+        self.skipped_locked = 0
+        self.reindexes = 0
+        self.last_run: Dict[str, Any] = {}
+
+    # ===== WATERMARK =====
+
+    def _load_watermark(self) -> Tuple[Optional[datetime], int]:
+        with engine.connect() as conn:
+            row = conn.execute(
+                text("SELECT watermark_at, watermark_id FROM sync_state WHERE name = :name"),
+                {"name": SYNC_NAME}
+            ).first()
+        if not row:
+            return None, 0
+        return row.watermark_at, row.watermark_id or 0
+
+    def _save_watermark(self, watermark_at: Optional[datetime], watermark_id: int):
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    "INSERT INTO sync_state (name, watermark_at, watermark_id) VALUES (:name, :at, :id) "
+                    "ON DUPLICATE KEY UPDATE watermark_at = VALUES(watermark_at), watermark_id = VALUES(watermark_id)"
+                ),
+                {"name": SYNC_NAME, "at": watermark_at, "id": watermark_id}
+            )
+
+    def reset(self):
+        """Xóa watermark: lần sync sau sẽ đẩy lại toàn bộ bảng"""
+        self._save_watermark(None, 0)
+
+    # ===== STREAM =====
+
+    def _actions(
+        self,
+        db,
+        since: Optional[datetime],
+        positions: Optional[deque],
+        index_name: Optional[str] = None,
+        approved_only: bool = False,
+        upsert: bool = False
+    ) -> Iterator[Dict[str, Any]]:
+        from models.models import Warning
+
+        index_name = index_name or es_service.WARNING_INDEX
+        sync_ts = func.coalesce(Warning.updated_at, Warning.created_at)
+        query = db.query(Warning, sync_ts.label("sync_ts"))
+        if since is not None:
+            query = query.filter(sync_ts >= since)
+        if approved_only:
+            query = query.filter(Warning.status == 'approved')
+        query = query.order_by(sync_ts, Warning.id).yield_per(self.chunk_size)
+
+        for warning, ts in query:
+            if positions is not None:
+                positions.append((ts, warning.id))
+            if warning.status == 'approved' and upsert:
+                # Document không đổi (vd outbox đã gửi) thì ES bỏ qua (noop), không index lại text
+                yield {
+                    "_op_type": "update",
+                    "_index": index_name,
+                    "_id": str(warning.id),
+                    "doc": es_service.warning_to_doc(warning),
+                    "doc_as_upsert": True
+                }
+            elif warning.status == 'approved':
+                yield {
+                    "_op_type": "index",
+                    "_index": index_name,
+                    "_id": str(warning.id),
+                    "_source": es_service.warning_to_doc(warning)
+                }
+            else:
+                yield {
+                    "_op_type": "delete",
+                    "_index": index_name,
+                    "_id": str(warning.id)
+                }
+
+    def _sync(self) -> Dict[str, Any]:
+        started = time.monotonic()
+        watermark_at, watermark_id = self._load_watermark()
+        # Tạo index với mapping chuẩn nếu chưa có (tránh để bulk tự tạo bằng dynamic mapping)
+        es_service._create_indices()
+
+        # Index trống (mới tạo / bị xóa) thì watermark cũ không còn đúng
+        try:
+            if watermark_at is not None and es_service.es_client.count(index=es_service.WARNING_INDEX)["count"] == 0:
+                print("ℹ️ Elasticsearch index is empty, running full sync")
+                watermark_at, watermark_id = None, 0
+        except Exception:
+            pass
+
+        since = watermark_at - timedelta(seconds=self.overlap_seconds) if watermark_at else None
+
+        # Vị trí (ts, id) của các action đã sinh ra, theo đúng thứ tự kết quả streaming_bulk trả về
+        positions: deque = deque()
+        safe_at, safe_id = watermark_at, watermark_id
+        failed = False
+        indexed = deleted = errors = 0
+
+        db = SessionLocal()
+        try:
+            results = streaming_bulk(
+                es_service.es_client,
+                self._actions(db, since, positions, upsert=True),
+                chunk_size=self.chunk_size,
+                raise_on_error=False,
+                raise_on_exception=False
+            )
+            for i, (ok, item) in enumerate(results, 1):
+                ts, warning_id = positions.popleft()
+                op, result = next(iter(item.items()))
+
+                if ok:
+                    if op == "delete":
+                        deleted += 1
+                    else:
+                        indexed += 1
+                elif op == "delete" and result.get("status") == 404:
+                    # Warning chưa từng được index
+                    deleted += 1
+                else:
+                    errors += 1
+                    if not failed:
+                        print(f"❌ ES sync error for warning {warning_id}: {result.get('error')}")
+                    # Dừng đẩy watermark tại lỗi đầu tiên, lần sync sau làm lại từ đây
+                    failed = True
+
+                if not failed and ts is not None:
+                    safe_at, safe_id = ts, warning_id
+
+                if i % self.chunk_size == 0 and not failed:
+                    self._save_watermark(safe_at, safe_id)
+        finally:
+            db.close()
+
+        self._save_watermark(safe_at, safe_id)
+
+        return {
+            "indexed": indexed,
+            "deleted": deleted,
+            "errors": errors,
+            "full": since is None,
+            "watermark_at": safe_at.isoformat() if safe_at else None,
+            "watermark_id": safe_id,
+            "seconds": round(time.monotonic() - started, 3),
+            "finished_at": datetime.utcnow().isoformat()
+        }
+
+    def _reindex(self) -> Dict[str, Any]:
+        """
+        Build warnings_v{N+1} ở nền (refresh tắt, replica 0), swap alias atomic rồi xóa
+        index cũ. Search vẫn chạy trên index cũ trong suốt quá trình load.
+        """
+        started = time.monotonic()
+        with engine.connect() as conn:
+            watermark_at = conn.execute(
+                text("SELECT MAX(COALESCE(updated_at, created_at)) FROM warnings")
+            ).scalar()
+
+        index_name = es_service.create_warning_index_version(loading=True)
+        print(f"🔄 Reindexing warnings into {index_name}...")
+
+        db = SessionLocal()
+        try:
+            # Index mới chưa có ai đọc: bulk song song, không cần giữ thứ tự cho watermark
+            report = bulk_indexer(es_service.es_client).run(
+                self._actions(db, None, None, index_name=index_name, approved_only=True)
+            )
+        finally:
+            db.close()
+        indexed, errors = report["indexed"], report["errors"]
+
+        if errors:
+            # Không swap index thiếu dữ liệu, alias vẫn trỏ vào index cũ
+            es_service.es_client.indices.delete(index=index_name, ignore_unavailable=True)
+            raise RuntimeError(
+                f"Reindex into {index_name} failed: {errors} errors ({report['sample_errors'][:1]}), keeping current index"
+            )
+
+        es_service.finish_warning_index_load(index_name)
+        old_indices = es_service.swap_warning_alias(index_name)
+        print(f"✅ Alias {es_service.WARNING_INDEX} -> {index_name} ({indexed} warnings)")
+
+        # Các thay đổi ghi vào index cũ trong lúc load được đẩy lại từ watermark
+        self._save_watermark(watermark_at, 0)
+        catch_up = self._sync()
+
+        for name in old_indices:
+            es_service.es_client.indices.delete(index=name, ignore_unavailable=True)
+        es_service.delete_old_warning_indices(keep=index_name)
+
+        return {
+            "reindexed_into": index_name,
+            "docs_per_second": report["docs_per_second"],
+            "chunk_latency_ms": report["chunk_latency_ms"],
+            "indexed": indexed + catch_up["indexed"],
+            "deleted": catch_up["deleted"],
+            "errors": catch_up["errors"],
+            "full": True,
+            "watermark_at": catch_up["watermark_at"],
+            "watermark_id": catch_up["watermark_id"],
+            "seconds": round(time.monotonic() - started, 3),
+            "finished_at": datetime.utcnow().isoformat()
+        }
+
+    def _with_lock(self, reindex: bool, wait_seconds: int = 0) -> Optional[Dict[str, Any]]:
+        with engine.connect() as lock_conn:
+            acquired = lock_conn.execute(
+                text("SELECT GET_LOCK(:name, :wait)"), {"name": LOCK_NAME, "wait": wait_seconds}
+            ).scalar()
+            # Lock gắn với session MySQL, không cần giữ transaction mở
+            lock_conn.commit()
+            if not acquired:
+                self.skipped_locked += 1
+                return None
+            try:
+                # Index cũ (chưa có version) hoặc mapping đã đổi thì reindex thay vì sync
+                if reindex or es_service.mapping_outdated():
+                    stats = self._reindex()
+                    self.reindexes += 1
+                else:
+                    stats = self._sync()
+            finally:
+                lock_conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": LOCK_NAME})
+                lock_conn.commit()
+
+        self.runs += 1
+        self.last_run = stats
+        return stats
+
+    def run_once(self) -> Optional[Dict[str, Any]]:
+        """Chạy một lượt sync. Trả về None nếu worker khác đang giữ lock."""
+        return self._with_lock(reindex=False)
+
+    def reindex(self) -> Optional[Dict[str, Any]]:
+        """Zero-downtime reindex toàn bộ, chờ lượt sync đang chạy (nếu có) xong trước"""
+        return self._with_lock(reindex=True, wait_seconds=60)
+
+    # ===== BACKGROUND =====
+
+    async def _run(self):
+        while True:
+            try:
+                stats = await asyncio.to_thread(self.run_once)
+                if stats and (stats["indexed"] or stats["deleted"] or stats["errors"]):
+                    print(
+                        f"✅ ES sync: {stats['indexed']} indexed, {stats['deleted']} deleted, "
+                        f"{stats['errors']} errors in {stats['seconds']}s"
+                    )
+            except Exception as e:
+                print(f"❌ ES sync error: {e}")
+
+            if not self.interval:
+                return
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "skipped_locked": self.skipped_locked,
+            "reindexes": self.reindexes,
+            "interval": self.interval,
+            "last_run": self.last_run
+        }
+
+
+# Global instance
+es_sync = WarningSyncEngine(
+    chunk_size=settings.ES_SYNC_CHUNK_SIZE,
+    interval=settings.ES_SYNC_INTERVAL_SECONDS,
+    overlap_seconds=settings.ES_SYNC_OVERLAP_SECONDS
+)
@@ -0,0 +1,310 @@
+import fcntl
+import hashlib
+import math
+import os
+import struct
+import threading
+import time
+from typing import Any, Iterable, Optional, Tuple
+
+from config import settings
+from services.identifier_index import IdentifierIndex
+
+# File layout: header (magic, version, num_bits, num_hashes, count, built_at) + bit array
+HEADER = struct.Struct("<4sIQIId")
+MAGIC = b"CSBF"
+VERSION = 2
+
+
+def optimal_params(capacity: int, fp_rate: float, max_bytes: int) -> Tuple[int, int]:
+    """Số bit và số hàm hash tối ưu cho capacity/fp_rate, bị giới hạn bởi max_bytes"""
+    capacity = max(capacity, 1)
+    num_bits = int(math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2)))
+    num_bits = max(64, min(num_bits, max_bytes * 8))
+    num_hashes = max(1, int(round(num_bits / capacity * math.log(2))))
+    return num_bits, num_hashes
+
+
+def estimate_fp_rate(num_bits: int, num_hashes: int, count: int) -> float:
+    if not num_bits:
+        return 1.0
+    return (1 - math.exp(-num_hashes * count / num_bits)) ** num_hashes
+
+
+class IdentifierBloomFilter:
+    """
+    Bloom filter trên các identifier (số tài khoản / SĐT E.164 / Facebook) của warning đã duyệt.
+
+    might_contain() == False là chắc chắn chưa từng bị cảnh báo, search có thể trả về
+    rỗng ngay mà không cần ES/DB. Bloom filter không xóa được phần tử: warning bị xóa
+    chỉ làm tăng false positive cho tới lần rebuild kế tiếp (startup, sau rebuild_seconds).
+
+    File trên disk được chia sẻ giữa các worker: add() gộp (OR) bit array vào file dưới
+    flock, các worker khác reload khi file thay đổi (kiểm tra mỗi refresh_seconds).
+    Thêm identifier thất bại thì invalidate(): mọi worker bỏ qua filter tới khi build lại.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        capacity: int = 1_000_000,
+        fp_rate: float = 0.01,
+        max_bytes: int = 16 * 1024 * 1024,
+        refresh_seconds: float = 1.0,
+        rebuild_seconds: float = 24 * 3600
+    ):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.max_bytes = max_bytes
+        self.refresh_seconds = refresh_seconds
+        self.rebuild_seconds = rebuild_seconds
+
+        self._lock = threading.Lock()
+        self._bits: Optional[bytearray] = None
+        self._num_bits = 0
+        self._num_hashes = 0
+        self._count = 0
+        self._stat_key = None
+        self._checked_at = -refresh_seconds
+        # Worker này thêm identifier thất bại: không dùng filter tới khi build lại
+        self._disabled = False
+
+        self.checks = 0
+        self.negatives = 0
+        self.invalidations = 0
+
+    # ===== HASHING =====
+
+    @staticmethod
+    def _hash_pair(kind: str, value: str) -> Tuple[int, int]:
+        digest = hashlib.blake2b(f"{kind}:{value}".encode("utf-8"), digest_size=16).digest()
+        return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+    @staticmethod
+    def _positions(kind: str, value: str, num_bits: int, num_hashes: int) -> Iterable[int]:
+        # Double hashing (Kirsch-Mitzenmacher): h1 + i*h2
+        h1, h2 = IdentifierBloomFilter._hash_pair(kind, value)
+        return ((h1 + i * h2) % num_bits for i in range(num_hashes))
+
+    @staticmethod
+    def _set(bits: bytearray, kind: str, value: str, num_bits: int, num_hashes: int):
+        for pos in IdentifierBloomFilter._positions(kind, value, num_bits, num_hashes):
+            bits[pos >> 3] |= 1 << (pos & 7)
+
+    # ===== READ =====
+
+    def _read_file(self) -> Optional[Tuple[bytearray, int, int, int, float]]:
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+
+        if len(data) < HEADER.size:
+            return None
+        magic, version, num_bits, num_hashes, count, built_at = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION or len(data) != HEADER.size + (num_bits + 7) // 8:
+            print(f"⚠️ Identifier bloom filter {self.path} is corrupted, ignoring")
+            return None
+        return bytearray(data[HEADER.size:]), num_bits, num_hashes, count, built_at
+
+    def _open(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            # File bị xóa (invalidate ở worker khác): bỏ bản trong bộ nhớ
+            self._bits = None
+            self._stat_key = None
+            return
+
+        stat_key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if stat_key == self._stat_key:
+            return
+
+        loaded = self._read_file()
+        if loaded is None:
+            return
+        self._bits, self._num_bits, self._num_hashes, self._count, _ = loaded
+        self._stat_key = stat_key
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.refresh_seconds:
+            return
+        with self._lock:
+            self._checked_at = now
+            self._open()
+
+    @property
+    def is_ready(self) -> bool:
+        self._ensure_fresh()
+        return self._bits is not None and not self._disabled
+
+    def might_contain(self, kind: str, value: str) -> Optional[bool]:
+        """
+        False = chắc chắn không có warning nào với identifier này.
+        True = có thể có (cần tra tiếp). None = filter chưa sẵn sàng.
+        """
+        self._ensure_fresh()
+        bits, num_bits, num_hashes = self._bits, self._num_bits, self._num_hashes
+        if bits is None or self._disabled:
+            return None
+
+        self.checks += 1
+        for pos in self._positions(kind, value, num_bits, num_hashes):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                self.negatives += 1
+                return False
+        return True
+
+    # ===== WRITE =====
+
+    def _write_file(self, bits: bytearray, num_bits: int, num_hashes: int, count: int, built_at: float):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, num_bits, num_hashes, count, built_at))
+            f.write(bits)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+        with self._lock:
+            self._checked_at = time.monotonic()
+            self._open()
+
+    def _exclusive(self):
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        lock_file = open(self.lock_path, "a+")
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        return lock_file
+
+    def load_or_build(self, db, force: bool = False) -> int:
+        """
+        Startup: dùng file trên disk nếu build chưa quá rebuild_seconds và chưa quá đầy, ngược lại build lại
+        từ bảng warnings (chỉ warning đã duyệt). force: luôn build lại (sau invalidate).
+        """
+        from models.models import Warning
+
+        lock_file = self._exclusive()
+        try:
+            loaded = None if force else self._read_file()
+            if loaded is not None:
+                _, num_bits, num_hashes, count, built_at = loaded
+                # Rebuild nếu file cũ, quá đầy (fp thực tế vượt 2x mục tiêu) hoặc vượt max_bytes
+                if (
+                    time.time() - built_at < self.rebuild_seconds
+                    and estimate_fp_rate(num_bits, num_hashes, count) <= self.fp_rate * 2
+                    and num_bits <= self.max_bytes * 8
+                ):
+                    with self._lock:
+                        self._open()
+                        self._disabled = False
+                    return self._count
+
+            rows = db.query(
+                Warning.id, Warning.bank_account, Warning.facebook_link, Warning.content
+            ).filter(
+                Warning.status == 'approved'
+            ).yield_per(1000)
+
+            identifiers = set()
+            for row in rows:
+                identifiers.update(IdentifierIndex.warning_identifiers(row))
+
+            num_bits, num_hashes = optimal_params(
+                max(self.capacity, len(identifiers)), self.fp_rate, self.max_bytes
+            )
+            bits = bytearray((num_bits + 7) // 8)
+            for kind, value in identifiers:
+                self._set(bits, kind, value, num_bits, num_hashes)
+
+            self._write_file(bits, num_bits, num_hashes, len(identifiers), time.time())
+            with self._lock:
+                self._disabled = False
+            return self._count
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            lock_file.close()
+
+    def rebuild(self) -> int:
+        """Build lại từ DB (chạy nền sau invalidate)"""
+        from core.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            return self.load_or_build(db, force=True)
+        finally:
+            db.close()
+
+    def invalidate(self):
+        """
+        Thêm identifier của warning vừa duyệt thất bại: filter có thể trả False sai cho warning đó.
+        Worker này bỏ qua filter ngay; xóa file để các worker khác cũng bỏ qua (might_contain trả None).
+        """
+        with self._lock:
+            self._disabled = True
+            self._bits = None
+            self._stat_key = None
+        self.invalidations += 1
+
+        lock_file = self._exclusive()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            lock_file.close()
+
+    def apply_warning(self, warning: Any):
+        """Thêm identifier của warning vừa được duyệt (warning bị xóa/từ chối: bỏ qua)"""
+        status = warning.status.value if hasattr(warning.status, 'value') else warning.status
+        identifiers = IdentifierIndex.warning_identifiers(warning)
+        if status != 'approved' or not identifiers:
+            return
+
+        lock_file = self._exclusive()
+        try:
+            # Đọc bản mới nhất trên disk để không ghi đè bit do worker khác vừa thêm
+            loaded = self._read_file()
+            if loaded is None:
+                return
+            bits, num_bits, num_hashes, count, built_at = loaded
+
+            for kind, value in identifiers:
+                self._set(bits, kind, value, num_bits, num_hashes)
+            self._write_file(bits, num_bits, num_hashes, count + len(identifiers), built_at)
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            lock_file.close()
+
+    def stats(self) -> dict:
+        self._ensure_fresh()
+        ready = self._bits is not None and not self._disabled
+        estimated_fp_rate = estimate_fp_rate(self._num_bits, self._num_hashes, self._count) if ready else 0.0
+        return {
+            "ready": ready,
+            "items": self._count,
+            "size_bytes": len(self._bits) if ready else 0,
+            "num_hashes": self._num_hashes,
+            "target_fp_rate": self.fp_rate,
+            "estimated_fp_rate": round(estimated_fp_rate, 6),
+            "checks": self.checks,
+            "definite_negatives": self.negatives,
+            "invalidations": self.invalidations
+        }
+
+
+# Global instance
+identifier_bloom = IdentifierBloomFilter(
+    settings.IDENTIFIER_BLOOM_PATH,
+    capacity=settings.IDENTIFIER_BLOOM_CAPACITY,
+    fp_rate=settings.IDENTIFIER_BLOOM_FP_RATE,
+    max_bytes=settings.IDENTIFIER_BLOOM_MAX_BYTES,
+    refresh_seconds=settings.IDENTIFIER_INDEX_REFRESH_SECONDS,
+    rebuild_seconds=settings.IDENTIFIER_BLOOM_REBUILD_SECONDS
+)
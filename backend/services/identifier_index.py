@@ -0,0 +1,452 @@
+import asyncio
+import fcntl
+import hashlib
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from config import settings
+import utils.helpers as helpers
+
+# File layout: header (magic, version, count) + sorted records (key_hash, warning_id)
+HEADER = struct.Struct("<4sII")
+RECORD = struct.Struct("<QI")
+# Delta file (append-only): token 8 byte (đổi mỗi lần tạo lại file) + records
+# (op, key_hash, warning_id), gộp vào file chính định kỳ
+DELTA_TOKEN_SIZE = 8
+DELTA_RECORD = struct.Struct("<BQI")
+OP_REMOVE = 0  # Bỏ mọi record của warning_id (key_hash = 0)
+OP_ADD = 1
+MAGIC = b"CSIX"
+VERSION = 2
+
+KIND_ACCOUNT = "account"
+KIND_FACEBOOK = "facebook"
+KIND_PHONE = "phone"
+
+MIN_ACCOUNT_DIGITS = 6
+
+# search_type chỉ định rõ identifier: index là câu trả lời đầy đủ, không cần ES
+EXACT_SEARCH_TYPES = ("phone", "bank_account", "facebook")
+
+
+class _RecordView:
+    """Sequence view of the hash column of an mmap'ed index, used for bisect"""
+
+    def __init__(self, mm: mmap.mmap, count: int):
+        self.mm = mm
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i: int) -> int:
+        return RECORD.unpack_from(self.mm, HEADER.size + i * RECORD.size)[0]
+
+
+class _Delta:
+    """Thay đổi chưa gộp vào file chính: warning bị bỏ khỏi file chính + record thêm mới"""
+
+    def __init__(self):
+        self.removed: Set[int] = set()
+        self.added: Dict[int, Set[int]] = {}
+        self.keys_by_id: Dict[int, Set[int]] = {}
+        self.count = 0
+
+    def apply(self, op: int, key: int, warning_id: int):
+        if op == OP_REMOVE:
+            self.removed.add(warning_id)
+            for old_key in self.keys_by_id.pop(warning_id, ()):
+                self.added[old_key].discard(warning_id)
+        else:
+            self.added.setdefault(key, set()).add(warning_id)
+            self.keys_by_id.setdefault(warning_id, set()).add(key)
+        self.count += 1
+
+
+class IdentifierIndex:
+    """
+    Index identifier -> warning id dạng file sorted (mmap, bisect), dùng chung giữa các worker.
+
+    Duyệt / xóa warning chỉ append vào file delta (O(1) dưới flock); mỗi worker đọc phần
+    delta mới và giữ trong bộ nhớ. merge() định kỳ gộp delta vào file chính rồi xóa delta.
+    """
+
+    def __init__(self, path: str, refresh_seconds: float = 1.0, merge_seconds: float = 60.0):
+        self.path = path
+        self.delta_path = path + ".delta"
+        self.lock_path = path + ".lock"
+        self.refresh_seconds = refresh_seconds
+        self.merge_seconds = merge_seconds
+
+        self._lock = threading.Lock()
+        self._mm = None
+        self._count = 0
+        self._stat_key = None
+        self._checked_at = -refresh_seconds
+
+        self._delta_key = None
+        self._delta_offset = 0
+        self._delta = _Delta()
+
+        self._task = None
+        self.merges = 0
+
+    # ===== KEYS =====
+
+    @staticmethod
+    def key_hash(kind: str, value: str) -> int:
+        digest = hashlib.blake2b(f"{kind}:{value}".encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "little")
+
+    @staticmethod
+    def warning_identifiers(warning: Any) -> List[Tuple[str, str]]:
+        """Các identifier đã chuẩn hóa của một warning"""
+        identifiers = []
+
+        account = helpers.normalize_account(warning.bank_account)
+        if len(account) >= MIN_ACCOUNT_DIGITS:
+            identifiers.append((KIND_ACCOUNT, account))
+
+        facebook = helpers.normalize_facebook_link(warning.facebook_link)
+        if facebook:
+            identifiers.append((KIND_FACEBOOK, facebook))
+
+        for phone in helpers.extract_phones(warning.bank_account, warning.content):
+            identifiers.append((KIND_PHONE, phone))
+
+        return identifiers
+
+    @staticmethod
+    def is_exact_search(search_type: Optional[str]) -> bool:
+        return search_type in EXACT_SEARCH_TYPES
+
+    @classmethod
+    def query_identifiers(cls, query: str, search_type: Optional[str] = None) -> List[Tuple[str, str]]:
+        """Các identifier query có thể là. Dãy số không có search_type: thử cả SĐT lẫn số tài khoản"""
+        identifier = cls.classify_query(query, search_type)
+        if not identifier:
+            return []
+        identifiers = [identifier]
+        if not search_type and identifier[0] == KIND_ACCOUNT:
+            phone = helpers.normalize_phone(query)
+            if phone:
+                identifiers.insert(0, (KIND_PHONE, phone))
+        return identifiers
+
+    @staticmethod
+    def classify_query(query: str, search_type: Optional[str] = None) -> Optional[Tuple[str, str]]:
+        """Xác định query có phải là tìm kiếm chính xác theo identifier không"""
+        if search_type == "phone" or (not search_type and (query or "").strip().startswith("+")):
+            phone = helpers.normalize_phone(query)
+            if phone:
+                return (KIND_PHONE, phone)
+
+        if search_type in ("phone", "bank_account"):
+            account = helpers.normalize_account(query)
+            return (KIND_ACCOUNT, account) if len(account) >= MIN_ACCOUNT_DIGITS else None
+
+        if search_type == "facebook":
+            facebook = helpers.normalize_facebook_link(query)
+            return (KIND_FACEBOOK, facebook) if facebook else None
+
+        if search_type in (None, "", "name"):
+            if re.fullmatch(r"[\d\s.\-+]+", query or ""):
+                account = helpers.normalize_account(query)
+                if len(account) >= MIN_ACCOUNT_DIGITS:
+                    return (KIND_ACCOUNT, account)
+            elif search_type != "name" and re.search(r"(facebook\.com|fb\.com)/", (query or "").lower()):
+                return (KIND_FACEBOOK, helpers.normalize_facebook_link(query))
+
+        return None
+
+    # ===== READ =====
+
+    def _open(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self._mm = None
+            self._count = 0
+            self._stat_key = None
+            return
+
+        stat_key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if stat_key == self._stat_key:
+            return
+
+        # mmap cũ không close ở đây: lookup đang chạy vẫn giữ reference tới nó
+        with open(self.path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or version != VERSION or st.st_size != HEADER.size + count * RECORD.size:
+            mm.close()
+            print(f"⚠️ Identifier index {self.path} is corrupted, ignoring")
+            return
+
+        self._mm = mm
+        self._count = count
+        self._stat_key = stat_key
+
+    def _reset_delta(self):
+        self._delta_key = None
+        self._delta_offset = 0
+        self._delta = _Delta()
+
+    def _read_delta(self):
+        """Đọc phần delta mới append từ lần trước (delta bị merge / tạo lại thì đọc lại từ đầu)"""
+        try:
+            f = open(self.delta_path, "rb")
+        except FileNotFoundError:
+            self._reset_delta()
+            return
+
+        with f:
+            token = f.read(DELTA_TOKEN_SIZE)
+            if token != self._delta_key:
+                self._reset_delta()
+                self._delta_key = token
+                self._delta_offset = DELTA_TOKEN_SIZE
+            f.seek(self._delta_offset)
+            data = f.read()
+
+        usable = len(data) - len(data) % DELTA_RECORD.size
+        for op, key, warning_id in DELTA_RECORD.iter_unpack(data[:usable]):
+            self._delta.apply(op, key, warning_id)
+        self._delta_offset += usable
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.refresh_seconds:
+            return
+        with self._lock:
+            self._checked_at = now
+            self._open()
+            self._read_delta()
+
+    @property
+    def is_ready(self) -> bool:
+        self._ensure_fresh()
+        return self._mm is not None
+
+    def lookup(self, kind: str, value: str) -> Optional[List[int]]:
+        """
+        Trả về danh sách warning id (mới nhất trước) khớp với identifier.
+        None nghĩa là index chưa sẵn sàng, caller phải fallback sang ES/DB.
+        """
+        self._ensure_fresh()
+        mm, count = self._mm, self._count
+        if mm is None:
+            return None
+        if not value:
+            return []
+
+        target = self.key_hash(kind, value)
+        i = bisect_left(_RecordView(mm, count), target)
+
+        ids = set()
+        while i < count:
+            key, warning_id = RECORD.unpack_from(mm, HEADER.size + i * RECORD.size)
+            if key != target:
+                break
+            ids.add(warning_id)
+            i += 1
+
+        with self._lock:
+            ids -= self._delta.removed
+            ids |= self._delta.added.get(target, set())
+        return sorted(ids, reverse=True)
+
+    def lookup_any(self, identifiers: Iterable[Tuple[str, str]]) -> Optional[List[int]]:
+        """Gộp kết quả của nhiều identifier (mới nhất trước). None nếu index chưa sẵn sàng."""
+        ids = set()
+        for kind, value in identifiers:
+            matched = self.lookup(kind, value)
+            if matched is None:
+                return None
+            ids.update(matched)
+        return sorted(ids, reverse=True)
+
+    def _read_records(self) -> Optional[List[Tuple[int, int]]]:
+        """Đọc record của file chính; None nếu file chưa có hoặc hỏng"""
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+
+        if len(data) < HEADER.size:
+            return None
+        magic, version, count = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION or len(data) != HEADER.size + count * RECORD.size:
+            return None
+        return list(RECORD.iter_unpack(data[HEADER.size:HEADER.size + count * RECORD.size]))
+
+    # ===== WRITE =====
+
+    def _write_records(self, records: Iterable[Tuple[int, int]]):
+        records = sorted(set(records))
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(records)))
+            for record in records:
+                f.write(RECORD.pack(*record))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+        with self._lock:
+            self._checked_at = time.monotonic()
+            self._open()
+
+    def _exclusive(self):
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        lock_file = open(self.lock_path, "a+")
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        return lock_file
+
+    def build_from_db(self, db, max_age_seconds: float = 60.0) -> int:
+        """
+        Build toàn bộ index từ bảng warnings (chỉ warning đã duyệt).
+        Bỏ qua nếu một worker khác vừa build xong trong max_age_seconds.
+        """
+        from models.models import Warning
+
+        lock_file = self._exclusive()
+        try:
+            try:
+                if time.time() - os.stat(self.path).st_mtime < max_age_seconds:
+                    with self._lock:
+                        self._open()
+                    return self._count
+            except FileNotFoundError:
+                pass
+
+            rows = db.query(
+                Warning.id, Warning.bank_account, Warning.facebook_link, Warning.content
+            ).filter(
+                Warning.status == 'approved'
+            ).yield_per(1000)
+
+            records = []
+            for row in rows:
+                for kind, value in self.warning_identifiers(row):
+                    records.append((self.key_hash(kind, value), row.id))
+
+            self._write_records(records)
+            # File chính vừa build từ DB đã gồm mọi thay đổi trong delta
+            self._write_empty_delta()
+            return self._count
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            lock_file.close()
+
+    def _write_empty_delta(self):
+        tmp_path = f"{self.delta_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(os.urandom(DELTA_TOKEN_SIZE))
+        os.replace(tmp_path, self.delta_path)
+
+    def apply_warning(self, warning: Any):
+        """Cập nhật incremental khi một warning được duyệt/xóa/sửa: append vào delta"""
+        status = warning.status.value if hasattr(warning.status, 'value') else warning.status
+        data = DELTA_RECORD.pack(OP_REMOVE, 0, warning.id)
+        if status == 'approved':
+            for kind, value in self.warning_identifiers(warning):
+                data += DELTA_RECORD.pack(OP_ADD, self.key_hash(kind, value), warning.id)
+
+        os.makedirs(os.path.dirname(self.delta_path), exist_ok=True)
+        lock_file = self._exclusive()
+        try:
+            if not os.path.exists(self.delta_path):
+                self._write_empty_delta()
+            # Index có thể build lại từ DB nên không fsync từng lần append
+            with open(self.delta_path, "ab") as f:
+                f.write(data)
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            lock_file.close()
+
+        with self._lock:
+            self._checked_at = -self.refresh_seconds
+
+    def merge(self) -> int:
+        """Gộp delta vào file chính. Trả về số record delta đã gộp."""
+        lock_file = self._exclusive()
+        try:
+            try:
+                with open(self.delta_path, "rb") as f:
+                    data = f.read()[DELTA_TOKEN_SIZE:]
+            except FileNotFoundError:
+                return 0
+            delta = _Delta()
+            for op, key, warning_id in DELTA_RECORD.iter_unpack(data[:len(data) - len(data) % DELTA_RECORD.size]):
+                delta.apply(op, key, warning_id)
+            if not delta.count:
+                return 0
+
+            # Chưa có file chính hợp lệ (chưa build xong): giữ nguyên delta, không ghi file chỉ có delta
+            records = self._read_records()
+            if records is None:
+                return 0
+            records = [record for record in records if record[1] not in delta.removed]
+            records.extend((key, warning_id) for key, ids in delta.added.items() for warning_id in ids)
+
+            # Ghi file chính trước: worker đọc delta cũ trên file mới vẫn ra cùng kết quả
+            self._write_records(records)
+            self._write_empty_delta()
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            lock_file.close()
+
+        self.merges += 1
+        return delta.count
+
+    # ===== BACKGROUND =====
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.merge_seconds)
+            try:
+                await asyncio.to_thread(self.merge)
+            except Exception as e:
+                print(f"❌ Identifier index merge error: {e}")
+
+    def start(self):
+        """Chỉ gọi sau khi build_from_db thành công (merge cần file chính hợp lệ)"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        self._ensure_fresh()
+        return {
+            "ready": self._mm is not None,
+            "entries": self._count,
+            "delta_records": self._delta.count,
+            "merges": self.merges,
+            "size_bytes": HEADER.size + self._count * RECORD.size if self._mm is not None else 0
+        }
+
+
+# Global instance
+identifier_index = IdentifierIndex(
+    settings.IDENTIFIER_INDEX_PATH,
+    refresh_seconds=settings.IDENTIFIER_INDEX_REFRESH_SECONDS,
+    merge_seconds=settings.IDENTIFIER_INDEX_MERGE_SECONDS
+)
@@ -0,0 +1,180 @@
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from config import settings
+from services.identifier_index import IdentifierIndex
+import utils.helpers as helpers
+
+
+def _tokens(text: str) -> Set[str]:
+    return set(re.findall(r"\w+", helpers.fold_text(text)))
+
+
+class _Entry:
+    __slots__ = ("expires_at", "size", "value", "tags", "query_tokens")
+
+    def __init__(self, expires_at: float, size: int, value: Any, tags: Set[tuple], query_tokens: Set[str]):
+        self.expires_at = expires_at
+        self.size = size
+        self.value = value
+        self.tags = tags
+        self.query_tokens = query_tokens
+
+
+class SearchCache:
+    """
+    LRU + TTL cache cho kết quả /warnings/search/, giới hạn theo số entry và bytes.
+
+    Mỗi entry được gắn tag (warning id trong kết quả, identifier của query, token
+    của query text) để review/delete chỉ xóa đúng các entry bị ảnh hưởng.
+    Cache nằm trong từng worker, TTL giới hạn độ trễ giữa các worker.
+    """
+
+    def __init__(self, max_entries: int = 5000, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: float = 60.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        self._tags: Dict[tuple, Set[tuple]] = {}
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(query: str, search_type: Optional[str], page: int, limit: int) -> tuple:
+        identifier = IdentifierIndex.classify_query(query, search_type)
+        normalized = identifier if identifier else helpers.fold_text(query)
+        return (normalized, search_type or "", page, limit)
+
+    def get(self, key: tuple) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def set(self, key: tuple, value: List[Dict[str, Any]], query: str, search_type: Optional[str]):
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+
+        tags = {("id", item["id"]) for item in value}
+        query_tokens = set()
+        identifiers = IdentifierIndex.query_identifiers(query, search_type)
+        tags.update(("ident",) + identifier for identifier in identifiers)
+        if not identifiers or not IdentifierIndex.is_exact_search(search_type):
+            # Query không có type có thể có kết quả từ ES khớp nội dung
+            query_tokens = _tokens(query)
+            tags.update(("text", token) for token in query_tokens)
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = _Entry(time.monotonic() + self.ttl_seconds, size, value, tags, query_tokens)
+            self._bytes += size
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def _remove(self, key: tuple):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def _invalidate_tags(self, tags: Iterable[tuple]) -> int:
+        removed = 0
+        for tag in tags:
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+                removed += 1
+        return removed
+
+    def invalidate_warning(self, warning: Any) -> int:
+        """Xóa các entry có thể thay đổi khi warning này được duyệt/xóa/từ chối"""
+        tags = [("id", warning.id)]
+        tags.extend(("ident",) + identifier for identifier in IdentifierIndex.warning_identifiers(warning))
+
+        warning_tokens = _tokens(" ".join([
+            warning.scammer_name or "",
+            warning.bank_account or "",
+            warning.facebook_link or "",
+            warning.title or "",
+            warning.content or ""
+        ]))
+
+        with self._lock:
+            removed = self._invalidate_tags(tags)
+
+            # Query text chỉ bị ảnh hưởng nếu mọi token của nó xuất hiện trong warning
+            for token in warning_tokens:
+                for key in list(self._tags.get(("text", token), ())):
+                    entry = self._entries.get(key)
+                    if entry is not None and entry.query_tokens <= warning_tokens:
+                        self._remove(key)
+                        removed += 1
+
+            self.invalidations += removed
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations
+            }
+
+
+# Global instance
+search_cache = SearchCache(
+    max_entries=settings.SEARCH_CACHE_MAX_ENTRIES,
+    max_bytes=settings.SEARCH_CACHE_MAX_BYTES,
+    ttl_seconds=settings.SEARCH_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,252 @@
+import asyncio
+import random
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List
+
+from elasticsearch.helpers import bulk
+from sqlalchemy import insert
+
+from config import settings
+from core.database import engine
+from models.models import SearchLog
+from services.elasticsearch_service import es_service
+from services.topk_sketch import top_searches_sketch, search_key
+
+# Lỗi tạm thời của từng document trong bulk (quá tải / node không sẵn sàng): retry một lần
+RETRY_STATUSES = {429, 502, 503, 504}
+RETRY_DELAY_SECONDS = 1.0
+
+
+class SearchLogPipeline:
+    """
+    Hàng đợi có giới hạn cho search log, worker nền ghi theo batch (size hoặc thời gian)
+    bằng helpers.bulk vào ES và (tùy chọn) multi-row INSERT vào bảng search_logs.
+    Index ES theo ngày, index quá retention_days bị xóa (kiểm tra mỗi giờ sau khi ghi).
+    Log ES từ chối (sau một lần retry) được ghi vào MySQL nếu không bật dual-write.
+
+    Khi hàng đợi gần đầy chỉ giữ lại một phần log (sampling), khi đầy thì bỏ log.
+    """
+
+    def __init__(
+        self,
+        max_queue_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 2.0,
+        sample_watermark: float = 0.8,
+        sample_rate: float = 0.1,
+        db_dual_write: bool = True,
+        retention_days: int = 90,
+        retention_check_interval: float = 3600.0
+    ):
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sample_watermark = sample_watermark
+        self.sample_rate = sample_rate
+        self.db_dual_write = db_dual_write
+        self.retention_days = retention_days
+        self.retention_check_interval = retention_check_interval
+        self._retention_checked_at = None
+
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._collecting: List[Dict[str, Any]] = []
+        self._task = None
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.written = 0
+        self.batches = 0
+        self.es_errors = 0
+        self.es_failed_docs = 0
+        self.db_errors = 0
+        self.expired_indices_deleted = 0
+
+    def submit(self, search_log: Dict[str, Any]) -> bool:
+        """Đưa log vào hàng đợi, không bao giờ block request"""
+        # Top-k sketch đếm mọi lượt search, kể cả log bị sampling / bỏ bên dưới
+        top_searches_sketch.add(search_key(search_log.get("search_query")))
+
+        if self._queue.qsize() >= self.max_queue_size * self.sample_watermark:
+            if random.random() >= self.sample_rate:
+                self.sampled_out += 1
+                return False
+
+        try:
+            self._queue.put_nowait(search_log)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+        self.enqueued += 1
+        return True
+
+    def _bulk_es(self, docs: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Bulk index, trả về {_id: item lỗi} của các log ES từ chối"""
+        # Mỗi log vào index theo ngày của chính nó (log flush trễ qua nửa đêm vẫn đúng ngày)
+        actions = [
+            {"_index": es_service.search_log_index(doc.get("created_at")), "_id": doc_id, "_source": doc}
+            for doc_id, doc in docs.items()
+        ]
+        _, errors = bulk(es_service.es_client, actions, raise_on_error=False)
+        failed = {}
+        for error in errors:
+            item = next(iter(error.values()))
+            failed[item.get("_id")] = item
+        return failed
+
+    def _write_es(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Ghi batch vào ES, trả về các log vẫn lỗi sau khi retry lỗi tạm thời"""
+        # _id tự sinh: retry không tạo document trùng
+        docs = {uuid.uuid4().hex: doc for doc in batch}
+        failed = self._bulk_es(docs)
+
+        retry = {
+            doc_id: docs[doc_id]
+            for doc_id, item in failed.items()
+            if doc_id in docs and item.get("status") in RETRY_STATUSES
+        }
+        if retry:
+            time.sleep(RETRY_DELAY_SECONDS)
+            for doc_id in retry:
+                del failed[doc_id]
+            failed.update(self._bulk_es(retry))
+
+        if failed:
+            item = next(iter(failed.values()))
+            print(
+                f"⚠️ Search log bulk (Elasticsearch): {len(failed)}/{len(batch)} docs failed, "
+                f"first error: {item.get('status')} {item.get('error')}"
+            )
+        return [docs[doc_id] for doc_id in failed if doc_id in docs]
+
+    def _write_db(self, batch: List[Dict[str, Any]]):
+        rows = []
+        for doc in batch:
+            user_id = doc.get("user_id")
+            rows.append({
+                "search_query": (doc.get("search_query") or "")[:500],
+                "search_type": doc.get("search_type"),
+                "user_id": int(user_id) if user_id else None,
+                "ip_address": doc.get("ip_address"),
+                "result_count": doc.get("result_count", 0),
+                "created_at": datetime.fromisoformat(doc["created_at"]) if doc.get("created_at") else datetime.utcnow()
+            })
+
+        with engine.begin() as conn:
+            conn.execute(insert(SearchLog.__table__).values(rows))
+
+    def _write_batch(self, batch: List[Dict[str, Any]]):
+        try:
+            failed = self._write_es(batch)
+        except Exception as e:
+            self.es_errors += 1
+            print(f"❌ Search log bulk (Elasticsearch) error: {e}")
+            failed = batch
+        self.es_failed_docs += len(failed)
+
+        # Dual-write đã ghi cả batch vào MySQL; không dual-write thì MySQL giữ các log ES không nhận
+        db_batch = batch if self.db_dual_write else failed
+        if db_batch:
+            try:
+                self._write_db(db_batch)
+            except Exception as e:
+                self.db_errors += 1
+                print(f"❌ Search log insert (MySQL) error: {e}")
+
+        self.written += len(batch)
+        self.batches += 1
+        self._apply_retention()
+
+    def _apply_retention(self):
+        now = time.monotonic()
+        if not self.retention_days or (
+            self._retention_checked_at is not None
+            and now - self._retention_checked_at < self.retention_check_interval
+        ):
+            return
+        self._retention_checked_at = now
+        try:
+            self.expired_indices_deleted += len(es_service.delete_expired_search_log_indices(self.retention_days))
+        except Exception as e:
+            print(f"❌ Search log retention error: {e}")
+
+    async def _collect_batch(self) -> List[Dict[str, Any]]:
+        # Giữ batch đang gom trên self để stop() không làm mất log khi task bị cancel
+        batch = self._collecting
+        batch.append(await self._queue.get())
+        deadline = time.monotonic() + self.flush_interval
+
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _drain_nowait(self) -> List[Dict[str, Any]]:
+        batch = []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            self._collecting = []
+            try:
+                await asyncio.to_thread(self._write_batch, batch)
+            except Exception as e:
+                print(f"❌ Search log pipeline error: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        remaining = self._collecting + self._drain_nowait()
+        self._collecting = []
+        for start in range(0, len(remaining), self.batch_size):
+            await asyncio.to_thread(self._write_batch, remaining[start:start + self.batch_size])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_size": self._queue.qsize(),
+            "max_queue_size": self.max_queue_size,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+            "written": self.written,
+            "batches": self.batches,
+            "es_errors": self.es_errors,
+            "es_failed_docs": self.es_failed_docs,
+            "db_errors": self.db_errors,
+            "retention_days": self.retention_days,
+            "expired_indices_deleted": self.expired_indices_deleted
+        }
+
+
+# Global instance
+search_log_pipeline = SearchLogPipeline(
+    max_queue_size=settings.SEARCH_LOG_QUEUE_SIZE,
+    batch_size=settings.SEARCH_LOG_BATCH_SIZE,
+    flush_interval=settings.SEARCH_LOG_FLUSH_SECONDS,
+    sample_watermark=settings.SEARCH_LOG_SAMPLE_WATERMARK,
+    sample_rate=settings.SEARCH_LOG_SAMPLE_RATE,
+    db_dual_write=settings.SEARCH_LOG_DB_DUAL_WRITE,
+    retention_days=settings.SEARCH_LOG_RETENTION_DAYS,
+    retention_check_interval=settings.SEARCH_LOG_RETENTION_CHECK_SECONDS
+)
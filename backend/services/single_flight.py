@@ -0,0 +1,58 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Gộp các lời gọi đồng thời có cùng key: chỉ lời gọi đầu tiên (leader) thực thi,
+    các lời gọi khác chờ và nhận chung kết quả (hoặc exception).
+
+    Việc tính toán chạy trong task riêng nên leader bị cancel (client ngắt kết nối)
+    không làm hỏng kết quả của những request đang chờ.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+        self.leaders = 0
+        self.collapsed = 0
+        self.errors = 0
+        self.max_waiters = 0
+        self._waiters: Dict[Hashable, int] = {}
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.get_running_loop().create_task(func())
+            self._inflight[key] = task
+            self._waiters[key] = 1
+            task.add_done_callback(lambda t, key=key: self._done(key, t))
+        else:
+            self.collapsed += 1
+            self._waiters[key] += 1
+            self.max_waiters = max(self.max_waiters, self._waiters[key])
+
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            del self._waiters[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.leaders + self.collapsed
+        return {
+            "in_flight": len(self._inflight),
+            "leaders": self.leaders,
+            "collapsed": self.collapsed,
+            "collapse_rate": round(self.collapsed / total, 4) if total else 0.0,
+            "max_waiters": self.max_waiters,
+            "errors": self.errors
+        }
+
+
+# Global instance cho /warnings/search/
+search_single_flight = SingleFlight()
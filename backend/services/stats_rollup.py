@@ -0,0 +1,323 @@
+import asyncio
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, desc, text
+
+from config import settings
+from core.database import engine, SessionLocal
+from services.elasticsearch_service import es_service
+
+LOCK_NAME = "checkscam_stats_rollup"
+
+
+def day_start(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class StatisticsRollup:
+    """
+    Rollup thống kê theo ngày (UTC) vào bảng statistics: tổng warning / view / report
+    và top-N scammer / từ khóa search của từng ngày.
+
+    Job nền chỉ tính các ngày chưa có row, cộng thêm refresh_days ngày gần nhất (view
+    và trạng thái duyệt của warning mới vẫn còn thay đổi). Dashboard giữ cửa sổ trượt
+    days * 24h như trước: các ngày trọn vẹn đọc từ row đã rollup, phần lẻ của ngày đầu
+    và hôm nay tính trực tiếp (totals, top_scammers, top_searches là các section đọc
+    độc lập).
+
+    total_views của một ngày = tổng view_count hiện tại của các warning tạo trong ngày đó,
+    chốt ở lần rollup cuối cùng của ngày (sau refresh_days ngày thì không đổi nữa).
+    """
+
+    def __init__(
+        self,
+        interval: float = 3600.0,
+        top_n: int = 50,
+        refresh_days: int = 7,
+        backfill_days: int = 365
+    ):
+        self.interval = interval
+        # Giữ top-N lớn hơn số hiển thị để ghép nhiều ngày vẫn gần đúng
+        self.top_n = top_n
+        self.refresh_days = refresh_days
+        self.backfill_days = backfill_days
+
+        self._task = None
+        self.runs = 0
+        self.skipped_locked = 0
+        self.days_rolled = 0
+        self.last_run: Dict[str, Any] = {}
+
+    # ===== COMPUTE =====
+
+    def _top_searches(self, db, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+        from models.models import SearchLog
+
+        try:
+            return es_service.get_top_searches_between(start, end, self.top_n)
+        except Exception as e:
+            print(f"⚠️ Rollup top searches from Elasticsearch failed, using MySQL: {e}")
+
+        rows = db.query(
+            SearchLog.search_query,
+            func.count(SearchLog.id).label("search_count")
+        ).filter(
+            SearchLog.created_at >= start,
+            SearchLog.created_at < end
+        ).group_by(SearchLog.search_query).order_by(desc("search_count")).limit(self.top_n).all()
+        return [{"query": row[0], "search_count": row[1]} for row in rows]
+
+    def _day_totals(self, db, start: datetime, end: datetime) -> Dict[str, Any]:
+        from models.models import Warning, Report
+
+        total_warnings, total_views = db.query(
+            func.count(Warning.id), func.coalesce(func.sum(Warning.view_count), 0)
+        ).filter(
+            Warning.created_at >= start,
+            Warning.created_at < end
+        ).one()
+
+        total_reports = db.query(func.count(Report.id)).filter(
+            Report.created_at >= start,
+            Report.created_at < end
+        ).scalar()
+
+        return {
+            "total_warnings": total_warnings or 0,
+            "total_views": int(total_views or 0),
+            "total_reports": total_reports or 0
+        }
+
+    def _top_scammers(self, db, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+        from models.models import Warning
+
+        rows = db.query(
+            Warning.scammer_name,
+            Warning.bank_account,
+            func.count(Warning.id).label("warning_count")
+        ).filter(
+            Warning.status == 'approved',
+            Warning.created_at >= start,
+            Warning.created_at < end
+        ).group_by(
+            Warning.scammer_name,
+            Warning.bank_account
+        ).order_by(desc("warning_count")).limit(self.top_n).all()
+        return [
+            {"scammer_name": row[0], "bank_account": row[1] or "", "warning_count": row[2]}
+            for row in rows
+        ]
+
+    def compute_day(self, db, start: datetime, end: Optional[datetime] = None) -> Dict[str, Any]:
+        """Số liệu của khoảng [start, end), mặc định là cả ngày bắt đầu từ start"""
+        end = end or start + timedelta(days=1)
+        return {
+            "date": start,
+            **self._day_totals(db, start, end),
+            "top_scammers": self._top_scammers(db, start, end),
+            "top_searches": self._top_searches(db, start, end)
+        }
+
+    # ===== ROLLUP =====
+
+    def _save_day(self, db, day: Dict[str, Any]):
+        from models.models import Statistics
+
+        row = db.query(Statistics).filter(Statistics.date == day["date"]).first()
+        if row is None:
+            row = Statistics(date=day["date"])
+            db.add(row)
+        row.total_warnings = day["total_warnings"]
+        row.total_views = day["total_views"]
+        row.total_reports = day["total_reports"]
+        row.top_scammers = day["top_scammers"]
+        row.top_searches = day["top_searches"]
+        db.commit()
+
+    def _first_day(self, db, today: datetime) -> datetime:
+        from models.models import Statistics, Warning
+
+        last_rolled = db.query(func.max(Statistics.date)).scalar()
+        if last_rolled is not None:
+            first = day_start(last_rolled) + timedelta(days=1)
+        else:
+            oldest = db.query(func.min(Warning.created_at)).scalar()
+            first = day_start(oldest) if oldest else today
+            first = max(first, today - timedelta(days=self.backfill_days))
+        return min(first, today - timedelta(days=self.refresh_days))
+
+    def _rollup(self) -> Dict[str, Any]:
+        started = time.monotonic()
+        today = day_start(datetime.utcnow())
+
+        db = SessionLocal()
+        try:
+            day = self._first_day(db, today)
+            rolled = 0
+            while day < today:
+                self._save_day(db, self.compute_day(db, day))
+                rolled += 1
+                day += timedelta(days=1)
+        finally:
+            db.close()
+
+        self.days_rolled += rolled
+        return {
+            "days": rolled,
+            "seconds": round(time.monotonic() - started, 3),
+            "finished_at": datetime.utcnow().isoformat()
+        }
+
+    def run_once(self) -> Optional[Dict[str, Any]]:
+        """Rollup các ngày đã kết thúc. Trả về None nếu worker khác đang chạy."""
+        with engine.connect() as lock_conn:
+            acquired = lock_conn.execute(
+                text("SELECT GET_LOCK(:name, 0)"), {"name": LOCK_NAME}
+            ).scalar()
+            lock_conn.commit()
+            if not acquired:
+                self.skipped_locked += 1
+                return None
+            try:
+                stats = self._rollup()
+            finally:
+                lock_conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": LOCK_NAME})
+                lock_conn.commit()
+
+        self.runs += 1
+        self.last_run = stats
+        return stats
+
+    # ===== READ =====
+
+    def _days(
+        self,
+        db,
+        since: datetime,
+        today: datetime,
+        columns: Tuple[str, ...],
+        compute: Callable[[Any, datetime, datetime], Any]
+    ) -> List[Dict[str, Any]]:
+        """
+        Các cột của row đã rollup trong [since, today); ngày chưa có row được tính trực
+        tiếp bằng compute (trả về dict các cột, hoặc giá trị của cột duy nhất)
+        """
+        from models.models import Statistics
+
+        rows = {
+            row[0]: row
+            for row in db.query(
+                Statistics.date, *(getattr(Statistics, column) for column in columns)
+            ).filter(Statistics.date >= since, Statistics.date < today)
+        }
+        days = []
+        day = since
+        while day < today:
+            row = rows.get(day)
+            if row is not None:
+                days.append(dict(zip(columns, row[1:])))
+            else:
+                value = compute(db, day, day + timedelta(days=1))
+                days.append(value if len(columns) > 1 else {columns[0]: value})
+            day += timedelta(days=1)
+        return days
+
+    @staticmethod
+    def _merge_top(days: List[Dict[str, Any]], field: str, keys: tuple, count_key: str, limit: int) -> List[Dict[str, Any]]:
+        counts: Dict[tuple, int] = defaultdict(int)
+        for day in days:
+            for item in day[field] or []:
+                counts[tuple(item.get(k) for k in keys)] += item[count_key]
+        ranked = sorted(counts.items(), key=lambda item: -item[1])[:limit]
+        return [dict(zip(keys, key), **{count_key: count}) for key, count in ranked]
+
+    def _window_parts(
+        self,
+        db,
+        days: int,
+        columns: Tuple[str, ...],
+        compute: Callable[[Any, datetime, datetime], Any]
+    ) -> List[Dict[str, Any]]:
+        """
+        Cửa sổ [now - days, now): phần lẻ của ngày đầu, các ngày trọn vẹn (row đã rollup)
+        rồi hôm nay (phần tử cuối). Phần lẻ và hôm nay tính trực tiếp trên range của chúng.
+        """
+        now = datetime.utcnow()
+        since = now - timedelta(days=max(days, 1))
+        first_full = day_start(since)
+        if first_full < since:
+            first_full += timedelta(days=1)
+        today = day_start(now)
+
+        def live(start: datetime, end: datetime) -> Dict[str, Any]:
+            value = compute(db, start, end)
+            return value if len(columns) > 1 else {columns[0]: value}
+
+        parts = [live(since, first_full)] if since < first_full else []
+        parts += self._days(db, first_full, today, columns, compute)
+        parts.append(live(today, now))
+        return parts
+
+    # Mỗi section đọc độc lập (dashboard chạy song song và cache riêng từng phần).
+
+    def totals(self, db, days: int) -> Dict[str, Any]:
+        columns = ("total_warnings", "total_views", "total_reports")
+        all_days = self._window_parts(db, days, columns, self._day_totals)
+        result = {column: sum(day[column] or 0 for day in all_days) for column in columns}
+        result["today"] = all_days[-1]
+        return result
+
+    def top_scammers(self, db, days: int, limit: int = 10) -> List[Dict[str, Any]]:
+        """Top-N ghép từ top-N từng ngày nên là xấp xỉ với các mục ở cuối danh sách"""
+        all_days = self._window_parts(db, days, ("top_scammers",), self._top_scammers)
+        return self._merge_top(all_days, "top_scammers", ("scammer_name", "bank_account"), "warning_count", limit)
+
+    def top_searches(self, db, days: int, limit: int = 10) -> List[Dict[str, Any]]:
+        all_days = self._window_parts(db, days, ("top_searches",), self._top_searches)
+        return self._merge_top(all_days, "top_searches", ("query",), "search_count", limit)
+
+    # ===== BACKGROUND =====
+
+    async def _run(self):
+        while True:
+            try:
+                stats = await asyncio.to_thread(self.run_once)
+                if stats and stats["days"]:
+                    print(f"✅ Statistics rollup: {stats['days']} days in {stats['seconds']}s")
+            except Exception as e:
+                print(f"❌ Statistics rollup error: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "skipped_locked": self.skipped_locked,
+            "days_rolled": self.days_rolled,
+            "interval": self.interval,
+            "last_run": self.last_run
+        }
+
+
+# Global instance
+statistics_rollup = StatisticsRollup(
+    interval=settings.STATS_ROLLUP_INTERVAL_SECONDS,
+    top_n=settings.STATS_ROLLUP_TOP_N,
+    refresh_days=settings.STATS_ROLLUP_REFRESH_DAYS,
+    backfill_days=settings.STATS_ROLLUP_BACKFILL_DAYS
+)
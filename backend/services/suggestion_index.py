@@ -0,0 +1,204 @@
+import asyncio
+import threading
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+
+from config import settings
+import utils.helpers as helpers
+
+KIND_NAME = "name"
+KIND_ACCOUNT = "account"
+KIND_TITLE = "title"
+
+# Số entry tối đa quét cho mỗi prefix trước khi xếp hạng (giữ type-ahead dưới 1ms)
+MAX_SCAN = 256
+
+
+class SuggestionIndex:
+    """
+    Mảng đã sắp xếp (key đã bỏ dấu, warning_id, kind, text hiển thị, weight) cho type-ahead.
+
+    Tên scammer được index theo từng vị trí bắt đầu từ ("nguyen van a", "van a", "a"),
+    số tài khoản theo chữ số, tiêu đề theo toàn bộ chuỗi. Prefix lookup là một bisect
+    + quét tuần tự. Các worker tự đồng bộ bằng refresh incremental theo watermark
+    COALESCE(updated_at, created_at) (index idx_sync_watermark, giống ES sync), đọc lại
+    overlap_seconds trước watermark để không bỏ sót transaction commit muộn.
+    """
+
+    def __init__(self, refresh_interval: float = 300.0, overlap_seconds: float = 10.0):
+        self.refresh_interval = refresh_interval
+        self.overlap_seconds = overlap_seconds
+
+        self._lock = threading.Lock()
+        self._entries: List[Tuple[str, int, str, str, int]] = []
+        self._by_warning: Dict[int, List[Tuple[str, int, str, str, int]]] = {}
+        self._watermark: Optional[datetime] = None
+        self._ready = False
+        self._task = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready
+
+    @staticmethod
+    def _warning_entries(warning: Any) -> List[Tuple[str, int, str, str, int]]:
+        weight = warning.warning_count or 1
+        entries = []
+
+        if warning.scammer_name:
+            words = helpers.fold_text(warning.scammer_name).split()
+            for i in range(len(words)):
+                entries.append((" ".join(words[i:]), warning.id, KIND_NAME, warning.scammer_name.strip(), weight))
+
+        account = helpers.normalize_account(warning.bank_account)
+        if account:
+            entries.append((account, warning.id, KIND_ACCOUNT, warning.bank_account.strip(), weight))
+
+        title = helpers.fold_text(warning.title)
+        if title:
+            entries.append((title, warning.id, KIND_TITLE, warning.title.strip(), weight))
+
+        return entries
+
+    def _remove_locked(self, warning_id: int):
+        for entry in self._by_warning.pop(warning_id, []):
+            i = bisect_left(self._entries, entry)
+            if i < len(self._entries) and self._entries[i] == entry:
+                del self._entries[i]
+
+    def apply_warning(self, warning: Any):
+        """Thêm/cập nhật warning đã duyệt, gỡ warning bị xóa/từ chối"""
+        status = warning.status.value if hasattr(warning.status, 'value') else warning.status
+        entries = self._warning_entries(warning) if status == 'approved' else []
+
+        with self._lock:
+            self._remove_locked(warning.id)
+            for entry in entries:
+                insort(self._entries, entry)
+            if entries:
+                self._by_warning[warning.id] = entries
+
+    def suggest(self, query: str, limit: int = 10) -> List[str]:
+        prefix = helpers.fold_text(query)
+        digits = helpers.normalize_account(query)
+        prefixes = [prefix]
+        if digits and digits != prefix:
+            prefixes.append(digits)
+
+        candidates: Dict[str, int] = {}
+        with self._lock:
+            for p in prefixes:
+                if not p:
+                    continue
+                i = bisect_left(self._entries, (p,))
+                end = min(len(self._entries), i + MAX_SCAN)
+                while i < end:
+                    key, _, kind, text, weight = self._entries[i]
+                    if not key.startswith(p):
+                        break
+                    # Ưu tiên match từ đầu chuỗi và tên/số tài khoản hơn tiêu đề
+                    score = weight * (2 if kind != KIND_TITLE else 1)
+                    candidates[text] = candidates.get(text, 0) + score
+                    i += 1
+
+        ranked = sorted(candidates.items(), key=lambda item: (-item[1], len(item[0])))
+        return [text for text, _ in ranked[:limit]]
+
+    def _load(self, db, since: Optional[datetime] = None) -> int:
+        from models.models import Warning
+
+        sync_ts = func.coalesce(Warning.updated_at, Warning.created_at)
+        query = db.query(
+            Warning.id, Warning.scammer_name, Warning.bank_account, Warning.title,
+            Warning.status, Warning.warning_count, sync_ts.label("sync_ts")
+        )
+        if since is None:
+            query = query.filter(Warning.status == 'approved')
+        else:
+            # Đọc lại warning vừa áp dụng trong overlap là idempotent (apply_warning thay entry)
+            query = query.filter(sync_ts >= since - timedelta(seconds=self.overlap_seconds))
+
+        count = 0
+        watermark = since
+        entries: List[Tuple[str, int, str, str, int]] = []
+        by_warning: Dict[int, List[Tuple[str, int, str, str, int]]] = {}
+        for row in query.yield_per(1000):
+            if since is None:
+                # Full build: gom hết rồi sort một lần thay vì insort từng entry
+                row_entries = self._warning_entries(row)
+                if row_entries:
+                    entries.extend(row_entries)
+                    by_warning[row.id] = row_entries
+            else:
+                self.apply_warning(row)
+            count += 1
+            if row.sync_ts and (watermark is None or row.sync_ts > watermark):
+                watermark = row.sync_ts
+
+        if since is None:
+            entries.sort()
+            with self._lock:
+                self._entries = entries
+                self._by_warning = by_warning
+
+        self._watermark = watermark or datetime.utcnow()
+        return count
+
+    def build_from_db(self, db) -> int:
+        count = self._load(db)
+        self._ready = True
+        return count
+
+    def refresh_from_db(self, db) -> int:
+        """Áp dụng các warning thay đổi từ lần refresh trước (do worker khác duyệt/xóa)"""
+        if not self._ready:
+            return self.build_from_db(db)
+        return self._load(db, since=self._watermark)
+
+    def _refresh(self):
+        from core.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            self.refresh_from_db(db)
+        finally:
+            db.close()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await asyncio.to_thread(self._refresh)
+            except Exception as e:
+                print(f"❌ Suggestion index refresh error: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self._ready,
+            "entries": len(self._entries),
+            "warnings": len(self._by_warning),
+            "watermark": self._watermark.isoformat() if self._watermark else None
+        }
+
+
+# Global instance
+suggestion_index = SuggestionIndex(
+    refresh_interval=settings.SUGGEST_REFRESH_SECONDS,
+    overlap_seconds=settings.SUGGEST_REFRESH_OVERLAP_SECONDS
+)
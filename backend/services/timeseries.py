@@ -0,0 +1,344 @@
+import asyncio
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func, insert, text
+
+from config import settings
+from core.database import engine, SessionLocal
+from services.elasticsearch_service import es_service
+from services.stats_rollup import day_start
+
+LOCK_NAME = "checkscam_timeseries"
+SYNC_NAME = "timeseries_buckets"
+
+METRICS = ("warnings", "reports", "searches")
+BUCKET_SIZES = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+HOUR_FORMAT = "%Y-%m-%d %H:00:00"
+# Search log tới ES / MySQL qua pipeline có buffer: tính lại cả giờ trước nếu vừa qua giờ
+LATE_SECONDS = 300
+
+
+def hour_start(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _parse_hour(value: Any) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    return datetime.strptime(str(value), "%Y-%m-%d %H:%M:%S")
+
+
+class TimeSeriesRollup:
+    """
+    Duy trì bảng timeseries_buckets: số warning mới theo (category, status), report theo
+    (report_type, status) và số search theo search_type, mỗi giờ và mỗi ngày (UTC).
+
+    Mỗi lượt chỉ tính lại các giờ từ lượt trước tới giờ hiện tại, cộng thêm các giờ (theo
+    created_at) có warning bị sửa / duyệt hoặc report được duyệt từ lượt trước. Row ngày
+    được cộng lại từ row giờ của ngày đó. API đọc thẳng bảng này (range trên primary key),
+    không quét bảng gốc.
+
+    Search lấy từ date histogram trên index search_logs theo ngày, lỗi thì dùng bảng
+    search_logs (nếu còn dual write). Warning bị xóa chỉ mất khỏi bucket khi giờ đó được
+    tính lại.
+    """
+
+    def __init__(self, interval: float = 60.0, backfill_days: int = 365):
+        self.interval = interval
+        self.backfill_days = backfill_days
+
+        self._task = None
+        self.runs = 0
+        self.skipped_locked = 0
+        self.hours_computed = 0
+        self.search_fallbacks = 0
+        self.last_run: Dict[str, Any] = {}
+
+    # ===== COMPUTE =====
+
+    def _count_searches_es(self, start: datetime, end: datetime) -> Optional[List[Tuple[datetime, str, str, int]]]:
+        try:
+            return [
+                (hour, search_type, "", count)
+                for hour, search_type, count in es_service.get_search_volume_between(start, end)
+            ]
+        except Exception as e:
+            if not settings.SEARCH_LOG_DB_DUAL_WRITE:
+                # Không có nguồn khác: giữ bucket cũ, lượt sau tính lại
+                raise
+            self.search_fallbacks += 1
+            print(f"⚠️ Time-series search volume from Elasticsearch failed, using MySQL: {e}")
+            return None
+
+    def _count_hours(self, db, metric: str, start: datetime, end: datetime) -> List[Tuple[datetime, str, str, int]]:
+        """[(giờ, dimension, status, count)] của các row tạo trong [start, end)"""
+        from models.models import Warning, Report, SearchLog
+
+        if metric == "searches":
+            rows = self._count_searches_es(start, end)
+            if rows is not None:
+                return rows
+            model, dimension, status = SearchLog, SearchLog.search_type, None
+        elif metric == "warnings":
+            model, dimension, status = Warning, Warning.category, Warning.status
+        else:
+            model, dimension, status = Report, Report.report_type, Report.status
+
+        columns = [func.date_format(model.created_at, HOUR_FORMAT), func.coalesce(dimension, "")]
+        if status is not None:
+            columns.append(func.coalesce(status, ""))
+        rows = db.query(*columns, func.count(model.id)).filter(
+            model.created_at >= start,
+            model.created_at < end
+        ).group_by(*columns).all()
+
+        if status is None:
+            return [(_parse_hour(row[0]), row[1], "", row[2]) for row in rows]
+        return [(_parse_hour(row[0]), row[1], row[2], row[3]) for row in rows]
+
+    def _changed_hours(self, db, metric: str, since: datetime) -> Set[datetime]:
+        """
+        Giờ (theo created_at) của các warning sửa / duyệt, report duyệt từ since.
+        Counter flush không đổi updated_at nên lượt xem / tìm kiếm không làm tính lại giờ cũ.
+        """
+        from models.models import Warning, Report
+
+        if metric == "warnings":
+            model, changed = Warning, func.coalesce(Warning.updated_at, Warning.created_at) >= since
+        elif metric == "reports":
+            model, changed = Report, Report.reviewed_at >= since
+        else:
+            return set()
+
+        rows = db.query(func.date_format(model.created_at, HOUR_FORMAT)).filter(
+            changed, model.created_at.isnot(None)
+        ).distinct().all()
+        return {_parse_hour(row[0]) for row in rows}
+
+    def _replace(self, db, metric: str, bucket_size: str, start: datetime, end: datetime, rows: List[Tuple[datetime, str, str, int]]):
+        from models.models import TimeSeriesBucket
+
+        db.query(TimeSeriesBucket).filter(
+            TimeSeriesBucket.metric == metric,
+            TimeSeriesBucket.bucket_size == bucket_size,
+            TimeSeriesBucket.bucket_start >= start,
+            TimeSeriesBucket.bucket_start < end
+        ).delete(synchronize_session=False)
+        if rows:
+            db.execute(insert(TimeSeriesBucket), [
+                {
+                    "metric": metric,
+                    "bucket_size": bucket_size,
+                    "bucket_start": bucket_start,
+                    "dimension": (dimension or "")[:100],
+                    "status": (status or "")[:20],
+                    "count": count
+                }
+                for bucket_start, dimension, status, count in rows
+            ])
+
+    def _recompute_day(self, db, metric: str, day: datetime, hours: List[datetime]):
+        """Tính lại các giờ (trong cùng một ngày) rồi cộng lại row của ngày"""
+        from models.models import TimeSeriesBucket
+
+        start, end = min(hours), max(hours) + BUCKET_SIZES["hour"]
+        self._replace(db, metric, "hour", start, end, self._count_hours(db, metric, start, end))
+
+        day_rows = db.query(
+            TimeSeriesBucket.dimension,
+            TimeSeriesBucket.status,
+            func.sum(TimeSeriesBucket.count)
+        ).filter(
+            TimeSeriesBucket.metric == metric,
+            TimeSeriesBucket.bucket_size == "hour",
+            TimeSeriesBucket.bucket_start >= day,
+            TimeSeriesBucket.bucket_start < day + BUCKET_SIZES["day"]
+        ).group_by(TimeSeriesBucket.dimension, TimeSeriesBucket.status).all()
+        self._replace(
+            db, metric, "day", day, day + BUCKET_SIZES["day"],
+            [(day, dimension, status, int(count or 0)) for dimension, status, count in day_rows]
+        )
+        db.commit()
+
+    def _load_watermark(self, db) -> Optional[datetime]:
+        from models.models import SyncState
+
+        state = db.get(SyncState, SYNC_NAME)
+        return state.watermark_at if state else None
+
+    def _save_watermark(self, db, watermark_at: datetime):
+        from models.models import SyncState
+
+        state = db.get(SyncState, SYNC_NAME)
+        if state is None:
+            state = SyncState(name=SYNC_NAME)
+            db.add(state)
+        state.watermark_at = watermark_at
+        db.commit()
+
+    def _rollup(self) -> Dict[str, Any]:
+        started = time.monotonic()
+        now = datetime.utcnow()
+
+        db = SessionLocal()
+        try:
+            last_run = self._load_watermark(db)
+            if last_run is None:
+                first = day_start(now - timedelta(days=self.backfill_days))
+            else:
+                first = hour_start(min(last_run, now) - timedelta(seconds=LATE_SECONDS))
+
+            window = set()
+            hour = first
+            while hour <= now:
+                window.add(hour)
+                hour += BUCKET_SIZES["hour"]
+
+            computed = 0
+            for metric in METRICS:
+                hours = set(window)
+                if last_run is not None:
+                    hours |= self._changed_hours(db, metric, last_run - timedelta(seconds=LATE_SECONDS))
+
+                by_day: Dict[datetime, List[datetime]] = defaultdict(list)
+                for hour in hours:
+                    by_day[day_start(hour)].append(hour)
+                for day in sorted(by_day):
+                    self._recompute_day(db, metric, day, by_day[day])
+                computed += len(hours)
+
+            # Watermark = lúc bắt đầu lượt này: thay đổi trong lúc chạy được lượt sau bắt lại
+            self._save_watermark(db, now)
+        finally:
+            db.close()
+
+        self.hours_computed += computed
+        return {
+            "hours": computed,
+            "seconds": round(time.monotonic() - started, 3),
+            "finished_at": datetime.utcnow().isoformat()
+        }
+
+    def run_once(self) -> Optional[Dict[str, Any]]:
+        """Cập nhật bucket. Trả về None nếu worker khác đang chạy."""
+        with engine.connect() as lock_conn:
+            acquired = lock_conn.execute(
+                text("SELECT GET_LOCK(:name, 0)"), {"name": LOCK_NAME}
+            ).scalar()
+            lock_conn.commit()
+            if not acquired:
+                self.skipped_locked += 1
+                return None
+            try:
+                stats = self._rollup()
+            finally:
+                lock_conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": LOCK_NAME})
+                lock_conn.commit()
+
+        self.runs += 1
+        self.last_run = stats
+        return stats
+
+    # ===== READ =====
+
+    def query(self, db, metric: str, bucket_size: str, days: int, group_by: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Chuỗi bucket liên tục (bucket trống = 0) phủ days ngày gần nhất, bucket cuối là giờ / ngày hiện tại.
+        group_by: None (chỉ tổng), 'dimension' (category / report_type / search_type) hoặc 'status'.
+        """
+        from models.models import TimeSeriesBucket
+
+        step = BUCKET_SIZES[bucket_size]
+        now = datetime.utcnow()
+        last = hour_start(now) if bucket_size == "hour" else day_start(now)
+        first = last - timedelta(days=days) + step
+
+        buckets = []
+        bucket = first
+        while bucket <= last:
+            buckets.append(bucket)
+            bucket += step
+        positions = {bucket: i for i, bucket in enumerate(buckets)}
+
+        rows = db.query(
+            TimeSeriesBucket.bucket_start,
+            TimeSeriesBucket.dimension,
+            TimeSeriesBucket.status,
+            TimeSeriesBucket.count
+        ).filter(
+            TimeSeriesBucket.metric == metric,
+            TimeSeriesBucket.bucket_size == bucket_size,
+            TimeSeriesBucket.bucket_start >= first,
+            TimeSeriesBucket.bucket_start <= last
+        ).all()
+
+        totals = [0] * len(buckets)
+        series: Dict[str, List[int]] = {}
+        for bucket_start, dimension, status, count in rows:
+            i = positions.get(bucket_start)
+            if i is None:
+                continue
+            totals[i] += count
+            if group_by:
+                key = dimension if group_by == "dimension" else status
+                series.setdefault(key, [0] * len(buckets))[i] += count
+
+        return {
+            "metric": metric,
+            "interval": bucket_size,
+            "group_by": group_by,
+            "start": first.isoformat(),
+            "end": (last + step).isoformat(),
+            "buckets": [bucket.isoformat() for bucket in buckets],
+            "totals": totals,
+            "series": sorted(
+                ({"key": key, "counts": counts, "total": sum(counts)} for key, counts in series.items()),
+                key=lambda item: -item["total"]
+            )
+        }
+
+    # ===== BACKGROUND =====
+
+    async def _run(self):
+        while True:
+            try:
+                stats = await asyncio.to_thread(self.run_once)
+                if stats and stats["hours"] > 24 * len(METRICS):
+                    print(f"✅ Time-series buckets: {stats['hours']} hours in {stats['seconds']}s")
+            except Exception as e:
+                print(f"❌ Time-series rollup error: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "skipped_locked": self.skipped_locked,
+            "hours_computed": self.hours_computed,
+            "search_fallbacks": self.search_fallbacks,
+            "interval": self.interval,
+            "last_run": self.last_run
+        }
+
+
+# Global instance
+timeseries_rollup = TimeSeriesRollup(
+    interval=settings.TIMESERIES_INTERVAL_SECONDS,
+    backfill_days=settings.TIMESERIES_BACKFILL_DAYS
+)
@@ -0,0 +1,521 @@
+import asyncio
+import fcntl
+import heapq
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from config import settings
+
+# (độ dài bucket, số bucket giữ lại): bucket 5 phút cho cửa sổ 1h, bucket 1 giờ cho 1d / 7d
+RESOLUTIONS = ((300, 12), (3600, 168))
+MAX_WINDOW_SECONDS = 7 * 24 * 3600
+
+WINDOWS = {"1h": 3600, "1d": 24 * 3600, "7d": 7 * 24 * 3600}
+
+CHECKPOINT_VERSION = 1
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy hitters với capacity counter: count của mỗi key bị ước lượng
+    thừa tối đa error (<= total / capacity). Min-heap lazy để tìm counter nhỏ nhất.
+    """
+
+    __slots__ = ("capacity", "counts", "errors", "total", "_heap")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.total = 0
+        self._heap: List[Tuple[int, str]] = []
+
+    def _min_entry(self) -> Tuple[int, str]:
+        # Bỏ các entry cũ trong heap (count đã tăng / key đã bị thay)
+        while self._heap:
+            count, key = self._heap[0]
+            if self.counts.get(key) == count:
+                return count, key
+            heapq.heappop(self._heap)
+        raise KeyError("empty")
+
+    def min_count(self) -> int:
+        """Count tối đa của một key không có trong summary"""
+        if len(self.counts) < self.capacity:
+            return 0
+        return self._min_entry()[0]
+
+    def add(self, key: str, n: int = 1):
+        self.total += n
+        if key in self.counts:
+            self.counts[key] += n
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = n
+            self.errors[key] = 0
+        else:
+            floor, victim = self._min_entry()
+            heapq.heappop(self._heap)
+            del self.counts[victim]
+            del self.errors[victim]
+            self.counts[key] = floor + n
+            self.errors[key] = floor
+
+        heapq.heappush(self._heap, (self.counts[key], key))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, k) for k, count in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    @classmethod
+    def merge(cls, summaries: Iterable["SpaceSaving"], capacity: int) -> "SpaceSaving":
+        """
+        Gộp nhiều summary: key không có trong một summary được tính bằng min_count của
+        summary đó (cận trên), phần này cộng vào error. Giữ lại capacity key lớn nhất.
+        """
+        summaries = [s for s in summaries if s.counts]
+        result = cls(capacity)
+        if not summaries:
+            return result
+
+        floors = [s.min_count() for s in summaries]
+        floor_total = sum(floors)
+        counts: Dict[str, int] = {}
+        errors: Dict[str, int] = {}
+        for summary, floor in zip(summaries, floors):
+            result.total += summary.total
+            for key, count in summary.counts.items():
+                counts[key] = counts.get(key, 0) + count - floor
+                errors[key] = errors.get(key, 0) + summary.errors[key] - floor
+
+        for key, count in heapq.nlargest(capacity, counts.items(), key=lambda item: item[1]):
+            result.counts[key] = count + floor_total
+            result.errors[key] = errors[key] + floor_total
+        result._heap = [(count, k) for k, count in result.counts.items()]
+        heapq.heapify(result._heap)
+        return result
+
+    def top(self, limit: int) -> List[Tuple[str, int, int]]:
+        """[(key, count, error)] theo count giảm dần; count thật nằm trong [count - error, count]"""
+        ranked = heapq.nlargest(limit, self.counts.items(), key=lambda item: item[1])
+        return [(key, count, self.errors[key]) for key, count in ranked]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "items": [[key, count, self.errors[key]] for key, count in self.counts.items()]
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], capacity: int) -> "SpaceSaving":
+        summary = cls(capacity)
+        summary.total = data.get("total", 0)
+        for key, count, error in data.get("items", []):
+            summary.counts[key] = count
+            summary.errors[key] = error
+        summary._heap = [(count, k) for k, count in summary.counts.items()]
+        heapq.heapify(summary._heap)
+        return summary
+
+
+Buckets = Dict[int, Dict[int, SpaceSaving]]
+
+
+class SlidingTopK:
+    """
+    Top-k theo cửa sổ trượt (1h / 1d / 7d) từ các Space-Saving summary theo bucket thời gian.
+
+    add() ghi vào delta trong bộ nhớ của worker. Checkpoint định kỳ gộp delta vào file
+    trên disk dưới flock (các worker cùng gộp vào một file) rồi lấy file đã gộp làm base,
+    nên top() phản ánh traffic của mọi worker với độ trễ tối đa checkpoint_interval.
+    Cửa sổ tính theo bucket nên biên đầu có thể thừa tối đa một bucket.
+
+    since (đầu khoảng dữ liệu liên tục) chỉ lấy từ checkpoint còn mới (saved_at trong
+    max_gap_seconds): checkpoint cũ hơn nghĩa là có khoảng không ai ghi (mọi worker dừng
+    / chết trước khi checkpoint), dữ liệu phải tính lại từ lúc khởi động.
+
+    rebuild_source(start, end) -> [(key, timestamp)]: nếu có, job nền đếm lại các bucket cũ
+    từ nguồn gốc mỗi rebuild_interval (sketch chỉ cộng, không trừ được).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        path: str,
+        capacity: int = 200,
+        checkpoint_interval: float = 60.0,
+        rebuild_source: Optional[Callable[[float, float], Iterable[Tuple[str, float]]]] = None,
+        rebuild_interval: float = 3600.0
+    ):
+        self.name = name
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.capacity = capacity
+        self.checkpoint_interval = checkpoint_interval
+        self.max_gap_seconds = checkpoint_interval * 3
+        self.rebuild_source = rebuild_source
+        self.rebuild_interval = rebuild_interval
+
+        self._lock = threading.Lock()
+        self._base: Buckets = {res: {} for res, _ in RESOLUTIONS}
+        self._delta: Buckets = {res: {} for res, _ in RESOLUTIONS}
+        # Thời điểm bắt đầu có dữ liệu: cửa sổ dài hơn thì sketch chưa trả lời được
+        self.since = time.time()
+        self._top_cache: Dict[Tuple[int, int], Tuple[float, List[Tuple[str, int, int]]]] = {}
+        self._task = None
+
+        self.adds = 0
+        self.checkpoints = 0
+        self.checkpoint_errors = 0
+        self.last_checkpoint_seconds = 0.0
+        self.rebuilds = 0
+        self.rebuild_errors = 0
+
+    # ===== WRITE =====
+
+    def add(self, key: str, n: int = 1, ts: Optional[float] = None):
+        if not key:
+            return
+        ts = ts or time.time()
+        with self._lock:
+            for res, _ in RESOLUTIONS:
+                bucket = int(ts // res * res)
+                summary = self._delta[res].get(bucket)
+                if summary is None:
+                    summary = self._delta[res][bucket] = SpaceSaving(self.capacity)
+                summary.add(key, n)
+            self.adds += 1
+            self.since = min(self.since, ts)
+
+    # ===== READ =====
+
+    def covers(self, window_seconds: int) -> bool:
+        return window_seconds <= MAX_WINDOW_SECONDS and self.since <= time.time() - window_seconds
+
+    def top(self, window_seconds: int, limit: int = 10) -> List[Tuple[str, int, int]]:
+        now = time.time()
+        cache_key = (window_seconds, limit)
+        cached = self._top_cache.get(cache_key)
+        if cached is not None and now - cached[0] < 5:
+            return cached[1]
+
+        res = next(r for r, keep in RESOLUTIONS if window_seconds <= r * keep)
+        start = now - window_seconds
+        with self._lock:
+            summaries = [
+                summary
+                for buckets in (self._base[res], self._delta[res])
+                for bucket, summary in buckets.items()
+                if bucket + res > start
+            ]
+            merged = SpaceSaving.merge(summaries, self.capacity)
+
+        result = merged.top(limit)
+        self._top_cache[cache_key] = (now, result)
+        return result
+
+    # ===== CHECKPOINT =====
+
+    def _read_file(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            print(f"⚠️ Top-k checkpoint {self.path} is corrupted, ignoring")
+            return None
+        if data.get("version") != CHECKPOINT_VERSION or data.get("capacity") != self.capacity:
+            return None
+        return data
+
+    def _decode(self, data: Optional[Dict[str, Any]]) -> Buckets:
+        buckets: Buckets = {res: {} for res, _ in RESOLUTIONS}
+        for res, _ in RESOLUTIONS:
+            for bucket, summary in ((data or {}).get("buckets", {}).get(str(res), {})).items():
+                buckets[res][int(bucket)] = SpaceSaving.from_dict(summary, self.capacity)
+        return buckets
+
+    def _write_file(self, buckets: Buckets, since: float, rebuilt_at: float):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        data = {
+            "version": CHECKPOINT_VERSION,
+            "capacity": self.capacity,
+            "since": since,
+            "saved_at": time.time(),
+            "rebuilt_at": rebuilt_at,
+            "buckets": {
+                str(res): {str(bucket): summary.to_dict() for bucket, summary in by_bucket.items()}
+                for res, by_bucket in buckets.items()
+            }
+        }
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def _exclusive(self):
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        lock_file = open(self.lock_path, "a+")
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        return lock_file
+
+    def seed(self, items: Iterable[Tuple[str, float]], since: float):
+        """Nạp dữ liệu lịch sử (key, timestamp) khi chưa có checkpoint, coi như có dữ liệu từ since"""
+        for key, ts in items:
+            self.add(key, ts=ts)
+        with self._lock:
+            self.since = min(self.since, since)
+
+    def _file_since(self, data: Optional[Dict[str, Any]]) -> Optional[float]:
+        """since của checkpoint, None nếu chưa có hoặc checkpoint quá cũ (dữ liệu có khoảng trống)"""
+        if not data or time.time() - data.get("saved_at", 0) > self.max_gap_seconds:
+            return None
+        return data.get("since")
+
+    def load(self) -> bool:
+        """Startup: lấy checkpoint trên disk làm base. False nếu chưa có checkpoint hoặc checkpoint quá cũ."""
+        data = self._read_file()
+        since = self._file_since(data)
+        if since is None:
+            return False
+        with self._lock:
+            self._base = self._decode(data)
+            self.since = min(self.since, since)
+        return True
+
+    def checkpoint(self, replace: bool = False):
+        """replace: ghi đè file thay vì gộp (sau khi seed lại toàn bộ cửa sổ từ nguồn gốc)"""
+        started = time.monotonic()
+        with self._lock:
+            delta, self._delta = self._delta, {res: {} for res, _ in RESOLUTIONS}
+            since = self.since
+
+        try:
+            lock_file = self._exclusive()
+            try:
+                data = None if replace else self._read_file()
+                buckets = self._decode(data)
+                file_since = self._file_since(data)
+                since = min(since, file_since) if file_since is not None else since
+
+                now = time.time()
+                for res, keep in RESOLUTIONS:
+                    for bucket, summary in delta[res].items():
+                        existing = buckets[res].get(bucket)
+                        buckets[res][bucket] = (
+                            SpaceSaving.merge([existing, summary], self.capacity) if existing else summary
+                        )
+                    # Bỏ bucket đã ra khỏi cửa sổ dài nhất của resolution này
+                    oldest = now - res * (keep + 1)
+                    buckets[res] = {b: s for b, s in buckets[res].items() if b >= oldest}
+
+                # Seed lại toàn bộ (replace) cũng là một lần rebuild
+                rebuilt_at = time.time() if replace else (data or {}).get("rebuilt_at", 0)
+                self._write_file(buckets, since, rebuilt_at)
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                lock_file.close()
+        except Exception:
+            # Trả delta lại để lần checkpoint sau ghi tiếp
+            with self._lock:
+                for res, _ in RESOLUTIONS:
+                    for bucket, summary in delta[res].items():
+                        existing = self._delta[res].get(bucket)
+                        self._delta[res][bucket] = (
+                            SpaceSaving.merge([existing, summary], self.capacity) if existing else summary
+                        )
+            raise
+
+        with self._lock:
+            self._base = buckets
+            self.since = min(self.since, since)
+        self._top_cache.clear()
+        self.checkpoints += 1
+        self.last_checkpoint_seconds = round(time.monotonic() - started, 4)
+
+    # ===== REBUILD =====
+
+    def _rebuild_due(self, data: Optional[Dict[str, Any]]) -> bool:
+        return time.time() - (data or {}).get("rebuilt_at", 0) >= self.rebuild_interval
+
+    def rebuild(self) -> int:
+        """
+        Đếm lại các bucket đã kết thúc trước before từ rebuild_source và thay vào checkpoint
+        (key bị xóa / từ chối sau khi cộng hết được tính). Bucket mới hơn max_gap_seconds giữ
+        nguyên: delta worker khác chưa checkpoint chỉ rơi vào đó nên không bị đếm trùng.
+        Bỏ qua nếu worker khác vừa rebuild trong rebuild_interval. Trả về số item đã đếm.
+        """
+        if self.rebuild_source is None or not self._rebuild_due(self._read_file()):
+            return 0
+
+        now = time.time()
+        largest = RESOLUTIONS[-1][0]
+        # Căn theo bucket lớn nhất: mọi resolution cắt cùng một mốc
+        start = (now - MAX_WINDOW_SECONDS) // largest * largest
+        before = (now - self.max_gap_seconds) // largest * largest
+        fresh: Buckets = {res: {} for res, _ in RESOLUTIONS}
+        count = 0
+        for key, ts in self.rebuild_source(start, before):
+            for res, _ in RESOLUTIONS:
+                bucket = int(ts // res * res)
+                summary = fresh[res].get(bucket)
+                if summary is None:
+                    summary = fresh[res][bucket] = SpaceSaving(self.capacity)
+                summary.add(key)
+            count += 1
+
+        lock_file = self._exclusive()
+        try:
+            data = self._read_file()
+            if not self._rebuild_due(data):
+                return 0
+            buckets = self._decode(data)
+            for res, _ in RESOLUTIONS:
+                kept = {b: s for b, s in buckets[res].items() if b + res > before}
+                kept.update(fresh[res])
+                buckets[res] = kept
+            # Checkpoint còn mới: phần sau before liên tục, phần trước vừa đếm lại đủ cửa sổ
+            file_since = self._file_since(data)
+            since = min(file_since, start) if file_since is not None else self.since
+            self._write_file(buckets, since, now)
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            lock_file.close()
+
+        with self._lock:
+            self._base = buckets
+            self.since = min(self.since, since)
+        self._top_cache.clear()
+        self.rebuilds += 1
+        return count
+
+    # ===== BACKGROUND =====
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            try:
+                await asyncio.to_thread(self.checkpoint)
+            except Exception as e:
+                self.checkpoint_errors += 1
+                print(f"❌ Top-k {self.name} checkpoint error: {e}")
+                continue
+
+            if self.rebuild_source is not None:
+                try:
+                    await asyncio.to_thread(self.rebuild)
+                except Exception as e:
+                    self.rebuild_errors += 1
+                    print(f"❌ Top-k {self.name} rebuild error: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await asyncio.to_thread(self.checkpoint)
+        except Exception as e:
+            print(f"❌ Top-k {self.name} checkpoint error: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            buckets = sum(len(b) for b in self._base.values()) + sum(len(b) for b in self._delta.values())
+        return {
+            "adds": self.adds,
+            "buckets": buckets,
+            "capacity": self.capacity,
+            "covered_seconds": int(time.time() - self.since),
+            "checkpoints": self.checkpoints,
+            "checkpoint_errors": self.checkpoint_errors,
+            "last_checkpoint_seconds": self.last_checkpoint_seconds,
+            "rebuilds": self.rebuilds,
+            "rebuild_errors": self.rebuild_errors
+        }
+
+
+def search_key(query: str) -> str:
+    return " ".join((query or "").split())[:200]
+
+
+def scammer_key(scammer_name: Optional[str], bank_account: Optional[str]) -> str:
+    # Tab ngăn cách tên và số tài khoản (giống group by scammer_name, bank_account)
+    return f"{(scammer_name or '').strip()}\t{(bank_account or '').strip()}"
+
+
+def split_scammer_key(key: str) -> Tuple[str, str]:
+    name, _, account = key.partition("\t")
+    return name, account
+
+
+def _approved_scammers(db, start: float, end: Optional[float] = None) -> List[Tuple[str, float]]:
+    """(scammer_key, approved_at) của các warning đang được duyệt, approved_at trong [start, end)"""
+    from datetime import datetime, timedelta
+    from models.models import Warning
+
+    # approved_at lưu theo UTC (naive)
+    epoch = datetime(1970, 1, 1)
+    query = db.query(Warning.scammer_name, Warning.bank_account, Warning.approved_at).filter(
+        Warning.status == 'approved',
+        Warning.approved_at >= epoch + timedelta(seconds=start)
+    )
+    if end is not None:
+        query = query.filter(Warning.approved_at < epoch + timedelta(seconds=end))
+    return [
+        (scammer_key(name, account), (approved_at - epoch).total_seconds())
+        for name, account, approved_at in query.all()
+    ]
+
+
+def _rebuild_scammers_source(start: float, end: float) -> List[Tuple[str, float]]:
+    from core.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return _approved_scammers(db, start, end)
+    finally:
+        db.close()
+
+
+def load_or_seed_scammers(db) -> int:
+    """
+    Startup: nạp checkpoint top scammers, chưa có (hoặc quá cũ) thì seed từ các warning được
+    duyệt trong 7 ngày gần nhất và ghi đè checkpoint. Trả về số warning đã seed (0 nếu dùng checkpoint).
+    """
+    if top_scammers_sketch.load():
+        return 0
+
+    since = time.time() - MAX_WINDOW_SECONDS
+    items = _approved_scammers(db, since)
+    top_scammers_sketch.seed(items, since=since)
+    # Ghi đè: gộp vào checkpoint cũ sẽ đếm trùng các lượt duyệt đã có trong đó
+    top_scammers_sketch.checkpoint(replace=True)
+    return len(items)
+
+
+# Global instances
+top_searches_sketch = SlidingTopK(
+    "searches",
+    settings.TOPK_SEARCHES_PATH,
+    capacity=settings.TOPK_CAPACITY,
+    checkpoint_interval=settings.TOPK_CHECKPOINT_SECONDS
+)
+top_scammers_sketch = SlidingTopK(
+    "scammers",
+    settings.TOPK_SCAMMERS_PATH,
+    capacity=settings.TOPK_CAPACITY,
+    checkpoint_interval=settings.TOPK_CHECKPOINT_SECONDS,
+    rebuild_source=_rebuild_scammers_source,
+    rebuild_interval=settings.TOPK_SCAMMERS_REBUILD_SECONDS
+)
@@ -1,11 +1,19 @@
 import re
 from typing import Optional
 from datetime import datetime
+from utils.normalization import fold_text, normalize_digits, normalize_facebook_link, normalize_phone, extract_phones
+
+# fold_text / normalize_facebook_link / extract_phones / normalize_phone được re-export
+# cho các module gọi qua helpers.*
+__all__ = [
+    "fold_text", "normalize_digits", "normalize_facebook_link", "normalize_phone", "extract_phones",
+    "validate_phone_number", "validate_bank_account", "normalize_account",
+    "mask_bank_account", "mask_phone_number", "mask_name", "format_datetime", "calculate_warning_score"
+]
 
 def validate_phone_number(phone: str) -> bool:
-    """Validate Vietnamese phone number"""
-    pattern = r'^(0[3|5|7|8|9])+([0-9]{8})\b'
-    return bool(re.match(pattern, phone))
+    """Validate Vietnamese phone number (0..., 84..., +84..., di động hoặc cố định)"""
+    return bool(normalize_phone(phone))
 
 def validate_bank_account(account: str) -> bool:
     """Validate bank account number"""
@@ -13,6 +21,10 @@ def validate_bank_account(account: str) -> bool:
     pattern = r'^[0-9]{9,16}$'
     return bool(re.match(pattern, account))
 
+def normalize_account(account: str) -> str:
+    """Normalize bank account / phone number: keep digits only"""
+    return normalize_digits(account)
+
 def mask_bank_account(account: str) -> str:
     """Mask bank account for display"""
     if len(account) <= 3:
@@ -65,7 +77,7 @@ def calculate_warning_score(warning) -> float:
         score += 10
     
     # Đã được xác thực bởi admin
-    if warning.status == models.WarningStatus.APPROVED:
+    if warning.status == 'approved':
         score += 25
     
     # Có nhiều cảnh báo cùng thông tin
@@ -0,0 +1,97 @@
+"""
+Chuẩn hóa chuỗi tiếng Việt / số tài khoản / link Facebook dùng chung cho
+DB (cột *_norm), identifier index, suggestion index và search cache.
+"""
+import re
+import unicodedata
+
+_NON_DIGIT = re.compile(r'\D')
+
+
+def _build_fold_table() -> dict:
+    # Bảng translate cho các ký tự Latin có dấu dựng sẵn (NFC), tránh NFD cho từng ký tự
+    table = {ord("đ"): "d", ord("Đ"): "d"}
+    for start, end in ((0x00C0, 0x0250), (0x1E00, 0x1F00)):
+        for code in range(start, end):
+            char = chr(code)
+            base = "".join(
+                c for c in unicodedata.normalize("NFD", char)
+                if unicodedata.category(c) != "Mn"
+            )
+            if base != char and base.isascii():
+                table[code] = base.lower()
+    return table
+
+
+_FOLD_TABLE = _build_fold_table()
+
+
+def fold_text(text: str) -> str:
+    """Bỏ dấu tiếng Việt, đ -> d, lowercase và gộp khoảng trắng"""
+    if not text:
+        return ""
+
+    value = text.translate(_FOLD_TABLE).lower()
+    if not value.isascii():
+        # Chuỗi dạng tổ hợp (NFD) hoặc ký tự ngoài bảng: đi đường chậm
+        value = unicodedata.normalize("NFD", value)
+        value = "".join(c for c in value if unicodedata.category(c) != "Mn")
+    return " ".join(value.split())
+
+
+def normalize_digits(value: str) -> str:
+    """Normalize bank account / phone number: keep digits only"""
+    return _NON_DIGIT.sub('', value or '')
+
+
+def normalize_facebook_link(link: str) -> str:
+    """Normalize Facebook link về dạng facebook.com/<path>"""
+    if not link:
+        return ""
+
+    value = link.strip().lower()
+    value = re.sub(r'^[a-z]+://', '', value)
+    value = re.sub(r'^(www\.|m\.|mbasic\.|web\.|touch\.)', '', value)
+    value = re.sub(r'^(fb\.com|facebook\.com)', 'facebook.com', value)
+
+    # Giữ lại id của link profile.php?id=..., bỏ các query string khác
+    profile_id = re.search(r'profile\.php\?(?:.*&)?id=(\d+)', value)
+    if profile_id:
+        return f"facebook.com/profile.php?id={profile_id.group(1)}"
+
+    value = value.split('#', 1)[0].split('?', 1)[0]
+    return value.rstrip('/')
+
+
+# Số Việt Nam: +84 / 84 / 0084 / 0, rồi 9 số (di động) hoặc 10 số (cố định 02x)
+_PHONE_CANDIDATE = re.compile(r'(?<![\d+])(?:\+|00)?\d(?:[\s.\-]?\d){8,12}(?!\d)')
+_VN_MOBILE = re.compile(r'^[35789]\d{8}$')
+_VN_LANDLINE = re.compile(r'^2\d{9}$')
+
+
+def normalize_phone(value: str) -> str:
+    """Số điện thoại Việt Nam -> E.164 (+84...), chuỗi rỗng nếu không phải số điện thoại"""
+    digits = normalize_digits(value)
+    if digits.startswith("0084"):
+        national = digits[4:]
+    elif digits.startswith("84") and len(digits) in (11, 12):
+        national = digits[2:]
+    elif digits.startswith("0"):
+        national = digits[1:]
+    else:
+        return ""
+
+    if _VN_MOBILE.match(national) or _VN_LANDLINE.match(national):
+        return "+84" + national
+    return ""
+
+
+def extract_phones(*texts: str) -> list:
+    """Tất cả số điện thoại (E.164, không trùng, giữ thứ tự) xuất hiện trong các chuỗi"""
+    phones = []
+    for text in texts:
+        for match in _PHONE_CANDIDATE.finditer(text or ""):
+            phone = normalize_phone(match.group())
+            if phone and phone not in phones:
+                phones.append(phone)
+    return phones